@@ -0,0 +1,473 @@
+"""A local stand-in for the CloudFlare API, serving the zones and dns_records endpoints used by CloudFlareLibWrapper
+
+The zones and records are kept in memory. The latency of every response, the largest page, the rate of injected
+server errors and a rate limit answering 429 can be configured, so the bulk commands can be measured without
+credentials and without touching real zones.
+
+Usage:
+python benchmarks/cloudflare_api_stub.py [--port <port>] [--zones <number>] [--records <number>] [--latency <seconds>]
+    [--error-rate <ratio>] [--rate-limit <requests>] [--rate-limit-window <seconds>]
+"""
+from __future__ import print_function
+
+import cgi
+import datetime
+import getopt
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from cloudflare_dns.proxiable import is_proxiable
+
+ZONES_MAX_PER_PAGE = 50
+DNS_RECORDS_MAX_PER_PAGE = 5000
+DNS_RECORDS_BATCH_MAX_SIZE = 200
+
+# The path parts naming the endpoints, the other parts are identifiers
+ENDPOINT_NAMES = frozenset(['zones', 'dns_records', 'batch', 'export', 'import'])
+
+
+class APIError(Exception):
+    def __init__(self, status, code, message, retry_after=None):
+        super(APIError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.retry_after = retry_after
+
+
+def _now():
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _new_id():
+    return uuid.uuid4().hex
+
+
+def _page(items, params, max_per_page):
+    page = max(1, int(params.get('page', 1)))
+    per_page = min(max_per_page, max(1, int(params.get('per_page', 20))))
+    total_count = len(items)
+    result = items[(page - 1) * per_page:page * per_page]
+    return result, {
+        'page': page, 'per_page': per_page, 'count': len(result), 'total_count': total_count,
+        'total_pages': max(1, (total_count + per_page - 1) // per_page)}
+
+
+class CloudFlareAPIStub(object):
+    """The in-memory state of the stand-in and its HTTP server
+
+    :param latency: the seconds every response is delayed by
+    :param error_rate: the ratio of requests answered with a 500 error, drawn from a random generator seeded with seed
+    :param injected_error: the HTTP status, the JSON error code and the message of the injected errors, the code of
+        a real server error not always being its HTTP status
+    :param rate_limit: the number of requests allowed per rate_limit_window seconds, the others are answered with a
+        429 error and a Retry-After header. None disables the rate limit.
+    :param max_per_page: the largest page of DNS records
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, rate_limit=None, rate_limit_window=300.0,
+                 max_per_page=DNS_RECORDS_MAX_PER_PAGE, seed=0, injected_error=(500, 500, 'Internal Server Error')):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.injected_error = injected_error
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.max_per_page = max_per_page
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.reset()
+
+    def reset(self):
+        """Removing all the zones and clearing the request counters"""
+        with self._lock:
+            self.zones = {}
+            self.zone_ids = []
+            self.zone_ids_by_name = {}
+            self.records = {}
+            self.requests = {}
+            self.errors = 0
+            self.rate_limited = 0
+            self._window = []
+
+    def request_count(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    def add_zone(self, name):
+        with self._lock:
+            return self._add_zone(name)
+
+    def _add_zone(self, name):
+        if name.lower() in self.zone_ids_by_name:
+            raise APIError(400, 1061, '{0} already exists'.format(name))
+        zone = {
+            'id': _new_id(), 'name': name, 'status': 'pending', 'type': 'full', 'created_on': _now(),
+            'modified_on': _now()}
+        self.zones[zone['id']] = zone
+        self.zone_ids.append(zone['id'])
+        self.zone_ids_by_name[name.lower()] = zone['id']
+        self.records[zone['id']] = []
+        return zone
+
+    def add_record(self, zone_id, record_type, name, content, proxied=False):
+        with self._lock:
+            return self._add_record(zone_id, {'type': record_type, 'name': name, 'content': content,
+                                              'proxied': proxied})
+
+    def zone_file(self, zone_name):
+        """The BIND zone file of a zone, as exported by the API"""
+        with self._lock:
+            return self._export(self.zone_ids_by_name[zone_name.lower()])
+
+    def clear_records(self):
+        with self._lock:
+            for zone_id in self.records:
+                self.records[zone_id] = []
+
+    def _zone(self, zone_id):
+        zone = self.zones.get(zone_id)
+        if zone is None:
+            raise APIError(404, 1001, 'Invalid zone identifier')
+        return zone
+
+    def _record(self, zone_id, record_id):
+        for dns_record in self.records[self._zone(zone_id)['id']]:
+            if dns_record['id'] == record_id:
+                return dns_record
+        raise APIError(404, 81044, 'Record does not exist.')
+
+    def _check_record(self, zone, data):
+        for key in ('type', 'name', 'content'):
+            if not data.get(key):
+                raise APIError(400, 9000 + len(key), 'DNS record {0} is required.'.format(key))
+        name = data['name']
+        if name != zone['name'] and not name.endswith('.' + zone['name']):
+            name = '{0}.{1}'.format(name, zone['name'])
+        proxiable = is_proxiable(data['type'], name, data['content'])
+        if data.get('proxied') and not proxiable:
+            raise APIError(400, 9004, 'This record type cannot be proxied.')
+        return name, proxiable
+
+    def _add_record(self, zone_id, data):
+        zone = self._zone(zone_id)
+        name, proxiable = self._check_record(zone, data)
+        key = (data['type'], name, data['content'])
+        for dns_record in self.records[zone_id]:
+            if (dns_record['type'], dns_record['name'], dns_record['content']) == key:
+                raise APIError(400, 81057, 'The record already exists.')
+        dns_record = {
+            'id': _new_id(), 'type': data['type'], 'name': name, 'content': data['content'],
+            'proxiable': proxiable, 'proxied': bool(data.get('proxied')), 'ttl': data.get('ttl', 1),
+            'locked': False, 'zone_id': zone_id, 'zone_name': zone['name'], 'created_on': _now(),
+            'modified_on': _now(), 'data': {}}
+        self.records[zone_id].append(dns_record)
+        return dns_record
+
+    def _update_record(self, zone_id, record_id, data, partial=False):
+        zone = self._zone(zone_id)
+        dns_record = self._record(zone_id, record_id)
+        if partial:
+            data = dict((key, data.get(key, dns_record[key])) for key in ('type', 'name', 'content', 'proxied'))
+        name, proxiable = self._check_record(zone, data)
+        dns_record.update({
+            'type': data['type'], 'name': name, 'content': data['content'], 'proxiable': proxiable,
+            'proxied': bool(data.get('proxied')), 'modified_on': _now()})
+        return dns_record
+
+    def _delete_record(self, zone_id, record_id):
+        dns_record = self._record(zone_id, record_id)
+        self.records[zone_id].remove(dns_record)
+        return {'id': record_id}
+
+    def _list_zones(self, params):
+        if 'name' in params:
+            zone_id = self.zone_ids_by_name.get(params['name'].lower())
+            zones = [] if zone_id is None else [self.zones[zone_id]]
+        else:
+            zones = [self.zones[zone_id] for zone_id in self.zone_ids]
+        if 'status' in params:
+            zones = [zone for zone in zones if zone['status'] == params['status']]
+        return _page(zones, params, ZONES_MAX_PER_PAGE)
+
+    def _list_records(self, zone_id, params):
+        dns_records = self.records[self._zone(zone_id)['id']]
+        for key in ('type', 'name', 'content'):
+            if key in params:
+                dns_records = [dns_record for dns_record in dns_records if dns_record[key] == params[key]]
+        return _page(dns_records, params, self.max_per_page)
+
+    def _batch(self, zone_id, data):
+        self._zone(zone_id)
+        if sum(len(data.get(key) or []) for key in ('deletes', 'patches', 'puts', 'posts')) > \
+                DNS_RECORDS_BATCH_MAX_SIZE:
+            raise APIError(400, 81058, 'Too many changes in the batch.')
+        # the batch is atomic: the changes are applied to a copy, which replaces the records once all succeeded
+        saved = [dict(dns_record) for dns_record in self.records[zone_id]]
+        try:
+            return {
+                'deletes': [self._delete_record(zone_id, change['id']) for change in data.get('deletes') or []],
+                'patches': [self._update_record(zone_id, change['id'], change, partial=True)
+                            for change in data.get('patches') or []],
+                'puts': [self._update_record(zone_id, change['id'], change) for change in data.get('puts') or []],
+                'posts': [self._add_record(zone_id, change) for change in data.get('posts') or []]}
+        except APIError:
+            self.records[zone_id] = saved
+            raise
+
+    def _export(self, zone_id):
+        lines = [';; Zone file exported by the CloudFlare API stub']
+        for dns_record in self.records[self._zone(zone_id)['id']]:
+            content = dns_record['content']
+            if dns_record['type'] == 'TXT':
+                content = '"{0}"'.format(content)
+            elif dns_record['type'] in ('CNAME', 'MX', 'NS'):
+                content += '.'
+            lines.append('{0}.\t1\tIN\t{1}\t{2}'.format(dns_record['name'], dns_record['type'], content))
+        return '\n'.join(lines) + '\n'
+
+    def _import(self, zone_id, zone_file, proxied):
+        self._zone(zone_id)
+        added = parsed = 0
+        for line in zone_file.splitlines():
+            line = line.strip()
+            if not line or line.startswith(';'):
+                continue
+            fields = line.split(None, 4)
+            if len(fields) != 5:
+                raise APIError(400, 81000, 'Unable to parse the zone file line: {0}'.format(line))
+            name, _, _, record_type, content = fields
+            parsed += 1
+            if record_type == 'TXT':
+                content = content.strip('"')
+            try:
+                self._add_record(zone_id, {
+                    'type': record_type, 'name': name.rstrip('.'), 'content': content.rstrip('.'),
+                    'proxied': proxied and is_proxiable(record_type, name.rstrip('.'), content)})
+                added += 1
+            except APIError:
+                pass
+        return {'recs_added': added, 'total_records_parsed': parsed}
+
+    def _check_limits(self, endpoint):
+        """Counting the request, then answering with a rate limit or an injected error when they apply"""
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if self.rate_limit is not None:
+            now = time.time()
+            self._window = [sent_on for sent_on in self._window if sent_on > now - self.rate_limit_window]
+            if len(self._window) >= self.rate_limit:
+                self.rate_limited += 1
+                retry_after = max(1, int(self._window[0] + self.rate_limit_window - now + 1))
+                raise APIError(
+                    429, 971, 'Please wait and consider throttling your request speed', retry_after=retry_after)
+            self._window.append(now)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            raise APIError(*self.injected_error)
+
+    def handle(self, method, path, params, body, form=None):
+        """Answering an API request
+
+        :return: a tuple of the HTTP status, the response (a dictionary sent as JSON, or a string), and the headers
+        """
+        parts = [part for part in path.split('/') if part][2:]  # dropping client/v4
+        endpoint = '{0} {1}'.format(method, '/'.join(part if part in ENDPOINT_NAMES else ':id' for part in parts))
+        with self._lock:
+            try:
+                self._check_limits(endpoint)
+                result, result_info = self._route(method, parts, params, body, form)
+            except APIError as e:
+                headers = {} if e.retry_after is None else {'Retry-After': str(e.retry_after)}
+                return e.status, {'success': False, 'errors': [{'code': e.code, 'message': e.message}],
+                                  'messages': [], 'result': None}, headers
+        if isinstance(result, str):
+            return 200, result, {}
+        response = {'success': True, 'errors': [], 'messages': [], 'result': result}
+        if result_info is not None:
+            response['result_info'] = result_info
+        return 200, response, {}
+
+    def _route(self, method, parts, params, body, form):
+        if parts == ['zones']:
+            if method == 'GET':
+                return self._list_zones(params)
+            if method == 'POST':
+                return self._add_zone(body['name']), None
+        elif len(parts) == 2 and parts[0] == 'zones' and method == 'DELETE':
+            zone = self._zone(parts[1])
+            del self.zones[zone['id']]
+            self.zone_ids.remove(zone['id'])
+            del self.zone_ids_by_name[zone['name'].lower()]
+            del self.records[zone['id']]
+            return {'id': zone['id']}, None
+        elif len(parts) == 3 and parts[0] == 'zones' and parts[2] == 'dns_records':
+            if method == 'GET':
+                return self._list_records(parts[1], params)
+            if method == 'POST':
+                return self._add_record(parts[1], body), None
+        elif len(parts) == 4 and parts[0] == 'zones' and parts[2] == 'dns_records':
+            if parts[3] == 'batch' and method == 'POST':
+                return self._batch(parts[1], body), None
+            if parts[3] == 'export' and method == 'GET':
+                return self._export(parts[1]), None
+            if parts[3] == 'import' and method == 'POST':
+                return self._import(parts[1], form.get('file', ''), form.get('proxied') == 'true'), None
+            if method == 'GET':
+                return self._record(parts[1], parts[3]), None
+            if method == 'PUT':
+                return self._update_record(parts[1], parts[3], body), None
+            if method == 'PATCH':
+                return self._update_record(parts[1], parts[3], body, partial=True), None
+            if method == 'DELETE':
+                return self._delete_record(parts[1], parts[3]), None
+        raise APIError(404, 7003, 'Could not route to /{0}, perhaps your object identifier is invalid?'.format(
+            '/'.join(parts)))
+
+    def start(self, port=0):
+        """Serving the API on a background thread
+
+        :return: the base URL of the API, to give to CloudFlareLibWrapper
+        """
+        stub = self
+
+        class Handler(StubRequestHandler):
+            api_stub = stub
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self.base_url
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{0}/client/v4'.format(self._server.server_address[1])
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # a response sent in a single write, as the small writes of the headers stall the keep-alive connections
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    api_stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        params = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        body = None
+        form = None
+        content_type = self.headers.get('Content-Type') or ''
+        if content_type.startswith('multipart/form-data'):
+            environ = {'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(length)}
+            try:
+                from io import BytesIO
+            except ImportError:
+                from StringIO import StringIO as BytesIO
+            fields = cgi.FieldStorage(fp=BytesIO(raw_body), environ=environ, keep_blank_values=True)
+            form = dict((key, fields.getfirst(key)) for key in fields.keys())
+        elif raw_body:
+            try:
+                body = json.loads(raw_body.decode('utf-8'))
+            except ValueError:
+                body = None
+        if body is None and method == 'GET':
+            body = {}
+
+        if self.api_stub.latency:
+            time.sleep(self.api_stub.latency)
+        status, response, headers = self.api_stub.handle(method, url.path, params, body or {}, form)
+        if isinstance(response, dict):
+            payload = json.dumps(response).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            payload = response.encode('utf-8')
+            content_type = 'text/plain'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def seed_zones(stub, zone_count, records_per_zone=5, prefix='zone'):
+    """Adding zones named <prefix>-<number>.example, each with records_per_zone records
+
+    :return: the zone names
+    """
+    zone_names = []
+    for i in range(zone_count):
+        zone = stub.add_zone('{0}-{1}.example'.format(prefix, i))
+        zone_names.append(zone['name'])
+        for j in range(records_per_zone):
+            stub.add_record(zone['id'], 'TXT', 'record-{0}.{1}'.format(j, zone['name']), 'content {0}'.format(j))
+    return zone_names
+
+
+def main(args):
+    opts, _ = getopt.getopt(args, '', [
+        'port=', 'zones=', 'records=', 'latency=', 'error-rate=', 'rate-limit=', 'rate-limit-window='])
+    options = dict(opts)
+    stub = CloudFlareAPIStub(
+        latency=float(options.get('--latency', 0)), error_rate=float(options.get('--error-rate', 0)),
+        rate_limit=int(options['--rate-limit']) if '--rate-limit' in options else None,
+        rate_limit_window=float(options.get('--rate-limit-window', 300)))
+    seed_zones(stub, int(options.get('--zones', 0)), int(options.get('--records', 5)))
+    print("Serving the CloudFlare API stub at {0}".format(stub.start(int(options.get('--port', 8080)))))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+"""Measuring the memory held by the DNS records listed, as dictionaries of the API and as compact DnsRecord
+
+The records are seeded in the local CloudFlare API stand-in, then every zone is decoded from its JSON listing like
+the responses of the API, and the bytes per record are the deep size of all the records held at once, the objects
+shared by several records, such as the interned strings, being counted once.
+
+Usage:
+python benchmarks/record_memory.py [--zones <number>] [--records <number>]
+"""
+from __future__ import print_function
+
+import getopt
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from benchmarks.cloudflare_api_stub import CloudFlareAPIStub, seed_zones
+from cloudflare_dns.records import DnsRecord, compact_records
+
+
+def deep_size(objects):
+    """The bytes of a list of objects and of everything they reference, each object being counted once"""
+    seen = set()
+    size = 0
+    pending = [objects]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pending.extend(obj)
+        elif isinstance(obj, DnsRecord):
+            pending.extend(getattr(obj, key) for key in DnsRecord.__slots__)
+    return size
+
+
+def listed_records(stub, zone_names):
+    """The records of every zone, decoded from JSON like the records of an API listing"""
+    for zone_name in zone_names:
+        zone_id = stub.zone_ids_by_name[zone_name.lower()]
+        for dns_record in json.loads(json.dumps(stub.records[zone_id])):
+            yield dns_record
+
+
+def measure(zone_count, records_per_zone):
+    stub = CloudFlareAPIStub()
+    zone_names = seed_zones(stub, zone_count, records_per_zone)
+    record_count = zone_count * records_per_zone
+    full_size = deep_size(list(listed_records(stub, zone_names)))
+    compact_size = deep_size(list(compact_records(listed_records(stub, zone_names))))
+    return {
+        'records': record_count,
+        'full_bytes_per_record': full_size / float(record_count),
+        'compact_bytes_per_record': compact_size / float(record_count),
+    }
+
+
+def main(args):
+    opts, args = getopt.getopt(args, '', ['zones=', 'records='])
+    options = dict(opts)
+    result = measure(int(options.get('--zones', 1000)), int(options.get('--records', 100)))
+    print('{0:>10} {1:>20} {2:>20} {3:>8}'.format('records', 'full bytes/record', 'compact bytes/record', 'ratio'))
+    print('{0:>10} {1:>20.1f} {2:>20.1f} {3:>8.2f}'.format(
+        result['records'], result['full_bytes_per_record'], result['compact_bytes_per_record'],
+        result['full_bytes_per_record'] / result['compact_bytes_per_record']))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
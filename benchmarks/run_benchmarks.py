@@ -0,0 +1,171 @@
+"""Timing the bulk commands against the local CloudFlare API stand-in
+
+Every command runs in its own process, against zones seeded in the stand-in, and is reported with its duration,
+the API requests per second, the p50 and p99 latency of the requests, the peak RSS of the process and the number
+of HTTP connections it opened.
+
+Usage:
+python benchmarks/run_benchmarks.py [--sizes 100,1000,10000] [--commands <command>,...] [--records <number>]
+    [--workers <number>] [--latency <seconds>] [--error-rate <ratio>] [--output <json_file>]
+"""
+from __future__ import print_function
+
+import getopt
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from benchmarks.cloudflare_api_stub import CloudFlareAPIStub, seed_zones
+
+DEFAULT_SIZES = (100, 1000, 10000)
+COMMANDS = (
+    'add-new-domains', 'list-records', 'add-new-records', 'edit-records', 'sync', 'export-zone-files',
+    'import-zone-files', 'delete-all-records')
+
+
+def percentile(values, ratio):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(ratio * (len(values) - 1))))]
+
+
+def command_args(command, work_dir, domains_file_name):
+    """The command line of a benchmarked command, without the options common to all commands"""
+    if command == 'add-new-records':
+        args = ['--add-new-records', '--type', 'TXT', '--name', 'benchmark', '--content', 'added']
+    elif command == 'edit-records':
+        args = ['--edit-records', '--type', 'TXT', '--name', 'record-0', '--old-content', 'content 0',
+                '--new-content', 'edited']
+    elif command == 'sync':
+        args = ['--sync', os.path.join(work_dir, 'desired.csv')]
+    elif command in ('export-zone-files', 'import-zone-files'):
+        args = ['--' + command, os.path.join(work_dir, 'zones')]
+    else:
+        args = ['--' + command]
+    return args + [domains_file_name]
+
+
+def prepare(stub, command, size, records_per_zone, work_dir):
+    """Seeding the stand-in and the work directory for a command, returning the domain list file"""
+    stub.reset()
+    domains_file_name = os.path.join(work_dir, 'domains.txt')
+    if command == 'add-new-domains':
+        zone_names = ['new-{0}.example'.format(i) for i in range(size)]
+    else:
+        zone_names = seed_zones(stub, size, records_per_zone)
+    with open(domains_file_name, 'w') as f:
+        f.write(''.join('{0}\n'.format(zone_name) for zone_name in zone_names))
+
+    if command == 'sync':
+        with open(os.path.join(work_dir, 'desired.csv'), 'w') as f:
+            f.write('type,name,content\nTXT,record-0,content 0\nTXT,record-1,changed\nTXT,benchmark,added\n')
+    elif command == 'import-zone-files':
+        zones_dir = os.path.join(work_dir, 'zones')
+        os.makedirs(zones_dir)
+        for zone_name in zone_names:
+            with open(os.path.join(zones_dir, '{0}.zone'.format(zone_name)), 'w') as f:
+                f.write(stub.zone_file(zone_name))
+        stub.clear_records()
+    stub.requests.clear()
+    return domains_file_name
+
+
+def run_child(command, base_url, args, workers):
+    """Running a command in this process, with the latency of every API request recorded"""
+    from cloudflare_dns import CloudFlareLibWrapper
+    from cloudflare_dns import bulk_dns
+
+    latencies = []
+    cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL', base_url=base_url)
+    request = cf_lib_wrapper._request
+
+    def timed_request(method, send, **kwargs):
+        def timed_send():
+            started = time.time()
+            try:
+                return send()
+            finally:
+                latencies.append(time.time() - started)
+        return request(method, timed_send, **kwargs)
+
+    cf_lib_wrapper._request = timed_request
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        started = time.time()
+        bulk_dns.cli(
+            ['--workers', str(workers), '--no-rate-limit', '--no-zone-cache'] + args, cf_lib_wrapper=cf_lib_wrapper)
+        elapsed = time.time() - started
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    print(json.dumps({
+        'command': command, 'elapsed': elapsed, 'requests': len(latencies),
+        'connections': cf_lib_wrapper.session.stats()['connections'],
+        'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99),
+        # kilobytes on Linux
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+
+
+def run_benchmark(stub, command, size, records_per_zone, workers):
+    work_dir = tempfile.mkdtemp()
+    try:
+        domains_file_name = prepare(stub, command, size, records_per_zone, work_dir)
+        env = dict(os.environ, CLOUDFLARE_DNS_JOURNAL_DIR=os.path.join(work_dir, 'journal'))
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--child', command, '--base-url', stub.base_url,
+             '--workers', str(workers), '--'] + command_args(command, work_dir, domains_file_name),
+            cwd=work_dir, env=env)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(work_dir)
+    result['size'] = size
+    result['served'] = sum(stub.requests.values())
+    result['requests_per_second'] = result['served'] / result['elapsed'] if result['elapsed'] else 0.0
+    return result
+
+
+def main(args):
+    opts, args = getopt.getopt(args, '', [
+        'sizes=', 'commands=', 'records=', 'workers=', 'latency=', 'error-rate=', 'output=', 'child=',
+        'base-url='])
+    options = dict(opts)
+    workers = int(options.get('--workers', 4))
+    if '--child' in options:
+        run_child(options['--child'], options['--base-url'], args, workers)
+        return
+
+    sizes = [int(size) for size in options['--sizes'].split(',')] if '--sizes' in options else DEFAULT_SIZES
+    commands = options['--commands'].split(',') if '--commands' in options else COMMANDS
+    records_per_zone = int(options.get('--records', 5))
+    stub = CloudFlareAPIStub(
+        latency=float(options.get('--latency', 0)), error_rate=float(options.get('--error-rate', 0)))
+    stub.start()
+    results = []
+    print('{0:>20} {1:>7} {2:>9} {3:>9} {4:>10} {5:>9} {6:>9} {7:>12} {8:>12}'.format(
+        'command', 'zones', 'seconds', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'peak RSS MB', 'connections'))
+    try:
+        for size in sizes:
+            for command in commands:
+                result = run_benchmark(stub, command, size, records_per_zone, workers)
+                results.append(result)
+                print('{0:>20} {1:>7} {2:>9.2f} {3:>9} {4:>10.1f} {5:>9.2f} {6:>9.2f} {7:>12.1f} {8:>12}'.format(
+                    command, size, result['elapsed'], result['served'], result['requests_per_second'],
+                    result['p50'] * 1000, result['p99'] * 1000, result['peak_rss_kb'] / 1024.0, result['connections']))
+                sys.stdout.flush()
+    finally:
+        stub.stop()
+    if '--output' in options:
+        with open(options['--output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,48 +1,330 @@
+import json
+import os
+import threading
 import time
+from multiprocessing.pool import ThreadPool
+
 import CloudFlare
+import requests
+from CloudFlare.cloudflare import BASE_URL
 from CloudFlare.exceptions import CloudFlareAPIError
 
+from cloudflare_dns.metrics import is_rate_limited, request_phase
+from cloudflare_dns.proxiable import is_proxiable, proxied_for_type
+from cloudflare_dns.retry import RetryPolicy
+from cloudflare_dns.session import HttpSession
+
+# The largest page of DNS records returned by the API
+DNS_RECORDS_MAX_PER_PAGE = 5000
+
+# The largest number of changes accepted by a single batch request on every plan
+DNS_RECORDS_BATCH_MAX_SIZE = 200
+
+# The size of the chunks in which the exported zone files are written to disk
+ZONE_FILE_CHUNK_SIZE = 64 * 1024
+
+# The errors telling that the batch endpoint does not exist for the account, "No route for that URI". 7003 ("Could
+# not route to ...") is left out: the API also answers it for an invalid zone identifier
+BATCH_UNAVAILABLE_CODES = frozenset([7000])
+
 
 class CloudFlareLibWrapper(object):
-    def __init__(self, api_key, api_email):
+    def __init__(self, api_key, api_email, zone_cache=None, rate_limiter=None, retry_policy=None, base_url=None,
+                 session=None):
+        """
+        :param api_key: The API key
+        :param api_email: The API email
+        :param zone_cache: an optional cloudflare_dns.zone_cache.ZoneCache, saving the zone lookups of get_zone_info
+        :param rate_limiter: an optional cloudflare_dns.rate_limit.TokenBucket, which every request waits for
+        :param retry_policy: an optional cloudflare_dns.retry.RetryPolicy, retrying the requests failing with
+            transient errors
+        :param base_url: the URL of the API, defaults to the CloudFlare API. Used to run against a local stand-in.
+        :param session: the cloudflare_dns.session.HttpSession sending the requests, a new one by default. The requests
+            of the CloudFlare library go through it as well, reusing its keep-alive connections.
+
+        When zone_index is set to a cloudflare_dns.zone_index.ZoneIndex, get_zone_info resolves the zones from it
+        without any request.
+
+        create_dns_records, update_dns_records and delete_dns_records send their changes in batches of batch_size,
+        None writing the records one by one.
+
+        When metrics is set to a cloudflare_dns.metrics.Metrics, every request attempt is recorded in it.
+        """
         self.api_key = api_key
         self.api_email = api_email
+        self.zone_cache = zone_cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self._local = threading.local()
+        self.zone_index = None
+        self.page_size = DNS_RECORDS_MAX_PER_PAGE
+        self.proxied = None
+        self.batch_size = DNS_RECORDS_BATCH_MAX_SIZE
+        self.metrics = None
+        self.base_url = base_url or BASE_URL
         self.cf = CloudFlare.CloudFlare(email=api_email, token=api_key)
+        self.cf_raw = CloudFlare.CloudFlare(email=api_email, token=api_key, raw=True)
+        self.cf.base.base_url = self.cf_raw.base.base_url = self.base_url
+        self.session = session if session is not None else HttpSession()
+        for cf in (self.cf, self.cf_raw):
+            cf.base._raw = self._library_transport(cf.base)
+
+    def _library_transport(self, base):
+        """The replacement of the method of the CloudFlare library sending its requests, which opens a new
+        connection for every request and ignores the HTTP status and the Retry-After header"""
+        def send(method, headers, api_call_part1, api_call_part2=None, api_call_part3=None, identifier1=None,
+                 identifier2=None, params=None, data=None):
+            url = '/'.join(part for part in (
+                base.base_url, api_call_part1, identifier1, api_call_part2, identifier2, api_call_part3) if part)
+            method = method.upper()
+            kwargs = {'headers': headers}
+            if method == 'GET':
+                kwargs.update(params=params, data=data)
+            elif method == 'DELETE':
+                kwargs.update(json=data)
+            else:
+                kwargs.update(params=params, json=data)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                raise CloudFlareAPIError(0, 'connection failed.')
+            self._local.response_size = len(response.content)
+            self._raise_for_response(response)
+            try:
+                return response.json()
+            except ValueError:
+                raise CloudFlareAPIError(0, 'JSON parse failed.')
+
+        return send
+
+    @staticmethod
+    def _endpoint(api_call, args):
+        """The endpoint of a CloudFlare library call, with its identifiers left out, e.g. zones/:id/dns_records"""
+        target = getattr(api_call, '__self__', None)
+        parts = [getattr(target, 'api_call_part1', None) or '']
+        api_call_part2 = getattr(target, 'api_call_part2', None)
+        if api_call_part2:
+            parts += [':id', api_call_part2]
+        if len(args) > (1 if api_call_part2 else 0):
+            extra = args[-1]
+            parts.append(extra if extra in ('batch', 'export', 'import') else ':id')
+        return '/'.join(parts)
+
+    def _api(self, api_call, *args, **kwargs):
+        """Doing an API request with the CloudFlare library, named after its HTTP method"""
+        if self.metrics is None:
+            return self._request(getattr(api_call, '__name__', ''), lambda: api_call(*args, **kwargs))
+        data = kwargs.get('data')
+        return self._request(
+            getattr(api_call, '__name__', ''), lambda: api_call(*args, **kwargs),
+            endpoint=self._endpoint(api_call, args), bytes_sent=len(json.dumps(data)) if data else 0,
+            bytes_received=lambda result: self._local.response_size)
+
+    def _request(self, method, send, endpoint='', bytes_sent=0, bytes_received=None):
+        """Doing an API request, every request of the wrapper goes through here
+
+        :param bytes_sent: the size of the request body, for the metrics
+        :param bytes_received: an optional function returning the size of the response body from the result of send
+        """
+        method = method.upper()
+        metrics = self.metrics
+        if metrics is not None:
+            request_started = metrics.clock()
+        retries = 0
+        try:
+            while True:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                if metrics is not None:
+                    attempt_started = metrics.clock()
+                    self._local.response_size = 0
+                try:
+                    result = send()
+                except CloudFlareAPIError as e:
+                    if metrics is not None:
+                        metrics.observe_request(
+                            method, endpoint, metrics.clock() - attempt_started, outcome=str(int(e)),
+                            bytes_sent=bytes_sent, bytes_received=self._local.response_size,
+                            rate_limited=is_rate_limited(e))
+                    if (self.retry_policy is None) or (not self.retry_policy.should_retry(method, retries, e)):
+                        raise
+                    self.retry_policy.sleep(self.retry_policy.delay(retries, e))
+                    retries += 1
+                    self._local.retry_count = getattr(self._local, 'retry_count', 0) + 1
+                    if metrics is not None:
+                        metrics.observe_retry()
+                else:
+                    if metrics is not None:
+                        metrics.observe_request(
+                            method, endpoint, metrics.clock() - attempt_started, bytes_sent=bytes_sent,
+                            bytes_received=bytes_received(result) if bytes_received is not None else 0)
+                    return result
+        finally:
+            if metrics is not None:
+                metrics.observe_phase(request_phase(method, endpoint), metrics.clock() - request_started)
+
+    def take_retry_count(self):
+        """Getting the number of request retries done by the current thread since the previous call"""
+        retry_count = getattr(self._local, 'retry_count', 0)
+        self._local.retry_count = 0
+        return retry_count
 
     def list_zones(self, page=1, per_page=20, status=None):
         params = {'page': page, 'per_page': per_page}
         if status is not None:
             params['status'] = status
-        return self.cf.zones.get(params=params)
+        return self._api(self.cf.zones.get, params=params)
+
+    def list_zones_with_info(self, page=1, per_page=20, status=None):
+        """Listing a page of zones together with the pagination information
+
+        :return: a tuple of the zone list and the result info dictionary, for example
+        {"page": 1, "per_page": 20, "count": 20, "total_count": 2000, "total_pages": 100}
+        """
+        params = {'page': page, 'per_page': per_page}
+        if status is not None:
+            params['status'] = status
+        response = self._api(self.cf_raw.zones.get, params=params)
+        return response['result'], response['result_info']
+
+    def iter_zones(self, per_page=50, status=None):
+        """Iterating over all the zones of the account, one page request at a time"""
+        page = 1
+        while True:
+            zones, result_info = self.list_zones_with_info(page=page, per_page=per_page, status=status)
+            for zone_info in zones:
+                yield zone_info
+            if page >= result_info['total_pages']:
+                break
+            page += 1
 
     def get_zone_info(self, domain_name):
-        zones = self.cf.zones.get(params={'name': domain_name, 'per_page': 1})
+        if self.zone_index is not None:
+            return self.zone_index.get(domain_name)
+        if self.zone_cache is not None:
+            zone_info = self.zone_cache.get(self.api_email, domain_name)
+            if zone_info is not None:
+                return zone_info
+        zones = self._api(self.cf.zones.get, params={'name': domain_name, 'per_page': 1})
         if len(zones) > 0:
+            if self.zone_cache is not None:
+                self.zone_cache.set(self.api_email, zones[0])
             return zones[0]
 
     def create_zone(self, domain_name):
         data = {'name': domain_name}
-        zone_info = self.cf.zones.post(data=data)
+        zone_info = self._api(self.cf.zones.post, data=data)
+        if (self.zone_cache is not None) and (zone_info is not None):
+            self.zone_cache.set(self.api_email, zone_info)
         return zone_info
 
     def delete_zone_by_name(self, domain_name):
-        zones = self.cf.zones.get(params={'name': domain_name, 'per_page': 1})
+        if self.zone_cache is not None:
+            self.zone_cache.invalidate(self.api_email, domain_name)
+        zones = self._api(self.cf.zones.get, params={'name': domain_name, 'per_page': 1})
         if len(zones) > 0:
             zone_id = zones[0]['id']
-            return self.cf.zones.delete(zone_id)
+            return self._api(self.cf.zones.delete, zone_id)
 
-    def list_dns_records(self, zone_id, page=1, per_page=20):
+    @staticmethod
+    def _dns_records_params(page, per_page, record_type, record_name, content):
         params = {'page': page, 'per_page': per_page}
-        return self.cf.zones.dns_records.get(
-            zone_id, params=params)
+        if record_type is not None:
+            params['type'] = record_type
+        if record_name is not None:
+            params['name'] = record_name
+        if content is not None:
+            params['content'] = content
+        return params
+
+    def list_dns_records(self, zone_id, page=1, per_page=20, record_type=None, record_name=None, content=None):
+        """Listing a page of DNS records
+
+        :param record_type: only list the records of this type
+        :param record_name: only list the records with this name
+        :param content: only list the records with this content
+        """
+        params = self._dns_records_params(page, per_page, record_type, record_name, content)
+        return self._api(self.cf.zones.dns_records.get, zone_id, params=params)
+
+    def list_dns_records_with_info(self, zone_id, page=1, per_page=20, record_type=None, record_name=None,
+                                   content=None):
+        """Listing a page of DNS records together with the pagination information
+
+        The filters are the same as list_dns_records.
 
-    def create_dns_record(self, zone_id, record_type, record_name, content):
+        :return: a tuple of the DNS record list and the result info dictionary, for example
+        {"page": 1, "per_page": 20, "count": 20, "total_count": 2000, "total_pages": 100}
+        """
+        params = self._dns_records_params(page, per_page, record_type, record_name, content)
+        response = self._api(self.cf_raw.zones.dns_records.get, zone_id, params=params)
+        return response['result'], response['result_info']
+
+    def iter_dns_records(self, zone_id, per_page=None, record_type=None, record_name=None, content=None):
+        """Iterating over all the DNS records of a zone
+
+        The pages are requested lazily, using page_size records per page unless per_page is given, and the iteration
+        stops at the last page reported by the API. The filters are the same as list_dns_records.
+        """
+        if per_page is None:
+            per_page = self.page_size
+        page = 1
+        while True:
+            dns_records, result_info = self.list_dns_records_with_info(
+                zone_id, page=page, per_page=per_page, record_type=record_type, record_name=record_name,
+                content=content)
+            for dns_record in dns_records:
+                yield dns_record
+            if page >= result_info['total_pages']:
+                break
+            page += 1
+
+    def find_dns_records(self, zone_id, record_type, record_name, content=None):
+        """Finding the DNS records matching a type, a name and optionally a content, filtered by the API
+
+        :return: the list of matching DNS records, usually fetched with a single small request
+        """
+        return list(self.iter_dns_records(
+            zone_id, per_page=100, record_type=record_type, record_name=record_name, content=content))
+
+    def _write_dns_record(self, api_call, zone_id, record_id, data, proxied):
+        """Creating (record_id is None) or updating a DNS record, with its proxy status in the same request
+
+        :param proxied: True or False to set the proxy status, None to use the proxied attribute of the wrapper.
+            When both are None, the record is proxied when it is proxiable: the local decision table sends proxied
+            with the write, and a second write only follows when the API reports a proxiable record that the table
+            did not expect.
+        """
+        args = (zone_id,) if record_id is None else (zone_id, record_id)
+        if proxied is None:
+            proxied = self.proxied
+        proxied = proxied_for_type(data['type'], proxied)
+        if proxied is not None:
+            data['proxied'] = proxied
+            return self._api(api_call, *args, data=data)
+
+        if is_proxiable(data['type'], data['name'], data['content']):
+            data['proxied'] = True
+            try:
+                return self._api(api_call, *args, data=data)
+            except CloudFlareAPIError as e:
+                if 'prox' not in (e.message or '').lower():
+                    raise
+                del data['proxied']
+        dns_record = self._api(api_call, *args, data=data)
+        if (dns_record is not None) and dns_record.get('proxiable') and (not dns_record.get('proxied')):
+            data['proxied'] = True
+            dns_record = self._api(self.cf.zones.dns_records.put, zone_id, dns_record['id'], data=data)
+        return dns_record
+
+    def create_dns_record(self, zone_id, record_type, record_name, content, proxied=None):
         """Creating a DNS record
 
         :param zone_id: The zone identifier
         :param record_type: The record type
         :param record_name: the record name
         :param content: the record content
+        :param proxied: True or False to set the proxy status, None to proxy the record when it is proxiable
         :return: a dictionary, for example:
         {
             "id": "372e67954025e0ba6aaa6d586b9e0b59",
@@ -64,11 +346,7 @@ class CloudFlareLibWrapper(object):
             'name': record_name, 'type': record_type, 'content': content,
             'zone_id': zone_id
         }
-        dns_record = self.cf.zones.dns_records.post(zone_id, data=data)
-        if (dns_record is not None) and dns_record.get('proxiable') and (not dns_record.get('proxied')):
-            data['proxied'] = True
-            dns_record = self.cf.zones.dns_records.put(zone_id, dns_record['id'], data=data)
-        return dns_record
+        return self._write_dns_record(self.cf.zones.dns_records.post, zone_id, None, data, proxied)
 
     def delete_dns_record(self, zone_id, record_id):
         """ Deleting a DNS record
@@ -80,10 +358,9 @@ class CloudFlareLibWrapper(object):
         "id": "372e67954025e0ba6aaa6d586b9e0b59"
         }
         """
-        return self.cf.zones.dns_records.delete(
-            zone_id, record_id)
+        return self._api(self.cf.zones.dns_records.delete, zone_id, record_id)
 
-    def update_dns_record(self, zone_id, record_id, record_type, record_name, content):
+    def update_dns_record(self, zone_id, record_id, record_type, record_name, content, proxied=None):
         """ Updating a DNS record
 
         :param zone_id: The zone identifier
@@ -91,6 +368,7 @@ class CloudFlareLibWrapper(object):
         :param record_type: The record type
         :param record_name: The record name
         :param content: The record content
+        :param proxied: True or False to set the proxy status, None to proxy the record when it is proxiable
         :return: a dictionary for example
         {
             "id": "372e67954025e0ba6aaa6d586b9e0b59",
@@ -109,8 +387,308 @@ class CloudFlareLibWrapper(object):
           }
         """
         data = {'name': record_name, 'type': record_type, 'content': content}
-        dns_record = self.cf.zones.dns_records.put(zone_id, record_id, data=data)
-        if (dns_record is not None) and dns_record.get('proxiable') and (not dns_record.get('proxied')):
-            data['proxied'] = True
-            dns_record = self.cf.zones.dns_records.put(zone_id, record_id, data=data)
-        return dns_record
+        return self._write_dns_record(self.cf.zones.dns_records.put, zone_id, record_id, data, proxied)
+
+    def batch_dns_records(self, zone_id, deletes=None, patches=None, puts=None, posts=None):
+        """Applying several changes to the DNS records of a zone with a single request
+
+        The batch is atomic: either all its changes are applied, or the request fails and none is.
+
+        :param zone_id: The zone identifier
+        :param deletes: the records to delete, as dictionaries with their id
+        :param patches: the partial updates, as dictionaries with the record id and the changed fields
+        :param puts: the full updates, as dictionaries with the record id, type, name and content
+        :param posts: the records to create, as dictionaries with their type, name and content
+        :return: a dictionary with the resulting records of every kind of change, in the order of the request:
+        {
+            "deletes": [{"id": "372e67954025e0ba6aaa6d586b9e0b59", ...}],
+            "patches": [],
+            "puts": [],
+            "posts": []
+        }
+        """
+        data = {}
+        for key, changes in (('deletes', deletes), ('patches', patches), ('puts', puts), ('posts', posts)):
+            if changes:
+                data[key] = changes
+        return self._api(self.cf.zones.dns_records.post, zone_id, 'batch', data=data)
+
+    def _record_data(self, record_type, record_name, content, proxied):
+        data = {'name': record_name, 'type': record_type, 'content': content}
+        if proxied is None:
+            proxied = self.proxied
+        proxied = proxied_for_type(record_type, proxied)
+        if proxied is None and is_proxiable(record_type, record_name, content):
+            proxied = True
+        if proxied is not None:
+            data['proxied'] = proxied
+        return data
+
+    def _write_batch(self, zone_id, key, chunk, to_change):
+        """Sending a chunk of changes in a batch, returning their resulting records"""
+        changes = [to_change(item) for item in chunk]
+        dns_records = self.batch_dns_records(zone_id, **{key: changes})[key]
+        if key == 'deletes' or self.proxied is not None:
+            return dns_records
+        # like the single writes, proxying the records that the API reports proxiable after all
+        patches = [
+            {'id': dns_record['id'], 'proxied': True} for change, dns_record in zip(changes, dns_records)
+            if 'proxied' not in change and dns_record.get('proxiable') and not dns_record.get('proxied')]
+        if patches:
+            try:
+                patched = self.batch_dns_records(zone_id, patches=patches)['patches']
+            except CloudFlareAPIError:
+                # the records are written already, only their proxy status is sent again, one record at a time
+                patched = self._patch_proxied(zone_id, patches)
+            patched = dict((dns_record['id'], dns_record) for dns_record in patched)
+            dns_records = [patched.get(dns_record['id'], dns_record) for dns_record in dns_records]
+        return dns_records
+
+    def _patch_proxied(self, zone_id, patches):
+        """Proxying written records one by one, a record failing to be proxied being left as written"""
+        patched = []
+        for patch in patches:
+            try:
+                patched.append(self._api(
+                    self.cf.zones.dns_records.patch, zone_id, patch['id'], data={'proxied': patch['proxied']}))
+            except CloudFlareAPIError:
+                pass
+        return patched
+
+    def _write_in_batches(self, zone_id, key, items, to_change, write_one):
+        """Writing many records of a zone in batches, falling back to one request per record
+
+        A chunk is written record by record when batching is disabled, when the chunk has a single record, or when
+        its batch fails: the batch being atomic, a single invalid record fails the whole batch, while the other
+        records can still be written and every failure reported with its own record.
+
+        :return: a generator of (item, resulting record, exception) tuples, in the order of items
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= (self.batch_size or 1):
+                for result in self._write_chunk(zone_id, key, chunk, to_change, write_one):
+                    yield result
+                chunk = []
+        if chunk:
+            for result in self._write_chunk(zone_id, key, chunk, to_change, write_one):
+                yield result
+
+    def _write_chunk(self, zone_id, key, chunk, to_change, write_one):
+        if self.batch_size and len(chunk) > 1:
+            try:
+                dns_records = self._write_batch(zone_id, key, chunk, to_change)
+            except CloudFlareAPIError as e:
+                if e.code in BATCH_UNAVAILABLE_CODES:
+                    self.batch_size = None
+            else:
+                return [(item, dns_record, None) for item, dns_record in zip(chunk, dns_records)]
+        results = []
+        for item in chunk:
+            try:
+                results.append((item, write_one(item), None))
+            except CloudFlareAPIError as e:
+                results.append((item, None, e))
+        return results
+
+    def create_dns_records(self, zone_id, records):
+        """Creating many DNS records of a zone
+
+        :param zone_id: The zone identifier
+        :param records: the (record type, record name, content) tuples of the records to create
+        :return: a generator of (record tuple, created record, exception) tuples, in the order of records
+        """
+        return self._write_in_batches(
+            zone_id, 'posts', records,
+            lambda record: self._record_data(record[0], record[1], record[2], None),
+            lambda record: self.create_dns_record(zone_id, *record))
+
+    def update_dns_records(self, zone_id, records):
+        """Updating many DNS records of a zone
+
+        :param zone_id: The zone identifier
+        :param records: the (record id, record type, record name, content) tuples of the records to update
+        :return: a generator of (record tuple, updated record, exception) tuples, in the order of records
+        """
+        def to_change(record):
+            change = self._record_data(record[1], record[2], record[3], None)
+            change['id'] = record[0]
+            return change
+
+        return self._write_in_batches(
+            zone_id, 'puts', records, to_change, lambda record: self.update_dns_record(zone_id, *record))
+
+    def delete_dns_records(self, zone_id, record_ids):
+        """Deleting many DNS records of a zone
+
+        :param zone_id: The zone identifier
+        :param record_ids: the identifiers of the records to delete
+        :return: a generator of (record id, deleted record, exception) tuples, in the order of record_ids
+        """
+        return self._write_in_batches(
+            zone_id, 'deletes', record_ids, lambda record_id: {'id': record_id},
+            lambda record_id: self.delete_dns_record(zone_id, record_id))
+
+    def _http_headers(self):
+        return {'X-Auth-Email': self.api_email, 'X-Auth-Key': self.api_key}
+
+    @staticmethod
+    def _raise_for_response(response):
+        """Raising the error of a failed response like the CloudFlare library does, with its Retry-After delay"""
+        if response.status_code < 400:
+            return
+        try:
+            error = response.json()['errors'][0]
+            e = CloudFlareAPIError(error['code'], error['message'])
+        except (ValueError, KeyError, IndexError, TypeError):
+            e = CloudFlareAPIError(response.status_code, response.reason or 'HTTP error')
+        e.status_code = response.status_code
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                e.retry_after = float(retry_after)
+            except ValueError:
+                pass
+        raise e
+
+    def export_zone_file(self, zone_id, file_name):
+        """Exporting all the DNS records of a zone to a BIND zone file, with a single request
+
+        The file is streamed to disk and only replaces file_name once complete.
+
+        :param zone_id: The zone identifier
+        :param file_name: the zone file to write
+        :return: the size of the zone file in bytes
+        """
+        url = '{0}/zones/{1}/dns_records/export'.format(self.base_url, zone_id)
+        part_file_name = file_name + '.part'
+
+        def send():
+            try:
+                response = self.session.request('GET', url, headers=self._http_headers(), stream=True)
+            except requests.RequestException:
+                raise CloudFlareAPIError(0, 'connection failed.')
+            try:
+                self._raise_for_response(response)
+                size = 0
+                with open(part_file_name, 'wb') as f:
+                    for chunk in response.iter_content(ZONE_FILE_CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                return size
+            except requests.RequestException:
+                raise CloudFlareAPIError(0, 'connection failed.')
+            finally:
+                response.close()
+
+        try:
+            size = self._request(
+                'GET', send, endpoint='zones/:id/dns_records/export', bytes_received=lambda size: size)
+        except CloudFlareAPIError:
+            if os.path.exists(part_file_name):
+                os.remove(part_file_name)
+            raise
+        os.rename(part_file_name, file_name)
+        return size
+
+    def import_zone_file(self, zone_id, file_name, proxied=None):
+        """Importing the DNS records of a BIND zone file into a zone, with a single request
+
+        :param zone_id: The zone identifier
+        :param file_name: the zone file to read
+        :param proxied: True or False to set the proxy status of the imported records, None to use the proxied
+            attribute of the wrapper, leaving them unproxied when both are None
+        :return: a dictionary, for example:
+        {
+            "recs_added": 5,
+            "total_records_parsed": 5
+        }
+        """
+        url = '{0}/zones/{1}/dns_records/import'.format(self.base_url, zone_id)
+        if proxied is None:
+            proxied = self.proxied
+        data = {} if proxied is None else {'proxied': 'true' if proxied else 'false'}
+
+        def send():
+            with open(file_name, 'rb') as f:
+                try:
+                    response = self.session.request(
+                        'POST', url, headers=self._http_headers(), data=data,
+                        files={'file': (os.path.basename(file_name), f)})
+                except requests.RequestException:
+                    raise CloudFlareAPIError(0, 'connection failed.')
+            self._local.response_size = len(response.content)
+            self._raise_for_response(response)
+            try:
+                return response.json()['result']
+            except (ValueError, KeyError, TypeError):
+                raise CloudFlareAPIError(0, 'JSON parse failed.')
+
+        bytes_sent = os.path.getsize(file_name) if os.path.isfile(file_name) else 0
+        return self._request(
+            'POST', send, endpoint='zones/:id/dns_records/import', bytes_sent=bytes_sent,
+            bytes_received=lambda result: self._local.response_size)
+
+
+class ThreadPoolCloudFlareLibWrapper(object):
+    """CloudFlareLibWrapper running its requests on a pool of threads
+
+    Every method submits its request to a pool of max_in_flight threads and returns at once with a
+    multiprocessing.pool.AsyncResult. Its get() method waits for the response and returns it, or raises the
+    CloudFlareAPIError of the request. Each request still blocks a thread of the pool while in flight: at most
+    max_in_flight requests are running at the same time, the other ones wait in a queue. The *_async functions of
+    bulk_dns run their per-zone operations on the same pool.
+    """
+    def __init__(self, api_key, api_email, max_in_flight=100, cf_lib_wrapper=None):
+        self.api_key = api_key
+        self.api_email = api_email
+        self.max_in_flight = max_in_flight
+        if cf_lib_wrapper is None:
+            cf_lib_wrapper = CloudFlareLibWrapper(
+                api_key, api_email, retry_policy=RetryPolicy(), session=HttpSession(pool_size=max_in_flight))
+        self.cf_lib_wrapper = cf_lib_wrapper
+        self.pool = ThreadPool(max_in_flight)
+
+    def submit(self, func, *args, **kwargs):
+        """Running any function that does API requests within the in-flight limit
+
+        :param func: the function to run
+        :return: a multiprocessing.pool.AsyncResult of the function result
+        """
+        return self.pool.apply_async(func, args, kwargs)
+
+    def close(self):
+        """Waiting for the submitted requests, then releasing the worker threads"""
+        self.pool.close()
+        self.pool.join()
+
+    def list_zones(self, page=1, per_page=20, status=None):
+        return self.submit(self.cf_lib_wrapper.list_zones, page=page, per_page=per_page, status=status)
+
+    def get_zone_info(self, domain_name):
+        return self.submit(self.cf_lib_wrapper.get_zone_info, domain_name)
+
+    def create_zone(self, domain_name):
+        return self.submit(self.cf_lib_wrapper.create_zone, domain_name)
+
+    def delete_zone_by_name(self, domain_name):
+        return self.submit(self.cf_lib_wrapper.delete_zone_by_name, domain_name)
+
+    def list_dns_records(self, zone_id, page=1, per_page=20, record_type=None, record_name=None, content=None):
+        """The filters are the same as CloudFlareLibWrapper.list_dns_records"""
+        return self.submit(
+            self.cf_lib_wrapper.list_dns_records, zone_id, page=page, per_page=per_page, record_type=record_type,
+            record_name=record_name, content=content)
+
+    def create_dns_record(self, zone_id, record_type, record_name, content, proxied=None):
+        return self.submit(
+            self.cf_lib_wrapper.create_dns_record, zone_id, record_type, record_name, content, proxied=proxied)
+
+    def delete_dns_record(self, zone_id, record_id):
+        return self.submit(self.cf_lib_wrapper.delete_dns_record, zone_id, record_id)
+
+    def update_dns_record(self, zone_id, record_id, record_type, record_name, content, proxied=None):
+        return self.submit(
+            self.cf_lib_wrapper.update_dns_record, zone_id, record_id, record_type, record_name, content,
+            proxied=proxied)
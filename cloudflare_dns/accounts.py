@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+
+try:
+    from ConfigParser import RawConfigParser
+except ImportError:
+    from configparser import RawConfigParser
+
+from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns.session import HttpSession
+from cloudflare_dns.shard import shard_of
+
+
+def read_credentials(file_name):
+    """Reading the accounts of a credentials file
+
+    Every section of the file is an account, named after the section, with the email and the API key of the account,
+    like the configuration file of the CloudFlare library:
+
+        [production]
+        email = ops@example.com
+        token = 0123456789abcdef
+
+    :return: a list of (name, email, api key) tuples, in the order of the file
+    :raise ValueError: when the file has no account, or an account misses its email or its API key
+    """
+    parser = RawConfigParser()
+    if not parser.read(file_name):
+        raise ValueError('Cannot read the credentials file {0}'.format(file_name))
+    accounts = []
+    for name in parser.sections():
+        if not parser.has_option(name, 'email') or not parser.has_option(name, 'token'):
+            raise ValueError('The account {0} of {1} needs an email and a token'.format(name, file_name))
+        accounts.append((name, parser.get(name, 'email'), parser.get(name, 'token')))
+    if not accounts:
+        raise ValueError('No account in the credentials file {0}'.format(file_name))
+    return accounts
+
+
+class AccountPool(object):
+    """The CloudFlareLibWrapper of every account the zones are spread over, with the account owning each zone
+
+    Every account has its own wrapper, so its own rate limiter, while they may share the HTTP session, the zone cache
+    and the metrics. The owner of a zone is found from the zone index or the zone cache of the accounts when they hold
+    it, otherwise by looking the zone up in every account in turn, and is then kept for the rest of the run. The zone
+    cache being kept by account, the owners found are cached for the next runs too.
+
+    :param accounts: the (name, CloudFlareLibWrapper) pairs of the accounts, in lookup order
+    """
+    def __init__(self, accounts):
+        self.accounts = OrderedDict(accounts)
+        if not self.accounts:
+            raise ValueError('An account pool needs at least one account')
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._zone_counts = dict((name, 0) for name in self.accounts)
+
+    @classmethod
+    def from_credentials(cls, file_name, base_url=None, session=None):
+        """Building the pool of the accounts of a credentials file, all of them sending their requests through
+        one HTTP session
+        """
+        session = session if session is not None else HttpSession()
+        return cls([
+            (name, CloudFlareLibWrapper(api_key, api_email, base_url=base_url, session=session))
+            for name, api_email, api_key in read_credentials(file_name)])
+
+    @staticmethod
+    def _held_zone_info(cf_lib_wrapper, domain_name):
+        if cf_lib_wrapper.zone_index is not None:
+            return cf_lib_wrapper.zone_index.get(domain_name)
+        if cf_lib_wrapper.zone_cache is not None:
+            return cf_lib_wrapper.zone_cache.get(cf_lib_wrapper.api_email, domain_name)
+
+    def _find_owner(self, domain_name):
+        for name, cf_lib_wrapper in self.accounts.items():
+            if self._held_zone_info(cf_lib_wrapper, domain_name) is not None:
+                return name
+        for name, cf_lib_wrapper in self.accounts.items():
+            # an account with a zone index holds all its zones, and was checked already
+            if cf_lib_wrapper.zone_index is None and cf_lib_wrapper.get_zone_info(domain_name) is not None:
+                return name
+
+    def _route(self, domain_name, name):
+        domain_name = domain_name.lower()
+        with self._lock:
+            # a zone is counted once, whatever the number of requests routed for it
+            owner = self._owners.get(domain_name)
+            if owner != name:
+                self._owners[domain_name] = name
+                self._zone_counts[name] += 1
+                if owner is not None:
+                    self._zone_counts[owner] -= 1
+        return self.accounts[name]
+
+    def wrapper_for(self, domain_name):
+        """The wrapper of the account owning a zone, the first account's when no account owns it"""
+        with self._lock:
+            name = self._owners.get(domain_name.lower())
+        if name is None:
+            name = self._find_owner(domain_name) or next(iter(self.accounts))
+        return self._route(domain_name, name)
+
+    def wrapper_for_new_zone(self, domain_name):
+        """The wrapper of the account a new zone is added to, spreading the new zones evenly over the accounts
+
+        The account is chosen after a hash of the zone name, so that an interrupted run adds its zones to the same
+        accounts when resumed.
+        """
+        return self._route(domain_name, list(self.accounts)[shard_of(domain_name, len(self.accounts)) - 1])
+
+    def zone_counts(self):
+        """The number of zones routed to every account, by account name"""
+        with self._lock:
+            return OrderedDict((name, self._zone_counts[name]) for name in self.accounts)
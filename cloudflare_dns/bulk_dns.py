@@ -1,8 +1,8 @@
 from __future__ import print_function
 
-import csv
 import datetime
 import getopt
+import inspect
 import os
 import sys
 from functools import wraps
@@ -11,138 +11,538 @@ from CloudFlare.exceptions import CloudFlareAPIError
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns.accounts import AccountPool
+from cloudflare_dns.domains import DomainList, read_domain_names, spool_stdin, STDIN_FILE_NAME
+from cloudflare_dns.engine import run_zone_tasks, run_zone_tasks_on_pool
+from cloudflare_dns.job import plan_zone_job, read_job
+from cloudflare_dns.journal import Journal, journal_path, new_run_id
+from cloudflare_dns.metrics import Metrics, PrometheusTextfileWriter, DEFAULT_PROMETHEUS_INTERVAL
+from cloudflare_dns.output import (
+    OutputWriter, open_sink, OUTPUT_CSV, OUTPUT_FORMATS, CONSOLE_VERBOSE, CONSOLE_QUIET, CONSOLE_PROGRESS)
+from cloudflare_dns.proxiable import proxied_for_type
+from cloudflare_dns.records import DnsRecord
+from cloudflare_dns.retry import RetryPolicy, is_retryable
+from cloudflare_dns.snapshot import (
+    RecordSnapshot, DEFAULT_MAX_AGE as SNAPSHOT_MAX_AGE, PROBE_SIZE as SNAPSHOT_PROBE_SIZE, SNAPSHOT_READ,
+    SNAPSHOT_REFRESH, SNAPSHOT_UPDATE)
+from cloudflare_dns.shard import (
+    in_shard, merge_reports, merged_report_prefix, missing_shards, parse_shard, shard_suffix)
+from cloudflare_dns.sync import plan_zone_sync, read_desired_state, same_record, zone_record_name
+from cloudflare_dns.rate_limit import TokenBucket, DEFAULT_RATE, DEFAULT_BURST
+from cloudflare_dns.zone_cache import ZoneCache, DEFAULT_TTL
+from cloudflare_dns.zone_index import prepare_zone_lookup, ZONE_LOOKUP_AUTO, ZONE_LOOKUP_STRATEGIES
+
+# The number of zones exported or imported at the same time by default, each zone file taking a single request
+ZONE_FILE_WORKERS = 4
+
+
+def environment_wrapper():
+    """The wrapper of the credentials of the environment: the accounts of CLOUDFLARE_CREDENTIALS_FILE, or the account
+    of CLOUDFLARE_API_KEY and CLOUDFLARE_API_EMAIL
+
+    :raise ValueError: when the credentials are not set
+    """
+    if os.environ.get('CLOUDFLARE_CREDENTIALS_FILE'):
+        return AccountPool.from_credentials(
+            os.environ['CLOUDFLARE_CREDENTIALS_FILE'], base_url=os.environ.get('CLOUDFLARE_API_BASE_URL'))
+    api_key = os.environ.get('CLOUDFLARE_API_KEY')
+    if not api_key:
+        raise ValueError('The environment variable CLOUDFLARE_API_KEY is not set')
+
+    api_email = os.environ.get('CLOUDFLARE_API_EMAIL')
+    if not api_email:
+        raise ValueError('The environment variable CLOUDFLARE_API_EMAIL is not set')
+
+    return CloudFlareLibWrapper(api_key, api_email, base_url=os.environ.get('CLOUDFLARE_API_BASE_URL'))
 
 
 def configured(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if kwargs.get('cf_lib_wrapper') is None:
-            api_key = os.environ.get('CLOUDFLARE_API_KEY')
-            if not api_key:
-                raise ValueError('The environment variable CLOUDFLARE_API_KEY is not set')
-
-            api_email = os.environ.get('CLOUDFLARE_API_EMAIL')
-            if not api_email:
-                raise ValueError('The environment variable CLOUDFLARE_API_EMAIL is not set')
-
-            kwargs['cf_lib_wrapper'] = CloudFlareLibWrapper(api_key, api_email)
+            kwargs['cf_lib_wrapper'] = environment_wrapper()
         return f(*args, **kwargs)
 
     return decorated_function
 
 
+def tolerant_callback(cb):
+    """Wrapping a callback to only pass it the keyword arguments it accepts
+
+    The callbacks receive succeed, response and exception, and also retries, plus unchanged for the writes that can be
+    skipped. A callback written for the first three only, without **kwargs, is wrapped to receive the arguments it
+    names, the callables that cannot be inspected receiving them all.
+    """
+    if cb is None:
+        return None
+    try:
+        arg_spec = inspect.getargspec(cb)
+    except TypeError:
+        return cb
+    if arg_spec.keywords is not None:
+        return cb
+    arg_names = set(arg_spec.args)
+
+    @wraps(cb)
+    def wrapped(**kwargs):
+        return cb(**dict((name, value) for name, value in kwargs.items() if name in arg_names))
+
+    return wrapped
+
+
 def add_new_domain(domain_name, domain_added_cb=None, cf_lib_wrapper=None):
+    domain_added_cb = tolerant_callback(domain_added_cb)
     try:
         zone_info = cf_lib_wrapper.create_zone(domain_name)
         if domain_added_cb is not None and hasattr(domain_added_cb, '__call__'):
-            domain_added_cb(succeed=True, response=zone_info)
+            domain_added_cb(succeed=True, response=zone_info, retries=cf_lib_wrapper.take_retry_count())
     except CloudFlareAPIError as e:
-        if "already exists" not in e.message:
+        # the transient errors reaching here have used up their retries, they only fail this domain
+        if ("already exists" not in e.message) and (not is_retryable(e)):
             raise e
         if domain_added_cb is not None and hasattr(domain_added_cb, '__call__'):
-            domain_added_cb(succeed=False, response={'name': domain_name}, exception=e)
+            domain_added_cb(
+                succeed=False, response={'name': domain_name}, exception=e, retries=cf_lib_wrapper.take_retry_count())
 
 
 def delete_all_records(domain_name, record_deleted_cb=None, cf_lib_wrapper=None):
+    record_deleted_cb = tolerant_callback(record_deleted_cb)
     zone_info = cf_lib_wrapper.get_zone_info(domain_name)
     if zone_info is None:
-        record_deleted_cb(succeed=False, exception=ValueError('zone_info is None'))
+        record_deleted_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
         return
-    page = 1
-    while True:
-        dns_records = cf_lib_wrapper.list_dns_records(zone_info['id'], page=page, per_page=20)
-        for dns_record in dns_records:
-            record_info = cf_lib_wrapper.delete_dns_record(zone_info['id'], dns_record['id'])
-            record_deleted_cb(succeed=True, response=record_info)
-        if len(dns_records) < 20:
-            break
-        page += 1
+    # the listing is completed before deleting, as the deletions would shift the following pages
+    dns_records = list(cf_lib_wrapper.iter_dns_records(zone_info['id']))
+    record_ids = [dns_record['id'] for dns_record in dns_records]
+    for record_id, record_info, exception in cf_lib_wrapper.delete_dns_records(zone_info['id'], record_ids):
+        if exception is None:
+            record_deleted_cb(succeed=True, response=record_info, retries=cf_lib_wrapper.take_retry_count())
+        else:
+            record_deleted_cb(
+                succeed=False, response={'id': record_id}, exception=exception,
+                retries=cf_lib_wrapper.take_retry_count())
+
+
+def _unchanged(dns_record, record_type, record_name, content, cf_lib_wrapper):
+    """Telling whether writing a record would leave an existing DNS record as it is"""
+    return same_record(dns_record, record_type, record_name, content) and (
+        proxied_for_type(record_type, cf_lib_wrapper.proxied) is None or
+        dns_record.get('proxied') == cf_lib_wrapper.proxied)
 
 
 def add_new_record(domain_name, record_type, record_name, record_content, record_added_cb=None, cf_lib_wrapper=None):
+    """Adding a record to a zone, unless the zone already has it, which is reported with unchanged=True"""
+    record_added_cb = tolerant_callback(record_added_cb)
     zone_info = cf_lib_wrapper.get_zone_info(domain_name)
     if zone_info is None:
-        record_added_cb(succeed=False, exception=ValueError('zone_info is None'))
+        record_added_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
         return
+    if not record_name:
+        record_name = domain_name
+
+    if "{{zone}}" in record_content:
+        modified_record_content = record_content.replace("{{zone}}", domain_name)
+    else:
+        modified_record_content = record_content
+
+    full_record_name = zone_record_name(record_name, domain_name)
     try:
-        if not record_name:
-            record_name = domain_name
+        dns_records = cf_lib_wrapper.find_dns_records(
+            zone_info['id'], record_type, full_record_name, content=modified_record_content)
+    except CloudFlareAPIError as e:
+        # a failed lookup only fails this zone, like a failed write
+        record_added_cb(succeed=False, exception=e, retries=cf_lib_wrapper.take_retry_count())
+        return
+    for dns_record in dns_records:
+        if _unchanged(dns_record, record_type, full_record_name, modified_record_content, cf_lib_wrapper):
+            record_added_cb(
+                succeed=True, response=dns_record, unchanged=True, retries=cf_lib_wrapper.take_retry_count())
+            return
 
-        if "{{zone}}" in record_content:
-            modified_record_content = record_content.replace("{{zone}}", domain_name)
+    records = [(record_type, record_name, modified_record_content)]
+    for _, record_info, exception in cf_lib_wrapper.create_dns_records(zone_info['id'], records):
+        if exception is None:
+            record_added_cb(succeed=True, response=record_info, retries=cf_lib_wrapper.take_retry_count())
         else:
-            modified_record_content = record_content
+            record_added_cb(succeed=False, exception=exception, retries=cf_lib_wrapper.take_retry_count())
 
-        record_info = cf_lib_wrapper.create_dns_record(
-            zone_info['id'], record_type, record_name, modified_record_content)
-        record_added_cb(succeed=True, response=record_info)
-    except CloudFlareAPIError as e:
-        record_added_cb(succeed=False, exception=e)
+
+def _zone_template(content, domain_name):
+    if "{{zone}}" in content:
+        return content.replace("{{zone}}", domain_name)
+    return content
+
+
+def _edit_record_name(domain_name, record_type, record_name):
+    if record_name is None:
+        record_name = domain_name
+
+    if record_type in ('TXT', 'CNAME'):
+        return "{0}.{1}".format(record_name, domain_name)
+    return record_name
+
+
+def _records_to_edit(dns_records, domain_name, record_type, modified_record_name, old_record_content):
+    if old_record_content is not None:
+        modified_old_record_content = _zone_template(old_record_content, domain_name)
+    for dns_record in dns_records:
+        if (dns_record['type'] != record_type) or (dns_record['name'] != modified_record_name):
+            continue
+        if (old_record_content is None) or (dns_record['content'] == modified_old_record_content):
+            yield dns_record
+
+
+def _lookup_records_to_edit(zone_id, domain_name, record_type, modified_record_name, old_record_content,
+                            new_record_content, cf_lib_wrapper=None):
+    """All the records to edit, matched against a single listing: the records with the old content, or when there are
+    none, the records with the new content, which a previous run may have edited
+
+    The listing is filtered by the API on the type and the name, the full listing being only requested when the
+    filtered one matches neither content.
+    """
+    def matching(dns_records):
+        dns_records = list(dns_records)
+        records_info = list(_records_to_edit(
+            dns_records, domain_name, record_type, modified_record_name, old_record_content))
+        if not records_info and old_record_content is not None:
+            records_info = list(_records_to_edit(
+                dns_records, domain_name, record_type, modified_record_name, new_record_content))
+        return records_info
+
+    records_info = matching(cf_lib_wrapper.find_dns_records(zone_id, record_type, modified_record_name))
+    if not records_info:
+        # the API filters may not match exactly like the local comparison, e.g. on letter case
+        records_info = matching(cf_lib_wrapper.iter_dns_records(zone_id))
+    return records_info
 
 
 def edit_record(domain_name, record_type, record_name, old_record_content, new_record_content, record_edited_cb=None,
-                cf_lib_wrapper=None):
+                cf_lib_wrapper=None, all_matches=False):
+    """Editing a record of a zone, unless it already has the new content, which is reported with unchanged=True
+
+    With all_matches, every record matching the type, the name and the old content is edited instead of the first
+    one, the records being collected from a single listing and updated together, and each reported on its own.
+    """
+    record_edited_cb = tolerant_callback(record_edited_cb)
     zone_info = cf_lib_wrapper.get_zone_info(domain_name)
     if zone_info is None:
-        record_edited_cb(succeed=False, exception=ValueError('zone_info is None'))
+        record_edited_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
         return
 
-    if record_name is None:
-        record_name = domain_name
+    modified_record_name = _edit_record_name(domain_name, record_type, record_name)
+    records_info = _lookup_records_to_edit(
+        zone_info['id'], domain_name, record_type, modified_record_name, old_record_content, new_record_content,
+        cf_lib_wrapper=cf_lib_wrapper)
+    if not records_info:
+        record_edited_cb(
+            succeed=False, exception=ValueError('Existing DNS record not found'), retries=cf_lib_wrapper.take_retry_count())
+        return
+    if not all_matches:
+        records_info = records_info[:1]
+    modified_new_record_content = _zone_template(new_record_content, domain_name)
+    records = []
+    for record_info in records_info:
+        if _unchanged(record_info, record_type, modified_record_name, modified_new_record_content, cf_lib_wrapper):
+            record_edited_cb(
+                succeed=True, response=record_info, unchanged=True, retries=cf_lib_wrapper.take_retry_count())
+        else:
+            records.append((record_info['id'], record_info['type'], modified_record_name, modified_new_record_content))
+    for _, record_info, exception in cf_lib_wrapper.update_dns_records(zone_info['id'], records):
+        if exception is None:
+            record_edited_cb(succeed=True, response=record_info, retries=cf_lib_wrapper.take_retry_count())
+        else:
+            record_edited_cb(succeed=False, exception=exception, retries=cf_lib_wrapper.take_retry_count())
 
-    if record_type in ('TXT', 'CNAME'):
-        modified_record_name = "{0}.{1}".format(record_name, domain_name)
-    else:
-        modified_record_name = record_name
-    record_info = None
-    page = 1
-    while True:
-        dns_records = cf_lib_wrapper.list_dns_records(zone_info['id'], page=page, per_page=20)
-        for dns_record in dns_records:
-            if old_record_content is None:
-                if dns_record['type'] == record_type and dns_record['name'] == modified_record_name:
-                    record_info = dns_record
-                    break
-            else:
-                if "{{zone}}" in old_record_content:
-                    modified_old_record_content = old_record_content.replace("{{zone}}", domain_name)
-                else:
-                    modified_old_record_content = old_record_content
-
-                if (dns_record['type'] == record_type) and (dns_record['name'] == modified_record_name) and (dns_record['content'] == modified_old_record_content):
-                    record_info = dns_record
-                    break
-        if (record_info is not None) or (len(dns_records) < 20):
-            break
-        page += 1
-    if record_info is None:
-        record_edited_cb(succeed=False, exception=ValueError('Existing DNS record not found'))
+
+def _listed_record(dns_record, domain_name, full_records):
+    return dns_record if full_records else DnsRecord.from_dict(dns_record, zone_name=domain_name)
+
+
+def list_records(domain_name, record_listed_cb=None, cf_lib_wrapper=None, snapshot=None, refresh=False,
+                 full_records=False):
+    """Listing the records of a zone
+
+    Every record is reported as a compact cloudflare_dns.records.DnsRecord, or as the full dictionary of the API with
+    full_records. When snapshot is a cloudflare_dns.snapshot.RecordSnapshot, the records listed are saved in it. With
+    refresh, a probe of the first records is checked against the snapshot, and the records of a zone current in the
+    snapshot are answered from it instead of being listed.
+    """
+    record_listed_cb = tolerant_callback(record_listed_cb)
+    zone_info = cf_lib_wrapper.get_zone_info(domain_name)
+    if zone_info is None:
+        record_listed_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
+        return
+    listing = None
+    if refresh:
+        probe, result_info = cf_lib_wrapper.list_dns_records_with_info(
+            zone_info['id'], page=1, per_page=SNAPSHOT_PROBE_SIZE)
+        if snapshot.is_current(zone_info, probe, result_info['total_count']):
+            for dns_record in snapshot.get_records(domain_name):
+                record_listed_cb(
+                    succeed=True, response=_listed_record(dns_record, domain_name, full_records),
+                    retries=cf_lib_wrapper.take_retry_count())
+            return
+        if result_info['total_pages'] <= 1:
+            # the probe holds all the records of a small zone
+            listing = probe
+    if listing is None:
+        listing = cf_lib_wrapper.iter_dns_records(zone_info['id'])
+    dns_records = []
+    for dns_record in listing:
+        if snapshot is not None:
+            dns_records.append(dns_record)
+        record_listed_cb(
+            succeed=True, response=_listed_record(dns_record, domain_name, full_records),
+            retries=cf_lib_wrapper.take_retry_count())
+    if snapshot is not None:
+        snapshot.save(zone_info, dns_records)
+
+
+def list_snapshot_records(domain_name, record_listed_cb=None, snapshot=None, full_records=False):
+    """Listing the records of a zone saved in a cloudflare_dns.snapshot.RecordSnapshot, without any request"""
+    record_listed_cb = tolerant_callback(record_listed_cb)
+    dns_records = snapshot.get_records(domain_name)
+    if dns_records is None:
+        record_listed_cb(succeed=False, exception=ValueError('The zone is not in the snapshot'), retries=0)
+        return
+    for dns_record in dns_records:
+        record_listed_cb(succeed=True, response=_listed_record(dns_record, domain_name, full_records), retries=0)
+
+
+def zone_file_name(directory, domain_name):
+    return os.path.join(directory, "{0}.zone".format(domain_name))
+
+
+def export_zone_file(domain_name, directory, zone_file_exported_cb=None, cf_lib_wrapper=None):
+    zone_file_exported_cb = tolerant_callback(zone_file_exported_cb)
+    zone_info = cf_lib_wrapper.get_zone_info(domain_name)
+    if zone_info is None:
+        zone_file_exported_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
         return
+    file_name = zone_file_name(directory, domain_name)
     try:
-        if "{{zone}}" in new_record_content:
-            modified_new_record_content = new_record_content.replace("{{zone}}", domain_name)
-        else:
-            modified_new_record_content = new_record_content
+        size = cf_lib_wrapper.export_zone_file(zone_info['id'], file_name)
+        zone_file_exported_cb(
+            succeed=True, response={'file': file_name, 'size': size}, retries=cf_lib_wrapper.take_retry_count())
+    except CloudFlareAPIError as e:
+        zone_file_exported_cb(succeed=False, exception=e, retries=cf_lib_wrapper.take_retry_count())
+
 
-        record_info = cf_lib_wrapper.update_dns_record(zone_info['id'], record_info['id'], record_info['type'], modified_record_name, modified_new_record_content)
-        record_edited_cb(succeed=True, response=record_info)
+def import_zone_file(domain_name, directory, zone_file_imported_cb=None, cf_lib_wrapper=None):
+    zone_file_imported_cb = tolerant_callback(zone_file_imported_cb)
+    file_name = zone_file_name(directory, domain_name)
+    if not os.path.isfile(file_name):
+        zone_file_imported_cb(succeed=False, exception=ValueError('Zone file not found'), retries=0)
+        return
+    zone_info = cf_lib_wrapper.get_zone_info(domain_name)
+    if zone_info is None:
+        zone_file_imported_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
+        return
+    try:
+        result = cf_lib_wrapper.import_zone_file(zone_info['id'], file_name)
+        zone_file_imported_cb(succeed=True, response=result, retries=cf_lib_wrapper.take_retry_count())
     except CloudFlareAPIError as e:
-        record_edited_cb(succeed=False, exception=e)
+        zone_file_imported_cb(succeed=False, exception=e, retries=cf_lib_wrapper.take_retry_count())
+
+
+def _sync_change(action, record_id, record_type, record_name, content):
+    return {'action': action, 'id': record_id, 'type': record_type, 'name': record_name, 'content': content}
 
 
-def list_records(domain_name, record_listed_cb=None, cf_lib_wrapper=None):
+def sync_zone(domain_name, desired_records, record_synced_cb=None, plan_only=False, cf_lib_wrapper=None):
+    """Bringing the DNS records of a zone to the desired state with the fewest changes
+
+    Every change is reported to record_synced_cb with a response holding its action (create, update or delete) and
+    its record, then a last response with the action summary holds the plan and its API calls. With plan_only, the
+    changes are reported without being applied.
+    """
+    record_synced_cb = tolerant_callback(record_synced_cb)
+    zone_info = cf_lib_wrapper.get_zone_info(domain_name)
+    if zone_info is None:
+        record_synced_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
+        return
+    zone_id = zone_info['id']
+    plan = plan_zone_sync(cf_lib_wrapper.iter_dns_records(zone_id), desired_records, domain_name)
+    summary = {
+        'action': 'summary', 'plan': plan,
+        'api_calls': plan.api_calls(cf_lib_wrapper.page_size, cf_lib_wrapper.batch_size)}
+
+    if plan_only:
+        for dns_record in plan.deletes:
+            record_synced_cb(succeed=True, response=_sync_change(
+                'delete', dns_record['id'], dns_record['type'], dns_record['name'], dns_record['content']))
+        for dns_record, (record_type, record_name, content) in plan.updates:
+            record_synced_cb(succeed=True, response=_sync_change(
+                'update', dns_record['id'], record_type, record_name, content))
+        for record_type, record_name, content in plan.creates:
+            record_synced_cb(succeed=True, response=_sync_change('create', '', record_type, record_name, content))
+        record_synced_cb(succeed=True, response=summary, retries=cf_lib_wrapper.take_retry_count())
+        return
+
+    # deleting first, so that the created records never conflict with the ones they replace
+    dns_records = dict((dns_record['id'], dns_record) for dns_record in plan.deletes)
+    record_ids = [dns_record['id'] for dns_record in plan.deletes]
+    for record_id, _, exception in cf_lib_wrapper.delete_dns_records(zone_id, record_ids):
+        dns_record = dns_records[record_id]
+        record_synced_cb(
+            succeed=exception is None, exception=exception, retries=cf_lib_wrapper.take_retry_count(),
+            response=_sync_change('delete', record_id, dns_record['type'], dns_record['name'], dns_record['content']))
+    records = [(dns_record['id'],) + record for dns_record, record in plan.updates]
+    for record, record_info, exception in cf_lib_wrapper.update_dns_records(zone_id, records):
+        record_synced_cb(
+            succeed=exception is None, exception=exception, retries=cf_lib_wrapper.take_retry_count(),
+            response=_sync_change('update', *record))
+    for record, record_info, exception in cf_lib_wrapper.create_dns_records(zone_id, plan.creates):
+        record_synced_cb(
+            succeed=exception is None, exception=exception, retries=cf_lib_wrapper.take_retry_count(),
+            response=_sync_change('create', record_info['id'] if record_info else '', *record))
+    record_synced_cb(succeed=True, response=summary, retries=cf_lib_wrapper.take_retry_count())
+
+
+def apply_job(domain_name, operations, job_applied_cb=None, cf_lib_wrapper=None):
+    """Applying all the operations of a job to a zone, with a single zone lookup and a single listing of its records
+
+    Every operation is reported to job_applied_cb with a response holding its action (add, edit or delete) and its
+    record, with unchanged=True when it needed no write. The deletes are sent first, then the edits and the adds, each
+    of them in batches.
+    """
+    job_applied_cb = tolerant_callback(job_applied_cb)
     zone_info = cf_lib_wrapper.get_zone_info(domain_name)
     if zone_info is None:
-        record_listed_cb(succeed=False, exception=ValueError('zone_info is None'))
+        job_applied_cb(
+            succeed=False, exception=ValueError('zone_info is None'), retries=cf_lib_wrapper.take_retry_count())
         return
-    page = 1
-    while True:
-        dns_records = cf_lib_wrapper.list_dns_records(zone_info['id'], page=page, per_page=20)
-        for dns_record in dns_records:
-            record_listed_cb(succeed=True, response=dns_record)
-        if len(dns_records) < 20:
-            break
-        page += 1
+    zone_id = zone_info['id']
+    plan = plan_zone_job(
+        cf_lib_wrapper.iter_dns_records(zone_id), operations, domain_name, proxied=cf_lib_wrapper.proxied)
+
+    for operation, dns_record in plan.unchanged:
+        if dns_record is None:
+            response = _sync_change(
+                operation.action, '', operation.record_type, operation.record_name_in(domain_name),
+                operation.content_in(domain_name) or '')
+        elif operation.action == 'add':
+            # the record may be the one a previous operation of the job edits to this content
+            response = _sync_change(
+                operation.action, dns_record['id'], dns_record['type'], dns_record['name'],
+                operation.content_in(domain_name))
+        else:
+            response = _sync_change(
+                operation.action, dns_record['id'], dns_record['type'], dns_record['name'], dns_record['content'])
+        job_applied_cb(succeed=True, response=response, unchanged=True, retries=cf_lib_wrapper.take_retry_count())
+    for operation, message in plan.failures:
+        job_applied_cb(
+            succeed=False, exception=ValueError(message), retries=cf_lib_wrapper.take_retry_count(),
+            response=_sync_change(
+                operation.action, '', operation.record_type, operation.record_name_in(domain_name),
+                operation.content_in(domain_name) or ''))
+
+    dns_records = dict((dns_record['id'], dns_record) for _, dns_record in plan.deletes)
+    record_ids = [dns_record['id'] for _, dns_record in plan.deletes]
+    for record_id, _, exception in cf_lib_wrapper.delete_dns_records(zone_id, record_ids):
+        dns_record = dns_records[record_id]
+        job_applied_cb(
+            succeed=exception is None, exception=exception, retries=cf_lib_wrapper.take_retry_count(),
+            response=_sync_change('delete', record_id, dns_record['type'], dns_record['name'], dns_record['content']))
+    records = [record for _, record in plan.updates]
+    for record, _, exception in cf_lib_wrapper.update_dns_records(zone_id, records):
+        job_applied_cb(
+            succeed=exception is None, exception=exception, retries=cf_lib_wrapper.take_retry_count(),
+            response=_sync_change('edit', *record))
+    records = [record for _, record in plan.creates]
+    for record, record_info, exception in cf_lib_wrapper.create_dns_records(zone_id, records):
+        job_applied_cb(
+            succeed=exception is None, exception=exception, retries=cf_lib_wrapper.take_retry_count(),
+            response=_sync_change('add', record_info['id'] if record_info else '', *record))
+
+
+def _run_async(domain_names, zone_task, cb_factory, async_cf_lib_wrapper, chunk_size):
+    """Running a per-zone function over many domains on the pool of a ThreadPoolCloudFlareLibWrapper
+
+    zone_task(domain_name, cb, cf_lib_wrapper) runs on the pool with the wrapper of async_cf_lib_wrapper, at most
+    chunk_size domains being read ahead of the domain being reported. The results of every domain are replayed to
+    cb_factory(domain_name) in the order of domain_names.
+    """
+    def task(domain_name, cb):
+        zone_task(domain_name, cb, async_cf_lib_wrapper.cf_lib_wrapper)
+
+    def tolerant_cb_factory(domain_name):
+        cb = tolerant_callback(cb_factory(domain_name))
+        return cb if cb is not None else lambda **kwargs: None
+
+    for _ in run_zone_tasks_on_pool(domain_names, task, tolerant_cb_factory, async_cf_lib_wrapper.pool, chunk_size):
+        pass
+
+
+def add_new_domains_async(domain_names, domain_added_cb=None, async_cf_lib_wrapper=None, chunk_size=1000):
+    """The async version of add_new_domain, adding many domains with their requests in flight at the same time.
+
+    The results are reported in the order of domain_names.
+    """
+    _run_async(
+        domain_names, lambda domain_name, cb, cf_lib_wrapper: add_new_domain(
+            domain_name, domain_added_cb=cb, cf_lib_wrapper=cf_lib_wrapper),
+        lambda domain_name: domain_added_cb, async_cf_lib_wrapper, chunk_size)
+
+
+def delete_all_records_async(domain_names, record_deleted_cb_factory=None, async_cf_lib_wrapper=None,
+                             chunk_size=1000):
+    """The async version of delete_all_records, for many domains at once.
+
+    record_deleted_cb_factory(domain_name) returns the callback of a domain, the results are reported in the order
+    of domain_names.
+    """
+    _run_async(
+        domain_names, lambda domain_name, cb, cf_lib_wrapper: delete_all_records(
+            domain_name, record_deleted_cb=cb, cf_lib_wrapper=cf_lib_wrapper),
+        record_deleted_cb_factory, async_cf_lib_wrapper, chunk_size)
+
+
+def add_new_records_async(domain_names, record_type, record_name, record_content, record_added_cb_factory=None,
+                          async_cf_lib_wrapper=None, chunk_size=1000):
+    """The async version of add_new_record, for many domains at once.
+
+    record_added_cb_factory(domain_name) returns the callback of a domain, the results are reported in the order
+    of domain_names.
+    """
+    _run_async(
+        domain_names, lambda domain_name, cb, cf_lib_wrapper: add_new_record(
+            domain_name, record_type, record_name, record_content, record_added_cb=cb, cf_lib_wrapper=cf_lib_wrapper),
+        record_added_cb_factory, async_cf_lib_wrapper, chunk_size)
+
+
+def edit_records_async(domain_names, record_type, record_name, old_record_content, new_record_content,
+                       record_edited_cb_factory=None, async_cf_lib_wrapper=None, chunk_size=1000, all_matches=False):
+    """The async version of edit_record, for many domains at once.
+
+    record_edited_cb_factory(domain_name) returns the callback of a domain, the results are reported in the order
+    of domain_names.
+    """
+    _run_async(
+        domain_names, lambda domain_name, cb, cf_lib_wrapper: edit_record(
+            domain_name, record_type, record_name, old_record_content, new_record_content, record_edited_cb=cb,
+            cf_lib_wrapper=cf_lib_wrapper, all_matches=all_matches),
+        record_edited_cb_factory, async_cf_lib_wrapper, chunk_size)
+
+
+def list_records_async(domain_names, record_listed_cb_factory=None, async_cf_lib_wrapper=None, chunk_size=1000,
+                       full_records=False):
+    """The async version of list_records, for many domains at once.
+
+    record_listed_cb_factory(domain_name) returns the callback of a domain, the results are reported in the order
+    of domain_names.
+    """
+    _run_async(
+        domain_names, lambda domain_name, cb, cf_lib_wrapper: list_records(
+            domain_name, record_listed_cb=cb, cf_lib_wrapper=cf_lib_wrapper, full_records=full_records),
+        record_listed_cb_factory, async_cf_lib_wrapper, chunk_size)
 
 
 usage_str = (
@@ -151,201 +551,605 @@ usage_str = (
     '\ncloudflare_dns/bulk_dns.py --delete-all-records <domain_list_file>' +
     '\ncloudflare_dns/bulk_dns.py --list-records <domain_list_file>' +
     '\ncloudflare_dns/bulk_dns.py --add-new-records --type <record_type> [--name <record_name>] --content <record_content> <domain_list_file>' +
-    '\ncloudflare_dns/bulk_dns.py --edit-records --type <record_type> [--name <record_name>] [--old-content <old_content>] --new-content <new_content> <domain_list_file>'
+    '\ncloudflare_dns/bulk_dns.py --edit-records --type <record_type> [--name <record_name>] [--old-content <old_content>] --new-content <new_content> <domain_list_file>' +
+    '\ncloudflare_dns/bulk_dns.py --export-zone-files <directory> <domain_list_file>' +
+    '\ncloudflare_dns/bulk_dns.py --import-zone-files <directory> <domain_list_file>' +
+    '\ncloudflare_dns/bulk_dns.py --sync <desired_state_file> [--plan] <domain_list_file>' +
+    '\ncloudflare_dns/bulk_dns.py --job <job_file> <domain_list_file>' +
+    '\ncloudflare_dns/bulk_dns.py --merge <domain_list_file> <results_file>...' +
+    '\n\nOptions:' +
+    '\n--workers <number>  the number of zones processed at the same time (default 1, 4 for the zone files)' +
+    '\n--no-zone-cache  always look up the zones with the API instead of the local zone cache' +
+    '\n--zone-cache-ttl <seconds>  the age after which the cached zones are looked up again (default 86400)' +
+    '\n--clear-zone-cache  remove the cached zones of the account before running the command' +
+    '\n--zone-lookup auto|index|per-domain  resolve the zones from an index of all the zones of the account, ' +
+    'or with one lookup per domain (default auto, using the one costing less API calls)' +
+    '\n--page-size <number>  the number of DNS records requested per page (default 5000)' +
+    '\n--rate <number>  the number of API requests per second (default 3.5)' +
+    '\n--burst <number>  the number of API requests that can be sent at once before the rate applies (default 150)' +
+    '\n--rate-limit-file <file>  share the rate limit with the other processes using the same file' +
+    '\n--no-rate-limit  send the API requests without rate limit' +
+    '\n--max-retries <number>  the number of retries of a request failing with a transient error ' +
+    '(default 5 for reading, 2 for creating, 3 for updating and deleting)' +
+    '\n--no-retry  do not retry the failed requests' +
+    '\n--proxied, --no-proxied  proxy or not the added and edited A, AAAA and CNAME records (default: proxy them ' +
+    'when possible)' +
+    '\n--resume <run_id>  resume an interrupted run, skipping the zones it has completed' +
+    '\n--plan  with --sync, only show the changes and their API calls without applying them' +
+    '\n--metrics-file <file>  write the metrics of the API requests to a JSON file, besides printing their summary' +
+    '\n--prometheus-file <file>  keep the metrics of the API requests in a Prometheus textfile during the run' +
+    '\n--prometheus-interval <seconds>  the interval between two updates of the Prometheus textfile (default 15)' +
+    '\n--pool-size <number>  the number of HTTP connections kept open to the API (default: the number of workers)' +
+    '\n--connect-timeout <seconds>  the time allowed to connect to the API (default 10)' +
+    '\n--read-timeout <seconds>  the time allowed to wait for the API to respond (default 60)' +
+    '\n--output-format csv|jsonl|sqlite  the format of the results file (default csv)' +
+    '\n--quiet  only print the summaries, not every result' +
+    '\n--progress  print the number of results and zones done instead of every result' +
+    '\n--all-matches  with --edit-records, edit every record matching the type, the name and the old content ' +
+    'instead of the first one' +
+    '\n--save-snapshot  with --list-records, save the records listed in the local snapshot' +
+    '\n--from-snapshot  with --list-records, list the records saved in the local snapshot, without any API request' +
+    '\n--refresh-snapshot  with --list-records, check a probe of 5 records and the record count of every zone ' +
+    'against the local snapshot, only listing again the changed zones and answering the others from it; the edits ' +
+    'of the records past the probe are only caught once the zone is older than --snapshot-max-age' +
+    '\n--snapshot-max-age <seconds>  the age after which --refresh-snapshot lists a zone again (default 86400)' +
+    '\n--shard <i>/<N>  only process the i-th of N stable subsets of the domain list, to split a run ' +
+    'across processes or hosts, their CSV results files being combined with --merge' +
+    '\n\nA job file, YAML (.yaml or .yml) or CSV with a header row, lists operations with an action (add, edit or ' +
+    'delete), a type, a name, a content, a new_content for the edits, and optionally the only zone they apply to ' +
+    'and all_matches. Each zone is looked up and listed once for all the operations.' +
+    '\n\nThe domain list file is read from the standard input when it is -, and decompressed when its name ends ' +
+    'with .gz. Its blank lines, comments starting with #, invalid names and duplicates are skipped.'
 )
 
 
-def cli_add_new_domains(domains_file_name, cf_lib_wrapper):
-    counter = 0
+def _zone_wrapper(cf_lib_wrapper, zone_name, new_zone=False):
+    """The CloudFlareLibWrapper of the account owning a zone, or adding it when new, when cf_lib_wrapper is an
+    AccountPool
+    """
+    if not isinstance(cf_lib_wrapper, AccountPool):
+        return cf_lib_wrapper
+    if new_zone:
+        return cf_lib_wrapper.wrapper_for_new_zone(zone_name)
+    return cf_lib_wrapper.wrapper_for(zone_name)
+
+
+def _accounts(cf_lib_wrapper):
+    """The (account name, CloudFlareLibWrapper) pairs of cf_lib_wrapper, the name being None for a single account"""
+    if isinstance(cf_lib_wrapper, AccountPool):
+        return list(cf_lib_wrapper.accounts.items())
+    return [(None, cf_lib_wrapper)]
+
+
+def _timestamped(base_name):
     dt = datetime.datetime.now()
-    csv_name = "cf_dns_add_new_domains_{0:04}{1:02}{2:02}_{3:02}{4:02}{5:02}.csv".format(
-        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
-    with open(csv_name, "wb") as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['name', 'status', 'id', 'type', 'created_on'])
+    return "{0}_{1:04}{2:02}{3:02}_{4:02}{5:02}{6:02}".format(
+        base_name, dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
+
+
+def _open_output(base_name, header, output_format, console, shard=None):
+    """Opening the results file of a command, named after the command, the time of the run and the shard"""
+    return OutputWriter(
+        open_sink(output_format, _timestamped(base_name) + shard_suffix(shard), header), console=console)
 
-        def domain_added_cb(succeed=None, response=None, exception=None):
+
+def cli_add_new_domains(domains_file_name, cf_lib_wrapper, workers=1, journal=None, output_format=OUTPUT_CSV,
+                        console=CONSOLE_VERBOSE, shard=None):
+    output = _open_output(
+        'cf_dns_add_new_domains', ['name', 'status', 'id', 'type', 'created_on', 'retries'], output_format, console,
+        shard)
+    try:
+        def domain_added_cb(succeed=None, response=None, exception=None, retries=None):
+            counter = output.counter.get('zones')
             if succeed:
-                output_text = "added [{0}]: {1}".format(counter + 1, response['name'])
-                writer.writerow(
-                    [response['name'], response['status'], response['id'], response['type'], response['created_on']])
+                output.write(
+                    [response['name'], response['status'], response['id'], response['type'], response['created_on'],
+                     retries],
+                    "added [{0}]: {1}".format(counter + 1, response['name']))
             else:
-                output_text = "failed [{0}]: {1}".format(counter + 1, exception.message)
-                writer.writerow([response['name'], 'failed'])
-            print(output_text)
+                output.write(
+                    [response['name'], 'failed', '', '', '', retries],
+                    "failed [{0}]: {1}".format(counter + 1, exception.message), failed=True)
 
-        with open(domains_file_name) as f:
+        with DomainList(domains_file_name) as domain_names:
             print("Adding domains listed in {0}:".format(domains_file_name))
-            for line in f:
-                add_new_domain(line.strip(), domain_added_cb=domain_added_cb, cf_lib_wrapper=cf_lib_wrapper)
-                counter += 1
-            print("Added {0} new domains.".format(counter))
-        print("CSV file {0} generated.".format(csv_name))
+            def add_new_domain_task(domain_name, cb):
+                add_new_domain(
+                    domain_name, domain_added_cb=cb, cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, domain_name, True))
 
+            for _ in run_zone_tasks(in_shard(domain_names, shard), add_new_domain_task,
+                                    lambda domain_name: domain_added_cb, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Added {0} new domains.".format(output.counter.get('zones')))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
 
-def cli_delete_all_records(domains_file_name, cf_lib_wrapper):
-    counter = 0
-    dt = datetime.datetime.now()
-    csv_name = "cf_dns_delete_all_records_{0:04}{1:02}{2:02}_{3:02}{4:02}{5:02}.csv".format(
-        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
-    with open(csv_name, "wb") as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['zone name', 'record id', 'status'])
 
+def cli_delete_all_records(domains_file_name, cf_lib_wrapper, workers=1, journal=None, output_format=OUTPUT_CSV,
+                           console=CONSOLE_VERBOSE, shard=None):
+    output = _open_output(
+        'cf_dns_delete_all_records', ['zone name', 'record id', 'status', 'retries'], output_format, console, shard)
+    try:
         def record_deleted_cb_wrapper(zone_name):
-            def record_deleted_cb(succeed=None, response=None, exception=None):
+            def record_deleted_cb(succeed=None, response=None, exception=None, retries=None):
+                counter = output.counter.get('zones')
                 if succeed:
-                    output_text = "deleted [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name)
-                    writer.writerow([zone_name, response['id'], 'deleted'])
+                    output.write(
+                        [zone_name, response['id'], 'deleted', retries],
+                        "deleted [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name))
+                elif response is None:
+                    output.write(
+                        [zone_name, '', exception.message, retries],
+                        "failed [{0}]: {1} while deleting records of {2}".format(
+                            counter + 1, exception.message, zone_name), failed=True)
                 else:
-                    if response is None:
-                        output_text = "failed [{0}]: {1} while deleting records of {2}".format(
-                            counter + 1, exception.message, zone_name)
-                        writer.writerow([zone_name, '', exception.message])
-                    else:
-                        output_text = "failed [{0}]: while deleting record {1} of {2}".format(
-                            counter + 1, response['id'], zone_name)
-                        writer.writerow([zone_name, response['id'], 'failed'])
-                print(output_text)
+                    output.write(
+                        [zone_name, response['id'], 'failed', retries],
+                        "failed [{0}]: while deleting record {1} of {2}".format(
+                            counter + 1, response['id'], zone_name), failed=True)
 
             return record_deleted_cb
 
-        with open(domains_file_name) as f:
+        with DomainList(domains_file_name) as domain_names:
             print("Deleting records from zones listed in {0}:".format(domains_file_name))
-            for line in f:
-                zone_name = line.strip()
-                delete_all_records(zone_name, record_deleted_cb=record_deleted_cb_wrapper(zone_name),
-                                   cf_lib_wrapper=cf_lib_wrapper)
-                counter += 1
-            print("Deleted records from {0} zones.".format(counter))
-    print("CSV file {0} generated.".format(csv_name))
+            def delete_all_records_task(zone_name, cb):
+                delete_all_records(
+                    zone_name, record_deleted_cb=cb, cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
 
+            for _ in run_zone_tasks(in_shard(domain_names, shard), delete_all_records_task,
+                                    record_deleted_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Deleted records from {0} zones.".format(output.counter.get('zones')))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
 
-def cli_add_new_records(domains_file_name, cf_lib_wrapper, record_type, record_name, record_content):
-    counter = 0
-    dt = datetime.datetime.now()
-    csv_name = "cf_dns_add_new_records_{0:04}{1:02}{2:02}_{3:02}{4:02}{5:02}.csv".format(
-        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
-    with open(csv_name, "wb") as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['zone name', 'status', 'record id'])
 
+def cli_add_new_records(domains_file_name, cf_lib_wrapper, record_type, record_name, record_content, workers=1,
+                        journal=None, output_format=OUTPUT_CSV, console=CONSOLE_VERBOSE, shard=None):
+    output = _open_output(
+        'cf_dns_add_new_records', ['zone name', 'status', 'record id', 'retries'], output_format, console, shard)
+    try:
         def record_added_cb_wrapper(zone_name):
-            def record_added_cb(succeed=None, response=None, exception=None):
-                if succeed:
-                    output_text = "added [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name)
-                    writer.writerow([zone_name, 'added', response['id']])
+            def record_added_cb(succeed=None, response=None, exception=None, retries=None, unchanged=False):
+                counter = output.counter.get('zones')
+                if succeed and unchanged:
+                    output.counter.increment('unchanged')
+                    output.write(
+                        [zone_name, 'unchanged', response['id'], retries],
+                        "unchanged [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name))
+                elif succeed:
+                    output.write(
+                        [zone_name, 'added', response['id'], retries],
+                        "added [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name))
                 else:
-                    output_text = "failed [{0}]: while adding new record to {1}".format(
-                        counter + 1, zone_name)
-                    writer.writerow([zone_name, 'failed: ' + exception.message])
-                print(output_text)
+                    output.write(
+                        [zone_name, 'failed: ' + exception.message, '', retries],
+                        "failed [{0}]: while adding new record to {1}".format(counter + 1, zone_name), failed=True)
 
             return record_added_cb
 
-        with open(domains_file_name) as f:
+        with DomainList(domains_file_name) as domain_names:
             print("Adding records to zones listed in {0}:".format(domains_file_name))
-            for line in f:
-                zone_name = line.strip()
+            def add_new_record_task(zone_name, cb):
                 add_new_record(
                     zone_name, record_type, record_name, record_content,
-                    record_added_cb=record_added_cb_wrapper(zone_name), cf_lib_wrapper=cf_lib_wrapper)
-                counter += 1
-            print("Added {0} records.".format(counter))
-    print("CSV file {0} generated.".format(csv_name))
+                    record_added_cb=cb, cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
 
+            for _ in run_zone_tasks(in_shard(domain_names, shard), add_new_record_task,
+                                    record_added_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Added {0} records.".format(output.counter.get('zones')))
+    if output.counter.get('unchanged'):
+        print("{0} records already existed and were left unchanged.".format(output.counter.get('unchanged')))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
 
-def cli_list_records(domains_file_name, cf_lib_wrapper):
-    counter = 0
-    dt = datetime.datetime.now()
-    csv_name = "cf_list_records_{0:04}{1:02}{2:02}_{3:02}{4:02}{5:02}.csv".format(
-        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
-    with open(csv_name, "wb") as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['zone name', 'record id', 'type', 'name', 'content', 'proxiable', 'proxied'])
 
+def cli_list_records(domains_file_name, cf_lib_wrapper, workers=1, journal=None, output_format=OUTPUT_CSV,
+                     console=CONSOLE_VERBOSE, shard=None, snapshot=None, snapshot_mode=SNAPSHOT_UPDATE):
+    output = _open_output(
+        'cf_list_records', ['zone name', 'record id', 'type', 'name', 'content', 'proxiable', 'proxied', 'retries'],
+        output_format, console, shard)
+    try:
         def record_listed_cb_wrapper(zone_name):
-            def record_listed_cb(succeed=None, response=None, exception=None):
+            def record_listed_cb(succeed=None, response=None, exception=None, retries=None):
                 if succeed:
-                    output_text = "{0}: record {1}. ID {2}. NAME {3}. CONTENT {4}. PROXIABLE {5}. PROXIED {6}".format(
-                        zone_name, response['type'], response['id'], response['name'], response['content'], response['proxiable'], response['proxied'])
-                    writer.writerow(
-                        [zone_name, response['id'], response['type'], response['name'], response['content'], response['proxiable'], response['proxied']])
+                    output.write(
+                        [zone_name, response['id'], response['type'], response['name'], response['content'],
+                         response['proxiable'], response['proxied'], retries],
+                        "{0}: record {1}. ID {2}. NAME {3}. CONTENT {4}. PROXIABLE {5}. PROXIED {6}".format(
+                            zone_name, response['type'], response['id'], response['name'], response['content'],
+                            response['proxiable'], response['proxied']))
                 else:
-                    output_text = "{0}: {1}".format(zone_name, exception.message)
-                    writer.writerow([zone_name, exception.message])
-                print(output_text)
+                    output.write(
+                        [zone_name, exception.message, '', '', '', '', '', retries],
+                        "{0}: {1}".format(zone_name, exception.message), failed=True)
 
             return record_listed_cb
 
-        with open(domains_file_name) as f:
+        with DomainList(domains_file_name) as domain_names:
             print("Listing DNS records from zones listed in {0}:".format(domains_file_name))
-            for line in f:
-                zone_name = line.strip()
-                list_records(zone_name, record_listed_cb=record_listed_cb_wrapper(zone_name),
-                             cf_lib_wrapper=cf_lib_wrapper)
-                counter += 1
-            print("Listed records from {0} zones.".format(counter))
-    print("CSV file {0} generated.".format(csv_name))
+            def list_records_task(zone_name, cb):
+                if snapshot is None:
+                    list_records(
+                        zone_name, record_listed_cb=cb, cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
+                elif snapshot_mode == SNAPSHOT_READ:
+                    list_snapshot_records(zone_name, record_listed_cb=cb, snapshot=snapshot)
+                else:
+                    list_records(
+                        zone_name, record_listed_cb=cb, cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name),
+                        snapshot=snapshot, refresh=snapshot_mode == SNAPSHOT_REFRESH)
 
+            for _ in run_zone_tasks(in_shard(domain_names, shard), list_records_task,
+                                    record_listed_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Listed records from {0} zones.".format(output.counter.get('zones')))
+    if snapshot is not None and snapshot_mode != SNAPSHOT_READ:
+        print("Snapshot {0}: {1} zones current, {2} zones listed and saved.".format(
+            snapshot.path, snapshot.current_count, snapshot.saved_count))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
 
-def cli_edit_records(domains_file_name, cf_lib_wrapper, record_type, record_name, old_record_content,
-                     new_record_content):
-    counter = 0
-    dt = datetime.datetime.now()
-    csv_name = "cf_dns_edit_records_{0:04}{1:02}{2:02}_{3:02}{4:02}{5:02}.csv".format(
-        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
-    with open(csv_name, "wb") as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['zone name', 'status', 'record id'])
 
+def cli_edit_records(domains_file_name, cf_lib_wrapper, record_type, record_name, old_record_content,
+                     new_record_content, workers=1, journal=None, output_format=OUTPUT_CSV, console=CONSOLE_VERBOSE,
+                     shard=None, all_matches=False):
+    output = _open_output(
+        'cf_dns_edit_records', ['zone name', 'status', 'record id', 'retries'], output_format, console, shard)
+    try:
         def record_edited_cb_wrapper(zone_name):
-            def record_edited_cb(succeed=None, response=None, exception=None):
-                if succeed:
-                    output_text = "edited [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name)
-                    writer.writerow([zone_name, 'edited', response['id']])
+            def record_edited_cb(succeed=None, response=None, exception=None, retries=None, unchanged=False):
+                counter = output.counter.get('zones')
+                if succeed and unchanged:
+                    output.counter.increment('unchanged')
+                    output.write(
+                        [zone_name, 'unchanged', response['id'], retries],
+                        "unchanged [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name))
+                elif succeed:
+                    output.write(
+                        [zone_name, 'edited', response['id'], retries],
+                        "edited [{0}]: record {1} of {2}".format(counter + 1, response['id'], zone_name))
                 else:
-                    output_text = "failed [{0}]: while editing record of {1}".format(
-                        counter + 1, zone_name)
-                    writer.writerow([zone_name, 'failed: ' + exception.message])
-                print(output_text)
+                    output.write(
+                        [zone_name, 'failed: ' + exception.message, '', retries],
+                        "failed [{0}]: while editing record of {1}".format(counter + 1, zone_name), failed=True)
 
             return record_edited_cb
 
-        with open(domains_file_name) as f:
+        with DomainList(domains_file_name) as domain_names:
             print("Editing records to zones listed in {0}:".format(domains_file_name))
-            for line in f:
-                zone_name = line.strip()
-                edit_record(
-                    zone_name, record_type, record_name, old_record_content, new_record_content,
-                    record_edited_cb=record_edited_cb_wrapper(zone_name), cf_lib_wrapper=cf_lib_wrapper)
-                counter += 1
-            print("Edited {0} records.".format(counter))
-    print("CSV file {0} generated.".format(csv_name))
+            def edit_record_task(zone_name, cb):
+                if all_matches:
+                    edit_record(
+                        zone_name, record_type, record_name, old_record_content, new_record_content,
+                        record_edited_cb=cb, cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name), all_matches=True)
+                else:
+                    edit_record(
+                        zone_name, record_type, record_name, old_record_content, new_record_content,
+                        record_edited_cb=cb, cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
+
+            for _ in run_zone_tasks(in_shard(domain_names, shard), edit_record_task,
+                                    record_edited_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Edited {0} records.".format(output.counter.get('zones')))
+    if output.counter.get('unchanged'):
+        print("{0} records already had the new content and were left unchanged.".format(
+            output.counter.get('unchanged')))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
+
+
+def cli_export_zone_files(domains_file_name, cf_lib_wrapper, directory, workers=ZONE_FILE_WORKERS, journal=None,
+                          output_format=OUTPUT_CSV, console=CONSOLE_VERBOSE, shard=None):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    output = _open_output(
+        'cf_dns_export_zone_files', ['zone name', 'status', 'file', 'size', 'retries'], output_format, console,
+        shard)
+    try:
+        def zone_file_exported_cb_wrapper(zone_name):
+            def zone_file_exported_cb(succeed=None, response=None, exception=None, retries=None):
+                counter = output.counter.get('zones')
+                if succeed:
+                    output.write(
+                        [zone_name, 'exported', response['file'], response['size'], retries],
+                        "exported [{0}]: {1} to {2}".format(counter + 1, zone_name, response['file']))
+                else:
+                    output.write(
+                        [zone_name, 'failed: ' + exception.message, '', '', retries],
+                        "failed [{0}]: {1} while exporting {2}".format(counter + 1, exception.message, zone_name),
+                        failed=True)
+
+            return zone_file_exported_cb
+
+        with DomainList(domains_file_name) as domain_names:
+            print("Exporting zone files of zones listed in {0} to {1}:".format(domains_file_name, directory))
+            def export_zone_file_task(zone_name, cb):
+                export_zone_file(
+                    zone_name, directory, zone_file_exported_cb=cb,
+                    cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
+
+            for _ in run_zone_tasks(in_shard(domain_names, shard), export_zone_file_task,
+                                    zone_file_exported_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Exported {0} zones.".format(output.counter.get('zones')))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
+
+
+def cli_import_zone_files(domains_file_name, cf_lib_wrapper, directory, workers=ZONE_FILE_WORKERS, journal=None,
+                          output_format=OUTPUT_CSV, console=CONSOLE_VERBOSE, shard=None):
+    output = _open_output(
+        'cf_dns_import_zone_files', ['zone name', 'status', 'records added', 'records parsed', 'retries'],
+        output_format, console, shard)
+    try:
+        def zone_file_imported_cb_wrapper(zone_name):
+            def zone_file_imported_cb(succeed=None, response=None, exception=None, retries=None):
+                counter = output.counter.get('zones')
+                if succeed:
+                    output.write(
+                        [zone_name, 'imported', response['recs_added'], response['total_records_parsed'], retries],
+                        "imported [{0}]: {1} records of {2}".format(counter + 1, response['recs_added'], zone_name))
+                else:
+                    output.write(
+                        [zone_name, 'failed: ' + exception.message, '', '', retries],
+                        "failed [{0}]: {1} while importing {2}".format(counter + 1, exception.message, zone_name),
+                        failed=True)
+
+            return zone_file_imported_cb
+
+        with DomainList(domains_file_name) as domain_names:
+            print("Importing zone files from {0} to zones listed in {1}:".format(directory, domains_file_name))
+            def import_zone_file_task(zone_name, cb):
+                import_zone_file(
+                    zone_name, directory, zone_file_imported_cb=cb,
+                    cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
+
+            for _ in run_zone_tasks(in_shard(domain_names, shard), import_zone_file_task,
+                                    zone_file_imported_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Imported {0} zones.".format(output.counter.get('zones')))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
+
+
+def cli_sync(domains_file_name, cf_lib_wrapper, desired_state_file_name, plan_only=False, workers=1, journal=None,
+             output_format=OUTPUT_CSV, console=CONSOLE_VERBOSE, shard=None):
+    totals = {'create': 0, 'update': 0, 'delete': 0, 'unchanged': 0, 'api_calls': 0}
+    desired_records = read_desired_state(desired_state_file_name)
+    output = _open_output(
+        'cf_dns_plan' if plan_only else 'cf_dns_sync',
+        ['zone name', 'action', 'status', 'record id', 'type', 'name', 'content', 'retries'], output_format, console,
+        shard)
+    try:
+        def record_synced_cb_wrapper(zone_name):
+            def record_synced_cb(succeed=None, response=None, exception=None, retries=None):
+                if response is None:
+                    output.write(
+                        [zone_name, '', 'failed: ' + exception.message, '', '', '', '', retries],
+                        "failed [{0}]: {1} while syncing {2}".format(
+                            output.counter.get('zones') + 1, exception.message, zone_name), failed=True)
+                elif response['action'] == 'summary':
+                    plan = response['plan']
+                    for action, changes in (
+                            ('create', plan.creates), ('update', plan.updates), ('delete', plan.deletes)):
+                        totals[action] += len(changes)
+                    totals['unchanged'] += plan.unchanged
+                    totals['api_calls'] += response['api_calls']
+                    output.echo("{0}: {1}, {2} API calls".format(zone_name, plan, response['api_calls']))
+                else:
+                    if plan_only:
+                        status = 'planned'
+                    elif succeed:
+                        status = 'done'
+                    else:
+                        status = 'failed: ' + exception.message
+                    output.write(
+                        [zone_name, response['action'], status, response['id'], response['type'], response['name'],
+                         response['content'], retries],
+                        "{0} {1}: {2} {3} {4} {5}".format(
+                            zone_name, status, response['action'], response['type'], response['name'],
+                            response['content']),
+                        failed=not (plan_only or succeed))
+
+            return record_synced_cb
+
+        with DomainList(domains_file_name) as domain_names:
+            print("{0} zones listed in {1} with {2}:".format(
+                'Planning the sync of' if plan_only else 'Syncing', domains_file_name, desired_state_file_name))
+            def sync_zone_task(zone_name, cb):
+                sync_zone(zone_name, desired_records, record_synced_cb=cb, plan_only=plan_only,
+                          cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
+
+            for _ in run_zone_tasks(in_shard(domain_names, shard), sync_zone_task,
+                                    record_synced_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("{0} {1} zones: {2} to create, {3} to update, {4} to delete, {5} unchanged, {6} API calls.".format(
+        'Planned' if plan_only else 'Synced', output.counter.get('zones'), totals['create'], totals['update'],
+        totals['delete'], totals['unchanged'], totals['api_calls']))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
+
+
+def cli_job(domains_file_name, cf_lib_wrapper, job_file_name, workers=1, journal=None, output_format=OUTPUT_CSV,
+            console=CONSOLE_VERBOSE, shard=None):
+    try:
+        operations = read_job(job_file_name)
+    except ValueError as e:
+        print(e.message)
+        return
+    done_statuses = {'add': 'added', 'edit': 'edited', 'delete': 'deleted'}
+    output = _open_output(
+        'cf_dns_job', ['zone name', 'action', 'status', 'record id', 'type', 'name', 'content', 'retries'],
+        output_format, console, shard)
+    try:
+        def job_applied_cb_wrapper(zone_name):
+            def job_applied_cb(succeed=None, response=None, exception=None, retries=None, unchanged=False):
+                if response is None:
+                    output.write(
+                        [zone_name, '', 'failed: ' + exception.message, '', '', '', '', retries],
+                        "failed [{0}]: {1} while applying the job to {2}".format(
+                            output.counter.get('zones') + 1, exception.message, zone_name), failed=True)
+                    return
+                if succeed and unchanged:
+                    status = 'unchanged'
+                elif succeed:
+                    status = done_statuses[response['action']]
+                else:
+                    status = 'failed: ' + exception.message
+                if succeed:
+                    output.counter.increment(status)
+                output.write(
+                    [zone_name, response['action'], status, response['id'], response['type'], response['name'],
+                     response['content'], retries],
+                    "{0} {1}: {2} {3} {4} {5}".format(
+                        zone_name, status, response['action'], response['type'], response['name'],
+                        response['content']),
+                    failed=not succeed)
+
+            return job_applied_cb
+
+        with DomainList(domains_file_name) as domain_names:
+            print("Applying the {0} operations of {1} to zones listed in {2}:".format(
+                len(operations), job_file_name, domains_file_name))
+            def apply_job_task(zone_name, cb):
+                apply_job(zone_name, operations, job_applied_cb=cb,
+                          cf_lib_wrapper=_zone_wrapper(cf_lib_wrapper, zone_name))
+
+            for _ in run_zone_tasks(in_shard(domain_names, shard), apply_job_task,
+                                    job_applied_cb_wrapper, workers=workers, journal=journal):
+                output.counter.increment('zones')
+    finally:
+        output.close()
+    print("Applied the job to {0} zones: {1} added, {2} edited, {3} deleted, {4} unchanged, {5} failed.".format(
+        output.counter.get('zones'), output.counter.get('added'), output.counter.get('edited'),
+        output.counter.get('deleted'), output.counter.get('unchanged'), output.counter.get('failed')))
+    if domain_names.skipped:
+        print(domain_names.summary())
+    print(output.generated())
+
+
+def _int_option(arg):
+    try:
+        return int(arg)
+    except ValueError:
+        return -1
+
+
+def _float_option(arg):
+    try:
+        return float(arg)
+    except ValueError:
+        return -1.0
+
+
+def cli_merge_reports(domains_file_name, report_file_names):
+    zone_names = read_domain_names(domains_file_name)
+    for index, count in missing_shards(report_file_names):
+        print("Missing shard {0}/{1}: its zones are not in the merged results.".format(index, count))
+    merged_file_name = _timestamped(merged_report_prefix(report_file_names)) + '.csv'
+    try:
+        row_count = merge_reports(zone_names, report_file_names, merged_file_name)
+    except ValueError as e:
+        print(e.message)
+        return
+    print("{0} results of {1} files merged.".format(row_count, len(report_file_names)))
+    print("CSV file {0} generated.".format(merged_file_name))
 
 
-@configured
 def cli(args, cf_lib_wrapper=None):
+    """The command line app, building the wrapper of the environment credentials unless cf_lib_wrapper is given
+
+    The credentials are only needed by the commands sending API requests: --merge and --from-snapshot run without.
+    """
     try:
         opts, args = getopt.getopt(
             args, '', [
                 'add-new-domains', 'delete-all-records', 'add-new-records', 'list-records', 'edit-records',
-                'type=', 'name=', 'content=', 'old-content=', 'new-content='
+                'export-zone-files=', 'import-zone-files=', 'sync=', 'plan',
+                'type=', 'name=', 'content=', 'old-content=', 'new-content=', 'workers=',
+                'no-zone-cache', 'zone-cache-ttl=', 'clear-zone-cache', 'zone-lookup=', 'page-size=',
+                'rate=', 'burst=', 'rate-limit-file=', 'no-rate-limit', 'max-retries=', 'no-retry',
+                'proxied', 'no-proxied', 'resume=', 'metrics-file=', 'prometheus-file=', 'prometheus-interval=',
+                'output-format=', 'quiet', 'progress', 'pool-size=', 'connect-timeout=', 'read-timeout=', 'shard=',
+                'merge', 'save-snapshot', 'from-snapshot', 'refresh-snapshot', 'snapshot-max-age=',
+                'all-matches', 'job='
             ])
     except getopt.GetoptError:
         print(usage_str)
         return
 
-    cmd_set = {'--add-new-domains', '--delete-all-records', '--add-new-records', '--list-records', '--edit-records'}
+    cmd_set = {
+        '--add-new-domains', '--delete-all-records', '--add-new-records', '--list-records', '--edit-records',
+        '--export-zone-files', '--import-zone-files', '--sync', '--job', '--merge'}
     cmd = None
+    desired_state_file_name = None
+    job_file_name = None
+    plan_only = False
+    zone_file_directory = None
     record_type = None
     record_name = None
     record_content = None
     old_record_content = None
     new_record_content = None
+    workers = None
+    use_zone_cache = True
+    zone_cache_ttl = DEFAULT_TTL
+    clear_zone_cache = False
+    zone_lookup = ZONE_LOOKUP_AUTO
+    page_size = None
+    rate = DEFAULT_RATE
+    burst = DEFAULT_BURST
+    rate_limit_file = None
+    use_rate_limit = True
+    max_retries = None
+    proxied = None
+    resume_run_id = None
+    metrics_file_name = None
+    prometheus_file_name = None
+    prometheus_interval = DEFAULT_PROMETHEUS_INTERVAL
+    output_format = OUTPUT_CSV
+    console = CONSOLE_VERBOSE
+    pool_size = None
+    connect_timeout = None
+    read_timeout = None
+    shard = None
+    snapshot_mode = None
+    snapshot_max_age = SNAPSHOT_MAX_AGE
+    all_matches = False
     for opt, arg in opts:
         if opt in cmd_set:
             cmd = opt
+            if opt in ('--export-zone-files', '--import-zone-files'):
+                zone_file_directory = arg
+            elif opt == '--sync':
+                desired_state_file_name = arg
+            elif opt == '--job':
+                job_file_name = arg
         else:
             if opt == '--type':
                 record_type = arg
@@ -357,24 +1161,228 @@ def cli(args, cf_lib_wrapper=None):
                 old_record_content = arg
             elif opt == '--new-content':
                 new_record_content = arg
+            elif opt == '--workers':
+                workers = _int_option(arg)
+            elif opt == '--no-zone-cache':
+                use_zone_cache = False
+            elif opt == '--zone-cache-ttl':
+                zone_cache_ttl = _int_option(arg)
+            elif opt == '--clear-zone-cache':
+                clear_zone_cache = True
+            elif opt == '--zone-lookup':
+                zone_lookup = arg
+            elif opt == '--page-size':
+                page_size = _int_option(arg)
+            elif opt == '--rate':
+                rate = _float_option(arg)
+            elif opt == '--burst':
+                burst = _int_option(arg)
+            elif opt == '--rate-limit-file':
+                rate_limit_file = arg
+            elif opt == '--no-rate-limit':
+                use_rate_limit = False
+            elif opt == '--max-retries':
+                max_retries = _int_option(arg)
+            elif opt == '--no-retry':
+                max_retries = 0
+            elif opt == '--proxied':
+                proxied = True
+            elif opt == '--no-proxied':
+                proxied = False
+            elif opt == '--resume':
+                resume_run_id = arg
+            elif opt == '--plan':
+                plan_only = True
+            elif opt == '--metrics-file':
+                metrics_file_name = arg
+            elif opt == '--prometheus-file':
+                prometheus_file_name = arg
+            elif opt == '--prometheus-interval':
+                prometheus_interval = _float_option(arg)
+            elif opt == '--output-format':
+                output_format = arg
+            elif opt == '--quiet':
+                console = CONSOLE_QUIET
+            elif opt == '--progress':
+                console = CONSOLE_PROGRESS
+            elif opt == '--pool-size':
+                pool_size = _int_option(arg)
+            elif opt == '--connect-timeout':
+                connect_timeout = _float_option(arg)
+            elif opt == '--read-timeout':
+                read_timeout = _float_option(arg)
+            elif opt == '--shard':
+                try:
+                    shard = parse_shard(arg)
+                except ValueError:
+                    print(usage_str)
+                    return
+            elif opt == '--save-snapshot':
+                snapshot_mode = SNAPSHOT_UPDATE
+            elif opt == '--from-snapshot':
+                snapshot_mode = SNAPSHOT_READ
+            elif opt == '--refresh-snapshot':
+                snapshot_mode = SNAPSHOT_REFRESH
+            elif opt == '--snapshot-max-age':
+                snapshot_max_age = _int_option(arg)
+            elif opt == '--all-matches':
+                all_matches = True
 
-    if cmd is None or len(args) < 1:
+    if workers is None:
+        workers = ZONE_FILE_WORKERS if zone_file_directory is not None else 1
+
+    if cmd is None or len(args) < 1 or workers < 1 or zone_cache_ttl < 0 or \
+            zone_lookup not in ZONE_LOOKUP_STRATEGIES or (page_size is not None and page_size < 1) or \
+            rate <= 0 or burst < 1 or (max_retries is not None and max_retries < 0) or prometheus_interval <= 0 or \
+            output_format not in OUTPUT_FORMATS or (pool_size is not None and pool_size < 1) or \
+            (connect_timeout is not None and connect_timeout <= 0) or \
+            (read_timeout is not None and read_timeout <= 0) or \
+            (snapshot_mode is not None and cmd != '--list-records') or snapshot_max_age < 0 or \
+            (all_matches and cmd != '--edit-records'):
         print(usage_str)
         return
 
     domains_file_name = args[0]
 
-    if cmd == '--add-new-domains':
-        cli_add_new_domains(domains_file_name, cf_lib_wrapper)
-    elif cmd == '--delete-all-records':
-        cli_delete_all_records(domains_file_name, cf_lib_wrapper)
-    elif cmd == '--add-new-records':
-        cli_add_new_records(domains_file_name, cf_lib_wrapper, record_type, record_name, record_content)
-    elif cmd == '--list-records':
-        cli_list_records(domains_file_name, cf_lib_wrapper)
-    elif cmd == '--edit-records':
-        cli_edit_records(domains_file_name, cf_lib_wrapper, record_type, record_name, old_record_content,
-                         new_record_content)
+    if cmd == '--merge':
+        if len(args) < 2:
+            print(usage_str)
+            return
+        cli_merge_reports(domains_file_name, args[1:])
+        return
+
+    if resume_run_id is not None and not os.path.isfile(journal_path(resume_run_id)):
+        print("No journal found for the run {0}.".format(resume_run_id))
+        return
+
+    if cf_lib_wrapper is None and snapshot_mode != SNAPSHOT_READ:
+        cf_lib_wrapper = environment_wrapper()
+    accounts = [] if cf_lib_wrapper is None else _accounts(cf_lib_wrapper)
+    # the accounts share the zone cache and the metrics, which are kept by account and for the whole run
+    zone_cache = None
+    if use_zone_cache:
+        zone_cache = next((account.zone_cache for _, account in accounts if account.zone_cache is not None), None)
+        if zone_cache is None:
+            zone_cache = ZoneCache(ttl=zone_cache_ttl)
+        zone_cache.ttl = zone_cache_ttl
+    metrics = next((account.metrics for _, account in accounts if account.metrics is not None), None) or Metrics()
+    sessions = []
+    for account_name, account in accounts:
+        if page_size is not None:
+            account.page_size = page_size
+        if proxied is not None:
+            account.proxied = proxied
+
+        if account.session not in sessions:
+            sessions.append(account.session)
+            # a connection per worker, so that the workers never wait for one nor open throwaway ones
+            account.session.resize(pool_size or workers)
+            if connect_timeout is not None:
+                account.session.connect_timeout = connect_timeout
+            if read_timeout is not None:
+                account.session.read_timeout = read_timeout
+
+        # every account has its own rate limit
+        if not use_rate_limit:
+            account.rate_limiter = None
+        elif account.rate_limiter is None:
+            account.rate_limiter = TokenBucket(rate, burst, state_file=(
+                rate_limit_file if rate_limit_file is None or account_name is None
+                else '{0}.{1}'.format(rate_limit_file, account_name)))
+
+        if max_retries == 0:
+            account.retry_policy = None
+        elif account.retry_policy is None:
+            account.retry_policy = RetryPolicy(max_retries)
+
+        account.zone_cache = zone_cache
+        if clear_zone_cache and zone_cache is not None:
+            zone_cache.invalidate(account.api_email)
+        account.metrics = metrics
+
+    prometheus_writer = None
+    if prometheus_file_name is not None:
+        prometheus_writer = PrometheusTextfileWriter(
+            metrics, prometheus_file_name, interval=prometheus_interval).start()
+
+    # the zones are looked up before running the command, reading the domain list twice
+    spooled_file_name = None
+    if domains_file_name == STDIN_FILE_NAME:
+        domains_file_name = spooled_file_name = spool_stdin()
+
+    snapshot = None
+    if snapshot_mode is not None:
+        snapshot = RecordSnapshot(max_age=snapshot_max_age)
+
+    journal = None
+    try:
+        if cmd != '--add-new-domains' and snapshot_mode != SNAPSHOT_READ:
+            for account_name, account in accounts:
+                with DomainList(domains_file_name) as domain_names:
+                    plan = prepare_zone_lookup(
+                        in_shard(domain_names, shard), account, strategy=zone_lookup)
+                print(plan if account_name is None else "{0}: {1}".format(account_name, plan))
+
+        journal = Journal(resume_run_id or new_run_id(), 'plan' if cmd == '--sync' and plan_only else cmd[2:])
+        if resume_run_id is None:
+            print("Run {0}, resume it with --resume {0} if interrupted.".format(journal.run_id))
+        else:
+            print("Resuming the run {0}: {1} zones done are skipped, "
+                  "{2} failed and {3} in flight are processed again.".format(journal.run_id, *journal.summary()))
+
+        output_options = {'output_format': output_format, 'console': console, 'shard': shard}
+        if cmd == '--add-new-domains':
+            cli_add_new_domains(domains_file_name, cf_lib_wrapper, workers=workers, journal=journal, **output_options)
+        elif cmd == '--delete-all-records':
+            cli_delete_all_records(
+                domains_file_name, cf_lib_wrapper, workers=workers, journal=journal, **output_options)
+        elif cmd == '--add-new-records':
+            cli_add_new_records(domains_file_name, cf_lib_wrapper, record_type, record_name, record_content,
+                                workers=workers, journal=journal, **output_options)
+        elif cmd == '--list-records':
+            cli_list_records(domains_file_name, cf_lib_wrapper, workers=workers, journal=journal,
+                             snapshot=snapshot, snapshot_mode=snapshot_mode or SNAPSHOT_UPDATE, **output_options)
+        elif cmd == '--edit-records':
+            cli_edit_records(domains_file_name, cf_lib_wrapper, record_type, record_name, old_record_content,
+                             new_record_content, workers=workers, journal=journal, all_matches=all_matches,
+                             **output_options)
+        elif cmd == '--export-zone-files':
+            cli_export_zone_files(
+                domains_file_name, cf_lib_wrapper, zone_file_directory, workers=workers, journal=journal,
+                **output_options)
+        elif cmd == '--import-zone-files':
+            cli_import_zone_files(
+                domains_file_name, cf_lib_wrapper, zone_file_directory, workers=workers, journal=journal,
+                **output_options)
+        elif cmd == '--sync':
+            cli_sync(domains_file_name, cf_lib_wrapper, desired_state_file_name, plan_only=plan_only,
+                     workers=workers, journal=journal, **output_options)
+        elif cmd == '--job':
+            cli_job(domains_file_name, cf_lib_wrapper, job_file_name, workers=workers, journal=journal,
+                    **output_options)
+        # the journal of a run completed without failure has nothing left to resume
+        if journal.is_complete():
+            journal.remove()
+        else:
+            print("Some zones failed, process them again with --resume {0}.".format(journal.run_id))
+    finally:
+        if journal is not None:
+            journal.close()
+        if spooled_file_name is not None:
+            os.remove(spooled_file_name)
+        if snapshot is not None:
+            snapshot.close()
+        if prometheus_writer is not None:
+            prometheus_writer.stop()
+        if metrics_file_name is not None:
+            metrics.write_json(metrics_file_name)
+        print("Metrics: {0}".format(metrics.to_json()))
+        for session in sessions:
+            print("HTTP connections: {connections} opened for {requests} requests, {reused} requests reused one."
+                  .format(**session.stats()))
+        if isinstance(cf_lib_wrapper, AccountPool):
+            print("Zones by account: {0}.".format(', '.join(
+                '{0} {1}'.format(account_name, count) for account_name, count in cf_lib_wrapper.zone_counts().items())))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+STDIN_FILE_NAME = '-'
+
+# a domain name in its ASCII form: at least two labels of letters, digits and hyphens, not starting nor ending with a
+# hyphen, of 63 characters at most
+DOMAIN_NAME_PATTERN = re.compile(r'^(?=.{1,253}$)(?!-)[a-z0-9-]{1,63}(?<!-)(\.(?!-)[a-z0-9-]{1,63}(?<!-))+$')
+
+
+def normalize_domain_name(line):
+    """The domain name of a line of a domain list, lowercased and in its ASCII (IDNA) form
+
+    :return: the domain name, '' for a blank line or a comment, or None when the line is not a valid domain name
+    """
+    domain_name = line.split('#', 1)[0].strip().rstrip('.')
+    if not domain_name:
+        return ''
+    try:
+        domain_name = domain_name.decode('utf-8').encode('idna').lower()
+    except UnicodeError:
+        return None
+    if DOMAIN_NAME_PATTERN.match(domain_name) is None:
+        return None
+    return domain_name
+
+
+class DomainList(object):
+    """The domain names of a domain list file, read as a stream
+
+    The file is read a line at a time, '-' reading the standard input and a name ending with .gz being decompressed.
+    The blank lines, the comments starting with # and the invalid names are skipped, as well as the names already
+    read, so that they never cost an API call. The names read are remembered by their MD5 digest, the memory used by
+    a name not depending on its length.
+
+    It is used as a context manager, closing the file, and can be iterated once:
+
+        with DomainList(domains_file_name) as domain_names:
+            for domain_name in domain_names:
+                ...
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.blank = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self._file = None
+
+    def _open(self):
+        if self.file_name == STDIN_FILE_NAME:
+            return sys.stdin
+        if self.file_name.endswith('.gz'):
+            return gzip.open(self.file_name, 'rb')
+        return open(self.file_name)
+
+    def __enter__(self):
+        self._file = self._open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._file is not sys.stdin:
+            self._file.close()
+
+    def __iter__(self):
+        seen = set()
+        for line in self._file:
+            domain_name = normalize_domain_name(line)
+            if domain_name == '':
+                self.blank += 1
+            elif domain_name is None:
+                self.invalid += 1
+            else:
+                digest = hashlib.md5(domain_name).digest()
+                if digest in seen:
+                    self.duplicates += 1
+                else:
+                    seen.add(digest)
+                    yield domain_name
+
+    @property
+    def skipped(self):
+        return self.blank + self.invalid + self.duplicates
+
+    def summary(self):
+        return "Skipped {0} lines of {1}: {2} blank or comments, {3} invalid names, {4} duplicates.".format(
+            self.skipped, self.file_name, self.blank, self.invalid, self.duplicates)
+
+
+def read_domain_names(file_name):
+    """All the domain names of a domain list file, in order"""
+    with DomainList(file_name) as domain_names:
+        return list(domain_names)
+
+
+def spool_stdin(stream=None):
+    """Copying the standard input to a temporary file, for the commands reading the domain list more than once
+
+    :return: the name of the temporary file, to remove once done
+    """
+    fd, file_name = tempfile.mkstemp(prefix='cloudflare-dns-stdin-', suffix='.txt')
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(stream if stream is not None else sys.stdin, f)
+    return file_name
@@ -0,0 +1,133 @@
+from collections import deque
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+
+# The zones in flight per worker: the zones are read from the input and their recorded results kept only this far
+# ahead of the zone being reported
+ZONES_IN_FLIGHT_PER_WORKER = 2
+
+
+class CallbackRecorder(object):
+    """Collects the callback invocations made by a per-zone operation running on a worker thread,
+    so that they can be replayed later on the reporting thread.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+
+    def replay(self, cb):
+        for kwargs in self.calls:
+            cb(**kwargs)
+
+
+def _run_recorded(zone_task, zone_name):
+    recorder = CallbackRecorder()
+    try:
+        zone_task(zone_name, recorder)
+    except Exception as e:
+        return zone_name, recorder, e
+    return zone_name, recorder, None
+
+
+def _journaled(zone_names, zone_task, cb_factory, journal):
+    """Skipping the zones done according to the journal, and recording the progress of the others"""
+    failed_zone_names = set()
+
+    def journaled_zone_names():
+        for zone_name in zone_names:
+            if not journal.is_done(zone_name):
+                yield zone_name
+
+    def journaled_zone_task(zone_name, cb):
+        journal.started(zone_name)
+        zone_task(zone_name, cb)
+
+    def journaled_cb_factory(zone_name):
+        cb = cb_factory(zone_name)
+
+        def journaled_cb(**kwargs):
+            if not kwargs.get('succeed'):
+                failed_zone_names.add(zone_name)
+            cb(**kwargs)
+
+        return journaled_cb
+
+    def finish(zone_name, exception=None):
+        if exception is not None or zone_name in failed_zone_names:
+            failed_zone_names.discard(zone_name)
+            journal.failed(zone_name)
+        else:
+            journal.done(zone_name)
+
+    return journaled_zone_names(), journaled_zone_task, journaled_cb_factory, finish
+
+
+def run_zone_tasks(zone_names, zone_task, cb_factory, workers=1, journal=None):
+    """Running a per-zone operation over many zones
+
+    :param zone_names: an iterable of zone names
+    :param zone_task: a function called as zone_task(zone_name, cb) that performs the operation for one zone
+        and reports every result through cb
+    :param cb_factory: a function called as cb_factory(zone_name) that returns the reporting callback of the zone
+    :param workers: the number of zones processed at the same time
+    :param journal: an optional cloudflare_dns.journal.Journal. The zones it has done are skipped, the others are
+        recorded as done once their results have been reported, or as failed when one of them is a failure.
+    :return: a generator yielding every zone name, in the input order, once its results have been reported
+
+    With a single worker the operations run inline and report straight to their callbacks. With more workers
+    the operations run on a thread pool and their callback invocations are replayed on the calling thread
+    in the input order, so the reporting code never runs concurrently and its output is deterministic.
+    At most ZONES_IN_FLIGHT_PER_WORKER zones per worker are submitted ahead of the zone being reported, so the
+    zone names are read and the results are held in memory as the reporting goes, whatever the number of zones.
+    An exception raised by an operation is re-raised on the calling thread after the results it reported.
+    """
+    finish = None
+    if journal is not None:
+        zone_names, zone_task, cb_factory, finish = _journaled(zone_names, zone_task, cb_factory, journal)
+
+    if workers <= 1:
+        for zone_name in zone_names:
+            try:
+                zone_task(zone_name, cb_factory(zone_name))
+            except Exception:
+                if finish is not None:
+                    finish(zone_name, exception=True)
+                raise
+            if finish is not None:
+                finish(zone_name)
+            yield zone_name
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        for zone_name in run_zone_tasks_on_pool(
+                zone_names, zone_task, cb_factory, pool, workers * ZONES_IN_FLIGHT_PER_WORKER, finish=finish):
+            yield zone_name
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def run_zone_tasks_on_pool(zone_names, zone_task, cb_factory, pool, zones_in_flight, finish=None):
+    """Running a per-zone operation over many zones on an existing thread pool
+
+    The parameters and the reporting are those of run_zone_tasks, the operations running on pool, a
+    multiprocessing.pool.ThreadPool that is left open. At most zones_in_flight zones are submitted ahead of the zone
+    being reported. finish(zone_name, exception=None) is called once the results of a zone have been reported.
+    """
+    zone_names = iter(zone_names)
+    in_flight = deque(
+        pool.apply_async(_run_recorded, (zone_task, zone_name)) for zone_name in islice(zone_names, zones_in_flight))
+    while in_flight:
+        zone_name, recorder, exception = in_flight.popleft().get()
+        for next_zone_name in islice(zone_names, 1):
+            in_flight.append(pool.apply_async(_run_recorded, (zone_task, next_zone_name)))
+        recorder.replay(cb_factory(zone_name))
+        if finish is not None:
+            finish(zone_name, exception=exception)
+        if exception is not None:
+            raise exception
+        yield zone_name
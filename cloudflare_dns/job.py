@@ -0,0 +1,224 @@
+import csv
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from cloudflare_dns.proxiable import proxied_for_type
+from cloudflare_dns.sync import same_record, zone_record_name
+
+ACTION_ADD = 'add'
+ACTION_EDIT = 'edit'
+ACTION_DELETE = 'delete'
+ACTIONS = (ACTION_ADD, ACTION_EDIT, ACTION_DELETE)
+
+JOB_FIELDS = ('action', 'type', 'name', 'content', 'new_content', 'zone', 'all_matches')
+
+
+class JobOperation(object):
+    """A record change of a job, applied to every zone or to a single one
+
+    The names and the contents may use the {{zone}} template, an empty name or @ stands for the zone apex and a name
+    not ending with the zone name is relative to it, like in the desired state of the sync.
+
+    :ivar action: ACTION_ADD, ACTION_EDIT or ACTION_DELETE
+    :ivar content: the content of the record to add, or the content of the records to edit or delete, None matching
+        any content
+    :ivar new_content: the new content of the records to edit
+    :ivar zone: the only zone the operation applies to, None for all the zones
+    :ivar all_matches: whether an edit changes every matching record instead of the first one
+    """
+    def __init__(self, action, record_type, record_name='', content=None, new_content=None, zone=None,
+                 all_matches=False):
+        self.action = action
+        self.record_type = record_type
+        self.record_name = record_name
+        self.content = content
+        self.new_content = new_content
+        self.zone = zone
+        self.all_matches = all_matches
+
+    def applies_to(self, domain_name):
+        return self.zone is None or self.zone == domain_name.lower()
+
+    def record_name_in(self, domain_name):
+        return zone_record_name(self.record_name, domain_name)
+
+    def content_in(self, domain_name):
+        return None if self.content is None else self.content.replace("{{zone}}", domain_name)
+
+    def new_content_in(self, domain_name):
+        return self.new_content.replace("{{zone}}", domain_name)
+
+    def __repr__(self):
+        return 'JobOperation({0})'.format(', '.join(
+            '{0}={1!r}'.format(name, value) for name, value in (
+                ('action', self.action), ('record_type', self.record_type), ('record_name', self.record_name),
+                ('content', self.content), ('new_content', self.new_content), ('zone', self.zone),
+                ('all_matches', self.all_matches))))
+
+
+def _operation(fields, where):
+    fields = dict(
+        (str(key).strip().lower(), '' if value is None else str(value).strip()) for key, value in fields.items())
+    unknown = set(fields) - set(JOB_FIELDS)
+    if unknown:
+        raise ValueError('Unknown job fields {0} in {1}'.format(', '.join(sorted(unknown)), where))
+    action = fields.get('action', '').lower()
+    if action not in ACTIONS:
+        raise ValueError('Invalid job action "{0}" in {1}'.format(action, where))
+    if not fields.get('type'):
+        raise ValueError('Missing record type in {0}'.format(where))
+    if action == ACTION_ADD and not fields.get('content'):
+        raise ValueError('Missing content of the record to add in {0}'.format(where))
+    if action == ACTION_EDIT and not fields.get('new_content'):
+        raise ValueError('Missing new content of the records to edit in {0}'.format(where))
+    return JobOperation(
+        action, fields['type'].upper(), fields.get('name', ''), content=fields.get('content') or None,
+        new_content=fields.get('new_content') or None, zone=fields.get('zone', '').lower().rstrip('.') or None,
+        all_matches=fields.get('all_matches', '').lower() in ('1', 'true', 'yes'))
+
+
+def _read_yaml_job(file_name):
+    if yaml is None:
+        raise ValueError('Reading the YAML job {0} needs the PyYAML package'.format(file_name))
+    with open(file_name) as f:
+        document = yaml.safe_load(f)
+    if isinstance(document, dict):
+        document = document.get('operations')
+    if not isinstance(document, list) or not all(isinstance(fields, dict) for fields in document):
+        raise ValueError('The YAML job {0} must be a list of operations'.format(file_name))
+    return [
+        _operation(fields, '{0}, operation {1}'.format(file_name, number))
+        for number, fields in enumerate(document, 1)]
+
+
+def _read_csv_job(file_name):
+    operations = []
+    with open(file_name) as f:
+        rows = [row for row in csv.reader(f) if row and ''.join(row).strip() and not row[0].startswith('#')]
+    if not rows:
+        return operations
+    header = [value.strip().lower() for value in rows[0]]
+    for number, row in enumerate(rows[1:], 2):
+        if len(row) > len(header):
+            raise ValueError('Invalid job row: {0}'.format(','.join(row)))
+        operations.append(_operation(dict(zip(header, row)), '{0}, row {1}'.format(file_name, number)))
+    return operations
+
+
+def read_job(file_name):
+    """Reading the operations of a job file
+
+    A job is a YAML file (.yaml or .yml), a list of operations or a mapping with an operations list, or a CSV file
+    with a header row. Every operation has an action (add, edit or delete), a record type and optionally a name,
+    a content, a new content for the edits, the only zone it applies to, and all_matches for the edits. Blank CSV
+    lines and lines starting with # are ignored.
+
+    :return: the list of JobOperation, in the order of the file
+    :raise ValueError: when an operation is invalid
+    """
+    if file_name.lower().endswith(('.yaml', '.yml')):
+        return _read_yaml_job(file_name)
+    return _read_csv_job(file_name)
+
+
+class ZoneJobPlan(object):
+    """The writes applying the operations of a job to a zone, from a single listing of its records
+
+    :ivar creates: the (operation, (record type, record name, content)) tuples of the records to create
+    :ivar updates: the (operation, (record id, record type, record name, content)) tuples of the records to update
+    :ivar deletes: the (operation, existing DNS record) tuples of the records to delete
+    :ivar unchanged: the (operation, existing DNS record or None) tuples of the operations needing no write
+    :ivar failures: the (operation, error message) tuples of the operations that cannot be applied
+    """
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.deletes = []
+        self.unchanged = []
+        self.failures = []
+
+
+def _matches(dns_record, record_type, record_name, content):
+    return dns_record['type'].upper() == record_type and dns_record['name'].lower() == record_name.lower() and (
+        content is None or dns_record['content'] == content)
+
+
+def _planned_record(record_type, record_name, content):
+    return {'type': record_type, 'name': record_name, 'content': content}
+
+
+def plan_zone_job(dns_records, operations, domain_name, proxied=None):
+    """Matching the operations of a job against the records of a zone
+
+    Every operation is matched against the records listed, in the order of the job, a record being changed by one
+    operation at most. An operation that would change nothing, an add of an existing record, an edit of a record with
+    the new content or a delete of a missing record, is unchanged. An add is checked against the records as the
+    operations before it leave them: the records they delete or edit no longer count, the records they edit or add do.
+
+    :param dns_records: the existing DNS records of the zone
+    :param operations: the JobOperation of the job, those of the other zones being ignored
+    :param domain_name: the zone name
+    :param proxied: the proxy status set by the writes, None when left to the wrapper
+    :return: a ZoneJobPlan
+    """
+    dns_records = list(dns_records)
+    records_by_id = dict((dns_record['id'], dns_record) for dns_record in dns_records)
+    claimed = set()
+    plan = ZoneJobPlan()
+
+    def unclaimed_matches(record_type, record_name, content):
+        return [
+            dns_record for dns_record in dns_records
+            if dns_record['id'] not in claimed and _matches(dns_record, record_type, record_name, content)]
+
+    def unchanged(dns_record, record_type, record_name, content):
+        return same_record(dns_record, record_type, record_name, content) and (
+            proxied_for_type(record_type, proxied) is None or dns_record.get('proxied') == proxied)
+
+    for operation in operations:
+        if not operation.applies_to(domain_name):
+            continue
+        record_name = operation.record_name_in(domain_name)
+        content = operation.content_in(domain_name)
+        if operation.action == ACTION_ADD:
+            # the records claimed are deleted or edited by the job, the edits and the adds planned will exist
+            existing = [
+                dns_record for dns_record in dns_records
+                if dns_record['id'] not in claimed and unchanged(
+                    dns_record, operation.record_type, record_name, content)]
+            existing.extend(
+                records_by_id[record[0]] for _, record in plan.updates
+                if same_record(_planned_record(*record[1:]), operation.record_type, record_name, content))
+            if existing:
+                plan.unchanged.append((operation, existing[0]))
+            elif any(same_record(_planned_record(*record), operation.record_type, record_name, content)
+                     for _, record in plan.creates):
+                plan.unchanged.append((operation, None))
+            else:
+                plan.creates.append((operation, (operation.record_type, record_name, content)))
+        elif operation.action == ACTION_DELETE:
+            matches = unclaimed_matches(operation.record_type, record_name, content)
+            if not matches:
+                plan.unchanged.append((operation, None))
+            for dns_record in matches:
+                claimed.add(dns_record['id'])
+                plan.deletes.append((operation, dns_record))
+        else:
+            new_content = operation.new_content_in(domain_name)
+            matches = unclaimed_matches(operation.record_type, record_name, content)
+            if not matches and content is not None:
+                # the records may have been edited by a previous run
+                matches = unclaimed_matches(operation.record_type, record_name, new_content)
+            if not matches:
+                plan.failures.append((operation, 'Existing DNS record not found'))
+            for dns_record in matches if operation.all_matches else matches[:1]:
+                claimed.add(dns_record['id'])
+                if unchanged(dns_record, operation.record_type, record_name, new_content):
+                    plan.unchanged.append((operation, dns_record))
+                else:
+                    plan.updates.append(
+                        (operation, (dns_record['id'], operation.record_type, record_name, new_content)))
+    return plan
@@ -0,0 +1,118 @@
+import datetime
+import os
+import threading
+import time
+import uuid
+
+STARTED = 'S'
+DONE = 'D'
+FAILED = 'F'
+
+
+def default_journal_directory():
+    path = os.environ.get('CLOUDFLARE_DNS_JOURNAL_DIR')
+    if path:
+        return path
+    return os.path.join(os.path.expanduser('~'), '.cloudflare_dns', 'journal')
+
+
+def journal_path(run_id, directory=None):
+    if directory is None:
+        directory = default_journal_directory()
+    return os.path.join(directory, '{0}.journal'.format(run_id))
+
+
+def new_run_id():
+    dt = datetime.datetime.now()
+    return '{0:04}{1:02}{2:02}-{3:02}{4:02}{5:02}-{6}'.format(
+        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, uuid.uuid4().hex[:6])
+
+
+class Journal(object):
+    """Append-only record of the zones processed by a run of an operation, so that an interrupted run can resume
+
+    Every line holds a state (S started, D done, F failed), the operation and the zone name, separated by tabs. The
+    lines are buffered and synced to disk every sync_every lines or sync_interval seconds, and when the journal is
+    closed: a crash loses at most the last unsynced lines, whose zones are then processed again. The zones done by a
+    previous run with the same ID are loaded on opening, so checking a zone is a dictionary lookup.
+    """
+    def __init__(self, run_id, operation, directory=None, sync_every=100, sync_interval=1.0, clock=time.time):
+        self.run_id = run_id
+        self.operation = operation
+        self.path = journal_path(run_id, directory)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._states = {}
+        self._load()
+        self.resumed_states = dict(self._states)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._file = open(self.path, 'a')
+        self._pending = 0
+        self._synced_on = clock()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                # a line cut by a crash has no line end, its zone is processed again
+                if not line.endswith('\n'):
+                    break
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) == 3 and fields[1] == self.operation:
+                    self._states[fields[2]] = fields[0]
+
+    def is_done(self, zone_name):
+        return self._states.get(zone_name) == DONE
+
+    def summary(self):
+        """Counting the zones of the previous runs by state: done, failed and in flight (started, never finished)"""
+        counts = {DONE: 0, FAILED: 0, STARTED: 0}
+        for state in self.resumed_states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts[DONE], counts[FAILED], counts[STARTED]
+
+    def _append(self, state, zone_name):
+        with self._lock:
+            self._states[zone_name] = state
+            self._file.write('{0}\t{1}\t{2}\n'.format(state, self.operation, zone_name))
+            self._pending += 1
+            if self._pending >= self.sync_every or self.clock() - self._synced_on >= self.sync_interval:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._synced_on = self.clock()
+
+    def started(self, zone_name):
+        self._append(STARTED, zone_name)
+
+    def done(self, zone_name):
+        self._append(DONE, zone_name)
+
+    def failed(self, zone_name):
+        self._append(FAILED, zone_name)
+
+    def is_complete(self):
+        """Telling whether every zone recorded, by this run or the runs it resumes, is done"""
+        with self._lock:
+            return all(state == DONE for state in self._states.values())
+
+    def remove(self):
+        """Closing the journal and deleting its file, once there is nothing left to resume"""
+        self.close()
+        os.remove(self.path)
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
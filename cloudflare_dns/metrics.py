@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+
+# The upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The error codes of the requests rejected by the rate limit
+RATE_LIMITED_CODES = frozenset([429, 971, 1015])
+
+PHASE_ZONE_LOOKUP = 'zone lookup'
+PHASE_LISTING = 'listing'
+PHASE_MUTATION = 'mutation'
+
+DEFAULT_PROMETHEUS_INTERVAL = 15.0
+
+
+def request_phase(method, endpoint):
+    """The phase of a bulk run a request belongs to"""
+    if method == 'GET':
+        return PHASE_LISTING if 'dns_records' in endpoint else PHASE_ZONE_LOOKUP
+    return PHASE_MUTATION
+
+
+def is_rate_limited(exception):
+    """Telling whether an API error is a rejection by the rate limit"""
+    return exception.code in RATE_LIMITED_CODES or getattr(exception, 'status_code', None) == 429 or \
+        getattr(exception, 'retry_after', None) is not None
+
+
+class _Histogram(object):
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            total += count
+            yield bound, total
+
+    def quantile(self, ratio):
+        """The upper bound of the bucket holding the quantile, None when it is beyond the last bucket"""
+        if self.count == 0:
+            return 0.0
+        for bound, total in self.cumulative():
+            if total >= ratio * self.count:
+                return bound
+        return None
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics(object):
+    """Counters and latency histograms of the API requests of a run, shared by all the threads of the run
+
+    Every attempt of a request is counted by method and endpoint with its outcome (ok or the error code), its latency
+    and the bytes of its payloads. The time spent in the requests, including the rate limit waits and the retry
+    delays, is summed by phase: zone lookup, listing and mutation.
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started_on = clock()
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.histograms = {}
+        self.retries = 0
+        self.rate_limited = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.phases = {}
+
+    def observe_request(self, method, endpoint, latency, outcome='ok', bytes_sent=0, bytes_received=0,
+                        rate_limited=False):
+        with self._lock:
+            key = (method, endpoint, outcome)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.histograms.get((method, endpoint))
+            if histogram is None:
+                histogram = self.histograms[(method, endpoint)] = _Histogram()
+            histogram.observe(latency)
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+            if rate_limited:
+                self.rate_limited += 1
+
+    def observe_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def observe_phase(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def summary(self):
+        """The metrics as a dictionary, ready to be written as JSON"""
+        with self._lock:
+            endpoints = []
+            for (method, endpoint), histogram in sorted(self.histograms.items()):
+                outcomes = dict(
+                    (outcome, count) for (request_method, request_endpoint, outcome), count in self.requests.items()
+                    if (request_method, request_endpoint) == (method, endpoint))
+                endpoints.append({
+                    'method': method, 'endpoint': endpoint, 'calls': histogram.count,
+                    'errors': histogram.count - outcomes.get('ok', 0), 'outcomes': outcomes,
+                    'latency': {
+                        'sum': histogram.sum, 'mean': histogram.sum / histogram.count,
+                        'p50': histogram.quantile(0.5), 'p99': histogram.quantile(0.99)}})
+            calls = sum(histogram.count for histogram in self.histograms.values())
+            return {
+                'elapsed': self.clock() - self.started_on,
+                'calls': calls,
+                'errors': calls - sum(count for (_, _, outcome), count in self.requests.items() if outcome == 'ok'),
+                'retries': self.retries,
+                'rate_limited': self.rate_limited,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'phases': dict(self.phases),
+                'endpoints': endpoints}
+
+    def to_json(self, indent=None):
+        return json.dumps(self.summary(), indent=indent, sort_keys=True)
+
+    def write_json(self, file_name):
+        with open(file_name, 'w') as f:
+            f.write(self.to_json(indent=2))
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP cloudflare_dns_requests_total API requests by method, endpoint and outcome.')
+            lines.append('# TYPE cloudflare_dns_requests_total counter')
+            for (method, endpoint, outcome), count in sorted(self.requests.items()):
+                lines.append('cloudflare_dns_requests_total{{method="{0}",endpoint="{1}",outcome="{2}"}} {3}'.format(
+                    _label(method), _label(endpoint), _label(outcome), count))
+            lines.append('# HELP cloudflare_dns_request_duration_seconds Latency of the API requests.')
+            lines.append('# TYPE cloudflare_dns_request_duration_seconds histogram')
+            for (method, endpoint), histogram in sorted(self.histograms.items()):
+                labels = 'method="{0}",endpoint="{1}"'.format(_label(method), _label(endpoint))
+                for bound, total in histogram.cumulative():
+                    lines.append('cloudflare_dns_request_duration_seconds_bucket{{{0},le="{1}"}} {2}'.format(
+                        labels, bound, total))
+                lines.append('cloudflare_dns_request_duration_seconds_bucket{{{0},le="+Inf"}} {1}'.format(
+                    labels, histogram.count))
+                lines.append('cloudflare_dns_request_duration_seconds_sum{{{0}}} {1}'.format(labels, histogram.sum))
+                lines.append('cloudflare_dns_request_duration_seconds_count{{{0}}} {1}'.format(
+                    labels, histogram.count))
+            for name, help_text, value in (
+                    ('retries_total', 'Retried API requests.', self.retries),
+                    ('rate_limited_total', 'API requests rejected by the rate limit.', self.rate_limited),
+                    ('bytes_sent_total', 'Bytes of the request payloads.', self.bytes_sent),
+                    ('bytes_received_total', 'Bytes of the response payloads.', self.bytes_received)):
+                lines.append('# HELP cloudflare_dns_{0} {1}'.format(name, help_text))
+                lines.append('# TYPE cloudflare_dns_{0} counter'.format(name))
+                lines.append('cloudflare_dns_{0} {1}'.format(name, value))
+            lines.append('# HELP cloudflare_dns_phase_seconds_total Time spent in the API requests by phase.')
+            lines.append('# TYPE cloudflare_dns_phase_seconds_total counter')
+            for phase, seconds in sorted(self.phases.items()):
+                lines.append('cloudflare_dns_phase_seconds_total{{phase="{0}"}} {1}'.format(_label(phase), seconds))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, file_name):
+        """Writing the Prometheus textfile atomically, so that the collector never reads a partial file"""
+        part_file_name = file_name + '.part'
+        with open(part_file_name, 'w') as f:
+            f.write(self.prometheus_text())
+        os.rename(part_file_name, file_name)
+
+
+class PrometheusTextfileWriter(object):
+    """Writing the metrics to a Prometheus textfile every interval seconds on a background thread, and on stop"""
+    def __init__(self, metrics, file_name, interval=DEFAULT_PROMETHEUS_INTERVAL):
+        self.metrics = metrics
+        self.file_name = file_name
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.metrics.write_prometheus(self.file_name)
+
+    def start(self):
+        self.metrics.write_prometheus(self.file_name)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.metrics.write_prometheus(self.file_name)
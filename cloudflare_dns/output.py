@@ -0,0 +1,201 @@
+from __future__ import print_function
+
+import csv
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+OUTPUT_CSV = 'csv'
+OUTPUT_JSONL = 'jsonl'
+OUTPUT_SQLITE = 'sqlite'
+OUTPUT_FORMATS = (OUTPUT_CSV, OUTPUT_JSONL, OUTPUT_SQLITE)
+
+# every result printed on its own line, nothing but the summaries, or a progress line updated in place
+CONSOLE_VERBOSE = 'verbose'
+CONSOLE_QUIET = 'quiet'
+CONSOLE_PROGRESS = 'progress'
+
+# the largest number of results written at once, and the longest time a result waits to be written
+WRITE_BATCH_SIZE = 1000
+FLUSH_INTERVAL = 0.5
+
+# the number of results waiting for the writer thread before the reporting blocks
+MAX_PENDING_RESULTS = 100000
+
+
+class ResultCounter(object):
+    """Thread-safe named counters, e.g. of the results, the failures and the zones of a run"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def increment(self, name, count=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + count
+            return self._counts[name]
+
+    def get(self, name):
+        with self._lock:
+            return self._counts.get(name, 0)
+
+
+class CsvSink(object):
+    label = 'CSV'
+
+    def __init__(self, file_name, header):
+        self.file_name = file_name
+        self._file = open(file_name, 'wb')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(header)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlSink(object):
+    """One JSON object per line, keyed by the column names"""
+    label = 'JSONL'
+
+    def __init__(self, file_name, header):
+        self.file_name = file_name
+        self.header = header
+        self._file = open(file_name, 'w')
+
+    def write_rows(self, rows):
+        self._file.write(''.join(json.dumps(OrderedDict(zip(self.header, row))) + '\n' for row in rows))
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteSink(object):
+    """A results table, with the column names in snake case, committed after every batch"""
+    label = 'SQLite'
+
+    def __init__(self, file_name, header):
+        self.file_name = file_name
+        # created here, used by the writer thread only
+        self._connection = sqlite3.connect(file_name, check_same_thread=False)
+        columns = ', '.join('"{0}"'.format(column.replace(' ', '_')) for column in header)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS results ({0})'.format(columns))
+        self._insert = 'INSERT INTO results VALUES ({0})'.format(', '.join('?' * len(header)))
+
+    def write_rows(self, rows):
+        self._connection.executemany(self._insert, rows)
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+SINKS = {OUTPUT_CSV: CsvSink, OUTPUT_JSONL: JsonlSink, OUTPUT_SQLITE: SqliteSink}
+
+
+def open_sink(output_format, base_name, header):
+    """Creating the results file base_name.<output_format>"""
+    return SINKS[output_format]('{0}.{1}'.format(base_name, output_format), header)
+
+
+class OutputWriter(object):
+    """Writing the results of a run to a sink and to the console on a dedicated thread
+
+    The reporting code only queues the results, which the writer thread writes in batches of up to batch_size,
+    every flush_interval seconds at least, so that neither the files nor the terminal slow the API requests down.
+
+    :ivar counter: a ResultCounter of the results, the failed results, and of anything else the reporting code
+        counts, e.g. the zones
+    """
+    def __init__(self, sink, console=CONSOLE_VERBOSE, batch_size=WRITE_BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 stream=None):
+        self.sink = sink
+        self.console = console
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stream = stream
+        self.counter = ResultCounter()
+        self._queue = queue.Queue(MAX_PENDING_RESULTS)
+        self._error = None
+        self._progress_shown = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _stream(self):
+        return self.stream if self.stream is not None else sys.stdout
+
+    def write(self, row, text=None, failed=False):
+        """Queuing a result, its row for the sink and its text for the console"""
+        if self._error is not None:
+            raise self._error
+        self.counter.increment('results')
+        if failed:
+            self.counter.increment('failed')
+        self._queue.put((row, text))
+
+    def echo(self, text):
+        """Queuing a console line that is not a result, in order with the results"""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((None, text))
+
+    def _run(self):
+        closing = False
+        last_progress = 0
+        while not closing:
+            try:
+                items = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                items = []
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if items and items[-1] is None:
+                closing = True
+                items.pop()
+            if self._error is not None:
+                continue
+            try:
+                rows = [row for row, _ in items if row is not None]
+                if rows:
+                    self.sink.write_rows(rows)
+                if self.console == CONSOLE_VERBOSE:
+                    lines = [text for _, text in items if text is not None]
+                    if lines:
+                        self._stream().write(''.join(line + '\n' for line in lines))
+                elif self.console == CONSOLE_PROGRESS and (closing or time.time() - last_progress >= 1.0):
+                    last_progress = time.time()
+                    self._show_progress()
+            except Exception as e:
+                self._error = e
+
+    def _show_progress(self):
+        self._progress_shown = True
+        self._stream().write('\r{0} results, {1} failed, {2} zones'.format(
+            self.counter.get('results'), self.counter.get('failed'), self.counter.get('zones')))
+        self._stream().flush()
+
+    def close(self):
+        """Writing the queued results and closing the sink, raising the error of the writer thread if any"""
+        self._queue.put(None)
+        self._thread.join()
+        self.sink.close()
+        if self._progress_shown:
+            self._stream().write('\n')
+        if self._error is not None:
+            raise self._error
+
+    def generated(self):
+        return "{0} file {1} generated.".format(self.sink.label, self.sink.file_name)
@@ -0,0 +1,73 @@
+import socket
+import struct
+
+PROXIABLE_TYPES = frozenset(['A', 'AAAA', 'CNAME'])
+
+# The IPv4 networks that CloudFlare cannot proxy to: private, loopback, link-local, documentation and reserved ranges
+NON_PUBLIC_IPV4_NETWORKS = (
+    ('0.0.0.0', 8), ('10.0.0.0', 8), ('100.64.0.0', 10), ('127.0.0.0', 8), ('169.254.0.0', 16), ('172.16.0.0', 12),
+    ('192.0.0.0', 24), ('192.0.2.0', 24), ('192.168.0.0', 16), ('198.18.0.0', 15), ('198.51.100.0', 24),
+    ('203.0.113.0', 24), ('224.0.0.0', 4), ('240.0.0.0', 4),
+)
+
+# The same for IPv6: unspecified, loopback, unique local, link-local, multicast and documentation ranges
+NON_PUBLIC_IPV6_NETWORKS = (
+    ('::', 128), ('::1', 128), ('fc00::', 7), ('fe80::', 10), ('ff00::', 8), ('2001:db8::', 32),
+)
+
+
+def _ip_to_int(family, address):
+    packed = socket.inet_pton(family, address)
+    if family == socket.AF_INET:
+        return struct.unpack('!I', packed)[0]
+    high, low = struct.unpack('!QQ', packed)
+    return (high << 64) | low
+
+
+def _in_networks(family, address, networks):
+    bits = 32 if family == socket.AF_INET else 128
+    value = _ip_to_int(family, address)
+    for network, prefix_length in networks:
+        shift = bits - prefix_length
+        if (value >> shift) == (_ip_to_int(family, network) >> shift):
+            return True
+    return False
+
+
+def _is_ip_address(family, address):
+    try:
+        socket.inet_pton(family, address)
+    except (socket.error, ValueError):
+        return False
+    return True
+
+
+def proxied_for_type(record_type, proxied):
+    """The explicit proxy status of a write, which only applies to the record types that can be proxied
+
+    :return: proxied for the A, AAAA and CNAME records, None for the other types, whose writes never send it
+    """
+    return proxied if record_type.upper() in PROXIABLE_TYPES else None
+
+
+def is_proxiable(record_type, record_name, content):
+    """Telling whether CloudFlare can proxy a DNS record, without asking the API
+
+    Only A, AAAA and CNAME records pointing to public targets can be proxied. Wildcard records are not proxiable on
+    the free plan, so they are left to the API to decide.
+
+    :return: True when the record can be proxied, False otherwise
+    """
+    if record_type not in PROXIABLE_TYPES or not content:
+        return False
+    if record_name and record_name.startswith('*'):
+        return False
+    if record_type == 'A':
+        return _is_ip_address(socket.AF_INET, content) and \
+            not _in_networks(socket.AF_INET, content, NON_PUBLIC_IPV4_NETWORKS)
+    if record_type == 'AAAA':
+        return _is_ip_address(socket.AF_INET6, content) and \
+            not _in_networks(socket.AF_INET6, content, NON_PUBLIC_IPV6_NETWORKS)
+    target = content.rstrip('.').lower()
+    return target != 'localhost' and not _is_ip_address(socket.AF_INET, target) and \
+        not _is_ip_address(socket.AF_INET6, target)
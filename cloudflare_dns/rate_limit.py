@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# CloudFlare allows 1200 requests per 5 minutes. A full burst followed by 5 minutes at the steady rate
+# stays within that budget: 150 + 3.5 * 300 = 1200.
+DEFAULT_RATE = 3.5
+DEFAULT_BURST = 150
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter, shared by all the threads using the same instance
+
+    The bucket holds at most burst tokens and is refilled with rate tokens per second. Every request takes one token,
+    waiting for it when the bucket is empty.
+
+    When state_file is given, the bucket content is kept in that file, locked while it is updated, so all the
+    processes of the host using the same file share one budget. The file locking needs the fcntl module, without it
+    the bucket is only shared within the process.
+    """
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, state_file=None, clock=time.time, sleep=time.sleep):
+        if rate <= 0 or burst < 1:
+            raise ValueError('The rate must be positive and the burst at least 1')
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.state_file = state_file
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated_on = clock()
+
+    def _refill(self, tokens, updated_on, now):
+        return min(self.burst, tokens + max(0.0, now - updated_on) * self.rate)
+
+    def _take(self, tokens, updated_on):
+        """Returns the new bucket state and the time to wait before retrying, 0 when the token was taken"""
+        now = self.clock()
+        tokens = self._refill(tokens, updated_on, now)
+        # tolerating rounding errors, which would otherwise lead to endless waits shorter than the clock resolution
+        if tokens >= 1 - 1e-9:
+            return max(0.0, tokens - 1), now, 0
+        return tokens, now, (1 - tokens) / self.rate
+
+    def _take_shared(self):
+        with open(self.state_file, 'a+') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                try:
+                    state = json.loads(content)
+                    tokens, updated_on = state['tokens'], state['updated_on']
+                except (ValueError, KeyError, TypeError):
+                    tokens, updated_on = self.burst, self.clock()
+                tokens, updated_on, wait = self._take(tokens, updated_on)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': tokens, 'updated_on': updated_on}))
+                f.flush()
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return wait
+
+    def try_acquire(self):
+        """Taking a token without waiting
+
+        :return: 0 when the token was taken, otherwise the number of seconds before one is available
+        """
+        with self._lock:
+            if self.state_file is not None and fcntl is not None:
+                return self._take_shared()
+            self._tokens, self._updated_on, wait = self._take(self._tokens, self._updated_on)
+            return wait
+
+    def acquire(self):
+        """Taking a token, waiting as long as needed"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            self.sleep(wait)
@@ -0,0 +1,78 @@
+try:
+    intern_string = intern
+except NameError:
+    from sys import intern as intern_string
+
+
+def _interned(value):
+    """The single shared copy of a short string repeated across many records, such as a record type or a zone name"""
+    if value is None:
+        return None
+    try:
+        return intern_string(str(value))
+    except UnicodeError:
+        return value
+
+
+class DnsRecord(object):
+    """A DNS record with only the fields the bulk commands use, for holding millions of them
+
+    A record of the API is a dictionary with a dozen entries, timestamps, meta and data included, taking about a
+    kilobyte. A DnsRecord keeps its fields in slots instead of a dictionary, and shares the record type and the zone
+    name strings with all the other records, so that it takes a fraction of it.
+
+    It can be read like the dictionary it replaces, dns_record['content'] or dns_record.get('proxied'), and
+    to_dict() gives the dictionary of its fields.
+    """
+    __slots__ = ('id', 'zone_name', 'type', 'name', 'content', 'ttl', 'proxiable', 'proxied', 'priority')
+
+    def __init__(self, record_id, zone_name, record_type, record_name, content, ttl=None, proxiable=None,
+                 proxied=None, priority=None):
+        self.id = record_id
+        self.zone_name = _interned(zone_name)
+        self.type = _interned(record_type)
+        self.name = record_name
+        self.content = content
+        self.ttl = ttl
+        self.proxiable = proxiable
+        self.proxied = proxied
+        self.priority = priority
+
+    @classmethod
+    def from_dict(cls, dns_record, zone_name=None):
+        """The compact version of a DNS record of the API
+
+        :param zone_name: the name of the zone of the record, when the record does not hold it
+        """
+        return cls(
+            dns_record['id'], dns_record.get('zone_name', zone_name), dns_record['type'], dns_record['name'],
+            dns_record['content'], ttl=dns_record.get('ttl'), proxiable=dns_record.get('proxiable'),
+            proxied=dns_record.get('proxied'), priority=dns_record.get('priority'))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def to_dict(self):
+        return dict((key, getattr(self, key)) for key in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, DnsRecord) and all(
+            getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'DnsRecord({0})'.format(', '.join(
+            '{0}={1!r}'.format(key, getattr(self, key)) for key in self.__slots__))
+
+
+def compact_records(dns_records, zone_name=None):
+    """Iterating over the compact versions of DNS records of the API"""
+    for dns_record in dns_records:
+        yield DnsRecord.from_dict(dns_record, zone_name=zone_name)
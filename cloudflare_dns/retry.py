@@ -0,0 +1,77 @@
+import random
+import re
+import time
+
+from CloudFlare.exceptions import CloudFlareAPIError
+
+# The number of retries allowed per request, by HTTP method. Creating is retried less, as a creation that failed after
+# reaching the API is reported as "already exists" on the next attempt.
+DEFAULT_MAX_RETRIES = {'GET': 5, 'POST': 2, 'PUT': 3, 'PATCH': 3, 'DELETE': 3}
+
+# 0 is used by the CloudFlare library for connection failures and unparsable (e.g. HTML error page) responses,
+# 971 and 1015 for throttled requests
+RETRYABLE_CODES = frozenset([0, 429, 500, 502, 503, 504, 971, 1015])
+RETRYABLE_MESSAGE_PATTERN = re.compile(
+    r'rate.?limit|throttl|timed? ?out|try again|temporar|unavailable|internal (server )?error', re.IGNORECASE)
+
+
+def is_retryable(exception):
+    """Telling whether an API error is transient, so that the same request may succeed later
+
+    A throttled request (HTTP 429) or a server error (HTTP 5xx) is transient whatever the code of its JSON error.
+    """
+    if not isinstance(exception, CloudFlareAPIError):
+        return False
+    if getattr(exception, 'retry_after', None) is not None:
+        return True
+    status_code = getattr(exception, 'status_code', None)
+    if status_code is not None and (status_code == 429 or status_code >= 500):
+        return True
+    if exception.code in RETRYABLE_CODES:
+        return True
+    return RETRYABLE_MESSAGE_PATTERN.search(exception.message or '') is not None
+
+
+class RetryPolicy(object):
+    """Retrying the transient API errors with exponential backoff and full jitter
+
+    :param max_retries: the number of retries allowed per request, by HTTP method, defaults to DEFAULT_MAX_RETRIES.
+        An integer applies to every method.
+    :param base_delay: the delay in seconds before the first retry, doubled for every following retry
+    :param max_delay: the longest delay between two attempts
+    :param jitter: when true, every delay is drawn at random between 0 and its exponential value, so that concurrent
+        workers do not retry in lockstep
+
+    When an error has a retry_after attribute (from the Retry-After header of the response), that delay is used
+    instead.
+    """
+    def __init__(self, max_retries=None, base_delay=0.5, max_delay=60.0, jitter=True, sleep=time.sleep,
+                 random=random.random):
+        if max_retries is None:
+            max_retries = DEFAULT_MAX_RETRIES
+        elif not isinstance(max_retries, dict):
+            max_retries = dict((method, max_retries) for method in DEFAULT_MAX_RETRIES)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.sleep = sleep
+        self.random = random
+
+    def should_retry(self, method, retries, exception):
+        """Telling whether a failed request is attempted again
+
+        :param method: the HTTP method of the request
+        :param retries: the number of retries already done for the request
+        :param exception: the error of the last attempt
+        """
+        return retries < self.max_retries.get(method.upper(), 0) and is_retryable(exception)
+
+    def delay(self, retries, exception=None):
+        retry_after = getattr(exception, 'retry_after', None)
+        if retry_after is not None:
+            return max(0.0, float(retry_after))
+        delay = min(self.max_delay, self.base_delay * (2 ** retries))
+        if self.jitter:
+            delay *= self.random()
+        return delay
@@ -0,0 +1,171 @@
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util import connection
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_DNS_CACHE_TTL = 300.0
+
+
+class DnsCache(object):
+    """Caching the addresses of the API host, so that the new connections of a run do not resolve it again"""
+    def __init__(self, ttl=DEFAULT_DNS_CACHE_TTL, clock=time.time, resolve=socket.getaddrinfo):
+        self.ttl = ttl
+        self.clock = clock
+        self._resolve = resolve
+        self._lock = threading.Lock()
+        # the connections opened at the same time wait for a single lookup instead of resolving the host each
+        self._resolving_lock = threading.Lock()
+        self._addresses = {}
+
+    def _cached(self, host, port):
+        with self._lock:
+            cached = self._addresses.get((host, port))
+            if cached is not None and self.clock() - cached[0] < self.ttl:
+                return cached[1]
+
+    def resolve(self, host, port):
+        """The IP addresses of a host, in the order of the resolver"""
+        addresses = self._cached(host, port)
+        if addresses is not None:
+            return addresses
+        with self._resolving_lock:
+            addresses = self._cached(host, port)
+            if addresses is not None:
+                return addresses
+            addresses = []
+            for _, _, _, _, sockaddr in self._resolve(host, port, 0, socket.SOCK_STREAM):
+                if sockaddr[0] not in addresses:
+                    addresses.append(sockaddr[0])
+            with self._lock:
+                self._addresses[(host, port)] = (self.clock(), addresses)
+        return addresses
+
+    def invalidate(self, host, port):
+        with self._lock:
+            self._addresses.pop((host, port), None)
+
+
+class _DnsCachingConnection(object):
+    """Opening the connections to the addresses of the DNS cache, the host name still being used for TLS"""
+    dns_cache = None
+    on_new_connection = None
+
+    def _new_conn(self):
+        extra_kw = {}
+        if self.source_address:
+            extra_kw['source_address'] = self.source_address
+        if self.socket_options:
+            extra_kw['socket_options'] = self.socket_options
+        try:
+            addresses = self.dns_cache.resolve(self._dns_host, self.port)
+        except socket.error as e:
+            raise NewConnectionError(self, 'Failed to establish a new connection: {0}'.format(e))
+        error = None
+        for address in addresses:
+            try:
+                conn = connection.create_connection((address, self.port), self.timeout, **extra_kw)
+            except socket.timeout:
+                raise ConnectTimeoutError(
+                    self, 'Connection to {0} timed out. (connect timeout={1})'.format(self.host, self.timeout))
+            except socket.error as e:
+                error = e
+            else:
+                self.on_new_connection()
+                return conn
+        # the addresses may have changed
+        self.dns_cache.invalidate(self._dns_host, self.port)
+        raise NewConnectionError(self, 'Failed to establish a new connection: {0}'.format(error))
+
+
+class _PooledAdapter(HTTPAdapter):
+    """An HTTP adapter whose connections resolve the host with a DNS cache"""
+    def __init__(self, dns_cache, on_new_connection, pool_size):
+        connection_attributes = {'dns_cache': dns_cache, 'on_new_connection': staticmethod(on_new_connection)}
+        self.pool_classes_by_scheme = {
+            'http': type('DnsCachingHTTPConnectionPool', (HTTPConnectionPool,), {'ConnectionCls': type(
+                'DnsCachingHTTPConnection', (_DnsCachingConnection, HTTPConnection), connection_attributes)}),
+            'https': type('DnsCachingHTTPSConnectionPool', (HTTPSConnectionPool,), {'ConnectionCls': type(
+                'DnsCachingHTTPSConnection', (_DnsCachingConnection, HTTPSConnection), connection_attributes)})}
+        # blocking, so that the threads beyond the pool size wait for a connection instead of opening throwaway ones
+        super(_PooledAdapter, self).__init__(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(_PooledAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes_by_scheme
+
+
+class HttpSession(object):
+    """A pool of keep-alive HTTP connections to the API, shared by the threads of a run
+
+    Every thread gets its own requests.Session, all of them sending their requests through the same connection pool,
+    which is thread-safe. The pool keeps up to pool_size connections open, a thread needing one more waits for a
+    connection to be released.
+
+    :param pool_size: the number of connections kept open, to size after the number of concurrent requests
+    :param connect_timeout: the time in seconds allowed to open a connection
+    :param read_timeout: the time in seconds allowed between two bytes of a response
+    :param dns_cache: the DnsCache resolving the API host, a new one by default
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, dns_cache=None):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.dns_cache = dns_cache if dns_cache is not None else DnsCache()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._adapter = None
+        self._generation = 0
+        self._requests = 0
+        self._connections = 0
+
+    def _count_connection(self):
+        with self._lock:
+            self._connections += 1
+
+    def resize(self, pool_size):
+        """Changing the number of connections kept open, the open connections being closed"""
+        with self._lock:
+            self.pool_size = pool_size
+            adapter, self._adapter = self._adapter, None
+            self._generation += 1
+        if adapter is not None:
+            adapter.close()
+
+    def _session(self):
+        with self._lock:
+            if self._adapter is None:
+                self._adapter = _PooledAdapter(self.dns_cache, self._count_connection, self.pool_size)
+            adapter, generation = self._adapter, self._generation
+            self._requests += 1
+        if getattr(self._local, 'generation', None) != generation:
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._local.session = session
+            self._local.generation = generation
+        return self._local.session
+
+    def request(self, method, url, **kwargs):
+        """Sending a request like requests.request, with the timeouts of the session by default"""
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        return self._session().request(method, url, **kwargs)
+
+    def stats(self):
+        """The number of requests sent, of connections opened and of requests sent on an open connection"""
+        with self._lock:
+            return {
+                'requests': self._requests, 'connections': self._connections,
+                'reused': max(0, self._requests - self._connections)}
+
+    def close(self):
+        self.resize(self.pool_size)
@@ -0,0 +1,117 @@
+import csv
+import hashlib
+import heapq
+import os
+import re
+
+# the suffix of the results file of a shard, e.g. cf_list_records_20170131_120000_shard-2-of-4.csv
+SHARD_REPORT_PATTERN = re.compile(r'^(?P<prefix>.+?)_\d{8}_\d{6}_shard-(?P<index>\d+)-of-(?P<count>\d+)\.csv$')
+
+
+def parse_shard(spec):
+    """Parsing a shard given as i/N, i from 1 to N
+
+    :return: the (i, N) tuple
+    :raise ValueError: when the shard is invalid
+    """
+    try:
+        index, count = [int(part) for part in spec.split('/')]
+    except ValueError:
+        raise ValueError('Invalid shard: {0}'.format(spec))
+    if not 1 <= index <= count:
+        raise ValueError('Invalid shard: {0}'.format(spec))
+    return index, count
+
+
+def shard_of(zone_name, count):
+    """The shard, from 1 to count, of a zone
+
+    The zone name is hashed with MD5 rather than with hash(), which may differ between processes and hosts, so that
+    every process agrees on the shards without any coordination.
+    """
+    digest = hashlib.md5(zone_name.strip().lower().encode('utf-8')).hexdigest()
+    return int(int(digest[:16], 16) % count) + 1
+
+
+def in_shard(zone_names, shard):
+    """Filtering the zone names of a shard, all of them when shard is None"""
+    if shard is None:
+        for zone_name in zone_names:
+            yield zone_name
+        return
+    index, count = shard
+    for zone_name in zone_names:
+        if shard_of(zone_name, count) == index:
+            yield zone_name
+
+
+def shard_suffix(shard):
+    return '' if shard is None else '_shard-{0}-of-{1}'.format(*shard)
+
+
+def _ordered_rows(file_name, positions, report_number):
+    with open(file_name, 'rb') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row_number, row in enumerate(reader):
+            position = positions.get(row[0].lower(), len(positions)) if row else len(positions)
+            yield position, report_number, row_number, row
+
+
+def merge_reports(zone_names, report_file_names, merged_file_name):
+    """Merging the results files of the shards of a run into the results file of a run without shards
+
+    The rows of every shard being in the order of the domain list, the reports are merged in a single pass, keeping
+    the rows of a zone together and the zones in the order of the domain list, whatever the number of rows.
+
+    :param zone_names: the zone names of the domain list, in order
+    :param report_file_names: the CSV results files of the shards, all with the same header
+    :param merged_file_name: the CSV file to write
+    :return: the number of rows merged
+    :raise ValueError: when the headers of the reports differ
+    """
+    positions = {}
+    for zone_name in zone_names:
+        positions.setdefault(zone_name.lower(), len(positions))
+
+    header = None
+    for file_name in report_file_names:
+        with open(file_name, 'rb') as f:
+            report_header = next(csv.reader(f), None)
+        if header is None:
+            header = report_header
+        elif report_header != header:
+            raise ValueError('The header of {0} differs from the header of {1}'.format(
+                file_name, report_file_names[0]))
+
+    row_count = 0
+    with open(merged_file_name, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(header or [])
+        for _, _, _, row in heapq.merge(*[
+                _ordered_rows(file_name, positions, report_number)
+                for report_number, file_name in enumerate(report_file_names)]):
+            writer.writerow(row)
+            row_count += 1
+    return row_count
+
+
+def missing_shards(report_file_names):
+    """The shards, as (i, N) tuples, without a results file among the ones of a run with N shards"""
+    found = set()
+    counts = set()
+    for file_name in report_file_names:
+        match = SHARD_REPORT_PATTERN.match(os.path.basename(file_name))
+        if match is not None:
+            found.add(int(match.group('index')))
+            counts.add(int(match.group('count')))
+    return [(index, count) for count in sorted(counts) for index in range(1, count + 1) if index not in found]
+
+
+def merged_report_prefix(report_file_names):
+    """The name of the results files of the command that produced the reports of the shards, e.g. cf_list_records"""
+    for file_name in report_file_names:
+        match = SHARD_REPORT_PATTERN.match(os.path.basename(file_name))
+        if match is not None:
+            return match.group('prefix')
+    return 'cf_dns_merged'
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# The age after which the records of a zone are listed again by a refresh, whatever its probe
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+# The number of records of the probe checking a zone against the snapshot, the smallest page of the API
+PROBE_SIZE = 5
+
+# How the listing of the records uses the snapshot: saving the records listed, answering from the snapshot only, or
+# listing again only the zones changed since they were saved
+SNAPSHOT_UPDATE = 'update'
+SNAPSHOT_READ = 'read'
+SNAPSHOT_REFRESH = 'refresh'
+
+
+def default_snapshot_path():
+    path = os.environ.get('CLOUDFLARE_DNS_SNAPSHOT')
+    if path:
+        return path
+    return os.path.join(os.path.expanduser('~'), '.cloudflare_dns', 'snapshot.sqlite')
+
+
+class RecordSnapshot(object):
+    """Persistent snapshot of the DNS records of the zones, by zone name
+
+    Every zone is saved with all its records, each with its modified_on. The modified_on of a zone is not changed by
+    the changes of its records, so a zone is checked against a probe instead, a first page of PROBE_SIZE records with
+    the total number of records: a zone listed less than max_age seconds ago, with the same number of records and the
+    same probed records, is current and its records are answered from the snapshot instead of being listed again.
+
+    The snapshot is stored in a SQLite database, opened on first use, and the same instance can be shared by several
+    threads.
+    """
+    def __init__(self, path=None, max_age=DEFAULT_MAX_AGE, clock=time.time):
+        if path is None:
+            path = default_snapshot_path()
+        self.path = path
+        self.max_age = max_age
+        self.clock = clock
+        self._connection = None
+        self._lock = threading.Lock()
+        self.current_count = 0
+        self.saved_count = 0
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS zones ('
+                'name TEXT PRIMARY KEY, zone_id TEXT NOT NULL, modified_on TEXT, synced_on REAL NOT NULL)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                'zone_name TEXT NOT NULL, record_id TEXT NOT NULL, modified_on TEXT, record TEXT NOT NULL, '
+                'PRIMARY KEY (zone_name, record_id))')
+            self._connection.commit()
+        return self._connection
+
+    def get_records(self, domain_name):
+        """The saved records of a zone, in the order they were listed, or None when the zone was never saved"""
+        with self._lock:
+            connection = self._connect()
+            if connection.execute('SELECT 1 FROM zones WHERE name = ?', (domain_name.lower(),)).fetchone() is None:
+                return None
+            rows = connection.execute(
+                'SELECT record FROM records WHERE zone_name = ? ORDER BY rowid', (domain_name.lower(),)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def is_current(self, zone_info, dns_records, total_count):
+        """Telling whether the saved records of a zone are current
+
+        The records added and deleted are caught by the number of records, the records edited only when they are
+        probed: a zone of up to PROBE_SIZE records is checked entirely, on a larger one an edit of a record past the
+        probe is only caught once the zone is max_age seconds old.
+
+        :param zone_info: the zone information dictionary
+        :param dns_records: the probe, the first page of a fresh listing of the records of the zone
+        :param total_count: the number of records of the zone reported with the probe
+        """
+        name = zone_info['name'].lower()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute('SELECT zone_id, synced_on FROM zones WHERE name = ?', (name,)).fetchone()
+            current = row is not None and row[0] == zone_info['id'] and row[1] + self.max_age >= self.clock()
+            if current:
+                saved = dict(connection.execute(
+                    'SELECT record_id, modified_on FROM records WHERE zone_name = ?', (name,)).fetchall())
+                current = len(saved) == total_count and all(
+                    dns_record['id'] in saved and saved[dns_record['id']] == dns_record.get('modified_on')
+                    for dns_record in dns_records)
+            if current:
+                self.current_count += 1
+        return current
+
+    def save(self, zone_info, dns_records):
+        """Replacing the saved records of a zone by all its records, just listed"""
+        name = zone_info['name'].lower()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('DELETE FROM records WHERE zone_name = ?', (name,))
+                connection.executemany(
+                    'INSERT OR REPLACE INTO records (zone_name, record_id, modified_on, record) VALUES (?, ?, ?, ?)',
+                    [(name, dns_record['id'], dns_record.get('modified_on'), json.dumps(dns_record))
+                     for dns_record in dns_records])
+                connection.execute(
+                    'INSERT OR REPLACE INTO zones (name, zone_id, modified_on, synced_on) VALUES (?, ?, ?, ?)',
+                    (name, zone_info['id'], zone_info.get('modified_on'), self.clock()))
+            self.saved_count += 1
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,130 @@
+import csv
+
+DESIRED_STATE_HEADER = ['type', 'name', 'content']
+
+
+def _calls(count, chunk_size):
+    if count == 0:
+        return 0
+    if not chunk_size:
+        return count
+    return (count + chunk_size - 1) // chunk_size
+
+
+def read_desired_state(file_name):
+    """Reading the records every zone should have, from a CSV file with the columns type, name and content
+
+    The header row is optional, blank lines and lines starting with # are ignored. The names and the contents may
+    use the {{zone}} template, an empty name or @ stands for the zone apex and a name not ending with the zone name
+    is relative to it.
+
+    :return: the list of (record type, record name, content) tuples
+    """
+    desired_records = []
+    with open(file_name) as f:
+        for row in csv.reader(f):
+            if not row or not ''.join(row).strip() or row[0].startswith('#'):
+                continue
+            if [value.strip().lower() for value in row] == DESIRED_STATE_HEADER:
+                continue
+            if len(row) != 3:
+                raise ValueError('Invalid desired state row: {0}'.format(','.join(row)))
+            desired_records.append((row[0].strip().upper(), row[1].strip(), row[2].strip()))
+    return desired_records
+
+
+def zone_record_name(record_name, domain_name):
+    """The full name of a desired record in a zone"""
+    record_name = record_name.replace("{{zone}}", domain_name)
+    if record_name in ('', '@'):
+        return domain_name
+    if record_name.lower() == domain_name.lower() or record_name.lower().endswith('.' + domain_name.lower()):
+        return record_name
+    return '{0}.{1}'.format(record_name, domain_name)
+
+
+def _key(record_type, record_name, content):
+    return record_type.upper(), record_name.lower(), content
+
+
+def same_record(dns_record, record_type, record_name, content):
+    """Telling whether an existing DNS record has a type, a full name and a content, compared like the sync does"""
+    return _key(dns_record['type'], dns_record['name'], dns_record['content']) == \
+        _key(record_type, record_name, content)
+
+
+class ZoneSyncPlan(object):
+    """The changes bringing the DNS records of a zone to the desired state
+
+    :ivar creates: the (record type, record name, content) tuples of the records to create
+    :ivar updates: the (existing DNS record, (record type, record name, content)) tuples of the records to change in
+        place, an existing record being updated rather than deleted when a desired record has the same type and name
+    :ivar deletes: the existing DNS records to delete
+    :ivar unchanged: the number of existing records already in the desired state
+    """
+    def __init__(self, creates, updates, deletes, unchanged, listed_records):
+        self.creates = creates
+        self.updates = updates
+        self.deletes = deletes
+        self.unchanged = unchanged
+        self.listed_records = listed_records
+
+    def api_calls(self, page_size, batch_size=None):
+        """The number of API calls listing the zone and applying the plan, the zone lookup aside"""
+        return max(1, _calls(self.listed_records, page_size)) + sum(
+            _calls(len(changes), batch_size) for changes in (self.creates, self.updates, self.deletes))
+
+    def __str__(self):
+        return "{0} to create, {1} to update, {2} to delete, {3} unchanged".format(
+            len(self.creates), len(self.updates), len(self.deletes), self.unchanged)
+
+
+def plan_zone_sync(dns_records, desired_records, domain_name):
+    """Diffing the DNS records of a zone against the desired records, keyed by (type, name, content)
+
+    :param dns_records: the existing DNS records of the zone
+    :param desired_records: the (record type, record name, content) tuples from read_desired_state
+    :param domain_name: the zone name
+    :return: a ZoneSyncPlan
+    """
+    desired = {}
+    desired_keys = []
+    for record_type, record_name, content in desired_records:
+        record = (record_type, zone_record_name(record_name, domain_name), content.replace("{{zone}}", domain_name))
+        key = _key(*record)
+        if key not in desired:
+            desired[key] = record
+            desired_keys.append(key)
+
+    unchanged = 0
+    stale = []
+    kept = set()
+    listed_records = 0
+    for dns_record in dns_records:
+        listed_records += 1
+        key = _key(dns_record['type'], dns_record['name'], dns_record['content'])
+        if key in desired and key not in kept:
+            kept.add(key)
+            unchanged += 1
+        else:
+            stale.append(dns_record)
+
+    # the missing records by (type, name), in the order of the desired state
+    missing = {}
+    for key in desired_keys:
+        if key not in kept:
+            missing.setdefault(key[:2], []).append(key)
+
+    updates = []
+    deletes = []
+    updated = set()
+    for dns_record in stale:
+        candidates = missing.get((dns_record['type'].upper(), dns_record['name'].lower()))
+        if candidates:
+            key = candidates.pop(0)
+            updated.add(key)
+            updates.append((dns_record, desired[key]))
+        else:
+            deletes.append(dns_record)
+    creates = [desired[key] for key in desired_keys if key not in kept and key not in updated]
+    return ZoneSyncPlan(creates, updates, deletes, unchanged, listed_records)
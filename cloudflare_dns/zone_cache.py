@@ -0,0 +1,87 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL = 24 * 60 * 60
+
+
+def default_zone_cache_path():
+    path = os.environ.get('CLOUDFLARE_DNS_ZONE_CACHE')
+    if path:
+        return path
+    return os.path.join(os.path.expanduser('~'), '.cloudflare_dns', 'zone_cache.sqlite')
+
+
+class ZoneCache(object):
+    """Persistent cache of the zone information of each account, by zone name
+
+    The entries are stored in a SQLite database, so they are shared by the consecutive runs of the command line app.
+    An entry older than ttl seconds is ignored. The database is opened on first use and the same instance can be
+    shared by several threads.
+    """
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        if path is None:
+            path = default_zone_cache_path()
+        self.path = path
+        self.ttl = ttl
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS zones ('
+                'account TEXT NOT NULL, name TEXT NOT NULL, zone_info TEXT NOT NULL, cached_on REAL NOT NULL, '
+                'PRIMARY KEY (account, name))')
+            self._connection.commit()
+        return self._connection
+
+    def get(self, account, domain_name):
+        """Getting the cached zone information
+
+        :param account: the account owning the zone, for example its API email
+        :param domain_name: the zone name
+        :return: the zone information dictionary, or None when it is not cached or expired
+        """
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT zone_info, cached_on FROM zones WHERE account = ? AND name = ?',
+                (account, domain_name.lower())).fetchone()
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, account, zone_info):
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO zones (account, name, zone_info, cached_on) VALUES (?, ?, ?, ?)',
+                (account, zone_info['name'].lower(), json.dumps(zone_info), time.time()))
+            connection.commit()
+
+    def invalidate(self, account, domain_name=None):
+        """Removing cached entries
+
+        :param account: the account owning the zones
+        :param domain_name: the zone name, or None to remove every zone of the account
+        """
+        with self._lock:
+            connection = self._connect()
+            if domain_name is None:
+                connection.execute('DELETE FROM zones WHERE account = ?', (account,))
+            else:
+                connection.execute(
+                    'DELETE FROM zones WHERE account = ? AND name = ?', (account, domain_name.lower()))
+            connection.commit()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
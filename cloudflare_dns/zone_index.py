@@ -0,0 +1,92 @@
+ZONES_MAX_PER_PAGE = 50
+AUTO_INDEX_MIN_DOMAINS = 100
+
+ZONE_LOOKUP_AUTO = 'auto'
+ZONE_LOOKUP_INDEX = 'index'
+ZONE_LOOKUP_PER_DOMAIN = 'per-domain'
+ZONE_LOOKUP_STRATEGIES = (ZONE_LOOKUP_AUTO, ZONE_LOOKUP_INDEX, ZONE_LOOKUP_PER_DOMAIN)
+
+
+class ZoneIndex(object):
+    """In-memory index of all the zones of an account, by zone name
+
+    A zone missing from the index does not exist in the account.
+    """
+    def __init__(self, zone_infos=()):
+        self.zones = {}
+        for zone_info in zone_infos:
+            self.add(zone_info)
+
+    def add(self, zone_info):
+        self.zones[zone_info['name'].lower()] = zone_info
+
+    def get(self, domain_name):
+        return self.zones.get(domain_name.lower())
+
+    def __len__(self):
+        return len(self.zones)
+
+
+class ZoneLookupPlan(object):
+    """The zone lookup strategy selected for a domain list, with the API calls each strategy costs
+
+    index_calls is None when the size of the account was not probed.
+    """
+    def __init__(self, strategy, domain_count, per_domain_calls, zone_count=None, index_calls=None):
+        self.strategy = strategy
+        self.domain_count = domain_count
+        self.per_domain_calls = per_domain_calls
+        self.zone_count = zone_count
+        self.index_calls = index_calls
+
+    def __str__(self):
+        text = "Zone lookup of {0} domains: per-domain lookups cost {1} API calls".format(
+            self.domain_count, self.per_domain_calls)
+        if self.index_calls is not None:
+            text += ", an index of the {0} zones of the account costs {1} API calls".format(
+                self.zone_count, self.index_calls)
+        return text + ". Using {0}.".format(
+            'the zone index' if self.strategy == ZONE_LOOKUP_INDEX else 'per-domain lookups')
+
+
+def prepare_zone_lookup(domain_names, cf_lib_wrapper, strategy=ZONE_LOOKUP_AUTO, per_page=ZONES_MAX_PER_PAGE):
+    """Selecting how the zones of a domain list are resolved, and building the zone index when it is cheaper
+
+    :param domain_names: the domain names that will be looked up
+    :param cf_lib_wrapper: the CloudFlareLibWrapper, its zone_index is set when the index strategy is selected
+    :param strategy: ZONE_LOOKUP_AUTO, ZONE_LOOKUP_INDEX or ZONE_LOOKUP_PER_DOMAIN
+    :param per_page: the page size used to list the zones of the account
+    :return: a ZoneLookupPlan
+
+    Per-domain lookups cost one call for every domain missing from the zone cache. The index costs one call for
+    every page of zones in the account, the first page doubling as the probe of the account size. The auto strategy
+    does not probe small domain lists, whose lookups are cheap anyway.
+    """
+    domain_names = set(domain_name.lower() for domain_name in domain_names if domain_name)
+    zone_cache = cf_lib_wrapper.zone_cache
+    if zone_cache is None:
+        per_domain_calls = len(domain_names)
+    else:
+        per_domain_calls = len([
+            domain_name for domain_name in domain_names
+            if zone_cache.get(cf_lib_wrapper.api_email, domain_name) is None])
+
+    if strategy == ZONE_LOOKUP_PER_DOMAIN or (
+            strategy == ZONE_LOOKUP_AUTO and len(domain_names) < AUTO_INDEX_MIN_DOMAINS):
+        return ZoneLookupPlan(ZONE_LOOKUP_PER_DOMAIN, len(domain_names), per_domain_calls)
+
+    zone_infos, result_info = cf_lib_wrapper.list_zones_with_info(page=1, per_page=per_page)
+    plan = ZoneLookupPlan(
+        ZONE_LOOKUP_PER_DOMAIN, len(domain_names), per_domain_calls,
+        zone_count=result_info['total_count'], index_calls=max(1, result_info['total_pages']))
+    if strategy == ZONE_LOOKUP_AUTO and plan.index_calls >= plan.per_domain_calls + 1:
+        return plan
+
+    zone_index = ZoneIndex(zone_infos)
+    for page in range(2, result_info['total_pages'] + 1):
+        zone_infos, _ = cf_lib_wrapper.list_zones_with_info(page=page, per_page=per_page)
+        for zone_info in zone_infos:
+            zone_index.add(zone_info)
+    cf_lib_wrapper.zone_index = zone_index
+    plan.strategy = ZONE_LOOKUP_INDEX
+    return plan
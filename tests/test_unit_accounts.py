@@ -0,0 +1,105 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns.accounts import AccountPool, read_credentials
+from cloudflare_dns.zone_cache import ZoneCache
+from cloudflare_dns.zone_index import ZoneIndex
+
+CREDENTIALS = """
+[first]
+email = first@example.com
+token = FIRST KEY
+
+[second]
+email = second@example.com
+token = SECOND KEY
+"""
+
+
+class TestAccounts(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.credentials_file_name = os.path.join(self.temp_dir, 'credentials.cfg')
+        with open(self.credentials_file_name, 'w') as f:
+            f.write(CREDENTIALS)
+        self.zone_cache = ZoneCache(path=os.path.join(self.temp_dir, 'zone_cache.sqlite'))
+        self.pool = AccountPool.from_credentials(self.credentials_file_name)
+        for cf_lib_wrapper in self.pool.accounts.values():
+            cf_lib_wrapper.zone_cache = self.zone_cache
+        self.first, self.second = self.pool.accounts.values()
+
+    def tearDown(self):
+        self.zone_cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_read_credentials(self):
+        self.assertEqual(
+            [('first', 'first@example.com', 'FIRST KEY'), ('second', 'second@example.com', 'SECOND KEY')],
+            read_credentials(self.credentials_file_name))
+        self.assertEqual(('SECOND KEY', 'second@example.com'), (self.second.api_key, self.second.api_email))
+        self.assertIs(self.first.session, self.second.session)
+
+    def test_read_credentials_invalid(self):
+        with open(self.credentials_file_name, 'w') as f:
+            f.write('[first]\nemail = first@example.com\n')
+        with self.assertRaises(ValueError):
+            read_credentials(self.credentials_file_name)
+        with self.assertRaises(ValueError):
+            read_credentials(os.path.join(self.temp_dir, 'missing.cfg'))
+
+    def test_owner_looked_up_in_every_account(self):
+        self.first._api = MagicMock(return_value=[])
+        self.second._api = MagicMock(return_value=[{'id': 'ZONE ID', 'name': 'domain.com'}])
+
+        self.assertIs(self.second, self.pool.wrapper_for('domain.com'))
+        self.assertIs(self.second, self.pool.wrapper_for('Domain.com'))
+
+        self.assertEqual(1, self.first._api.call_count)
+        self.assertEqual(1, self.second._api.call_count)
+        self.assertEqual({'first': 0, 'second': 1}, dict(self.pool.zone_counts()))
+
+        # the owner is cached for the next runs, in the zone cache of its account
+        pool = AccountPool(self.pool.accounts.items())
+        self.first._api.reset_mock()
+        self.second._api.reset_mock()
+        self.assertIs(self.second, pool.wrapper_for('domain.com'))
+        self.assertFalse(self.first._api.called or self.second._api.called)
+
+    def test_owner_found_in_zone_index(self):
+        self.first.zone_index = ZoneIndex([{'id': 'ZONE ID', 'name': 'other.com'}])
+        self.second.zone_index = ZoneIndex([{'id': 'ZONE ID', 'name': 'domain.com'}])
+        self.first._api = MagicMock()
+        self.second._api = MagicMock()
+
+        self.assertIs(self.second, self.pool.wrapper_for('domain.com'))
+        # a zone missing from every index belongs to no account, it is not looked up
+        self.assertIs(self.first, self.pool.wrapper_for('missing.com'))
+        self.assertFalse(self.first._api.called or self.second._api.called)
+
+    def test_new_zones_spread(self):
+        domain_names = ['domain-{0}.com'.format(i) for i in range(100)]
+        wrappers = [self.pool.wrapper_for_new_zone(domain_name) for domain_name in domain_names]
+        self.assertEqual(wrappers, [self.pool.wrapper_for_new_zone(domain_name) for domain_name in domain_names])
+        self.assertTrue(30 < wrappers.count(self.first) < 70)
+        self.assertEqual(
+            {'first': wrappers.count(self.first), 'second': wrappers.count(self.second)},
+            dict(self.pool.zone_counts()))
+
+    def test_single_wrapper(self):
+        pool = AccountPool([('only', CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL'))])
+        self.assertIs(pool.accounts['only'], pool.wrapper_for_new_zone('domain.com'))
+        with self.assertRaises(ValueError):
+            AccountPool([])
+
+
+if __name__ == '__main__':
+    unittest.main()
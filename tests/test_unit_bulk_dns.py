@@ -1,8 +1,11 @@
 from __future__ import print_function
 from cStringIO import StringIO
+import json
 import os
 import re
+import shutil
 import sys
+import tempfile
 import uuid
 import csv
 import unittest
@@ -14,16 +17,28 @@ try:
     from unittest.mock import MagicMock
 except ImportError:
     from mock import MagicMock
-from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns import CloudFlareLibWrapper, ThreadPoolCloudFlareLibWrapper
 from cloudflare_dns import bulk_dns
+from cloudflare_dns.accounts import AccountPool
+from cloudflare_dns.job import JobOperation
+from cloudflare_dns.journal import journal_path
+from cloudflare_dns.records import DnsRecord
+from cloudflare_dns.zone_index import ZoneIndex
 
 
 class TestBulkDns(unittest.TestCase):
     def setUp(self):
         self.cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL')
+        self.journal_dir = tempfile.mkdtemp()
+        # the journal, the zone cache and the snapshot of the cli runs are kept out of the home directory
+        self.env = EnvironmentVarGuard()
+        self.env.set('CLOUDFLARE_DNS_JOURNAL_DIR', self.journal_dir)
+        self.env.set('CLOUDFLARE_DNS_ZONE_CACHE', os.path.join(self.journal_dir, 'zone_cache.sqlite'))
+        self.env.set('CLOUDFLARE_DNS_SNAPSHOT', os.path.join(self.journal_dir, 'snapshot.sqlite'))
 
     def tearDown(self):
-        pass
+        self.env.__exit__()
+        shutil.rmtree(self.journal_dir)
 
     def test_environment_api_key_not_set_error(self):
         def real_func():
@@ -165,11 +180,7 @@ class TestBulkDns(unittest.TestCase):
                                     u'#zone_settings:read']}
 
             responses.append(response)
-            old_stdout = sys.stdout
-            sys.stdout = my_stdout = StringIO()
             domain_added_cb(succeed=True, response=response)
-            sys.stdout = old_stdout
-            self.assertEqual("added [{0}]: {1}".format(len(responses), domain_name), my_stdout.getvalue().strip())
 
         add_new_domain_real = bulk_dns.add_new_domain
         bulk_dns.add_new_domain = add_new_domain_mock
@@ -181,6 +192,10 @@ class TestBulkDns(unittest.TestCase):
         bulk_dns.add_new_domain = add_new_domain_real
 
         self.assertEqual(30, len(responses))
+        # the results are printed by the writer thread, in order
+        self.assertEqual(
+            ["added [{0}]: {1}".format(i + 1, response['name']) for i, response in enumerate(responses)],
+            [line for line in my_stdout.getvalue().splitlines() if line.startswith('added [')])
         match = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue().strip())
         csv_file_name = match.group(1)
         self.assertTrue(os.path.isfile(csv_file_name))
@@ -282,16 +297,43 @@ class TestBulkDns(unittest.TestCase):
             self.assertEqual('DNS RECORD ID {0}'.format(len(responses)), response['id'])
 
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
-        self.cf_lib_wrapper.list_dns_records = MagicMock(
-            side_effect=[records_page_1, records_page_2])
-        self.cf_lib_wrapper.delete_dns_record = MagicMock(
-            side_effect=records)
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(
+            side_effect=[(records_page_1, {'total_pages': 2}), (records_page_2, {'total_pages': 2})])
+        self.cf_lib_wrapper.batch_dns_records = MagicMock(
+            side_effect=lambda zone_id, deletes=None: {'deletes': deletes})
 
         bulk_dns.delete_all_records(
             domain_name, record_deleted_cb=record_deleted_cb,
             cf_lib_wrapper=self.cf_lib_wrapper)
 
         self.assertEqual(21, len(responses))
+        self.cf_lib_wrapper.batch_dns_records.assert_called_once_with('ZONE ID', deletes=records)
+
+    def test_delete_all_records_failed_batch_reported_per_record(self):
+        domain_name = 'add-purer-happen.host'
+        records = [{'id': 'DNS RECORD ID {0}'.format(i)} for i in range(1, 4)]
+        responses = []
+
+        def record_deleted_cb(**kwargs):
+            responses.append((kwargs['succeed'], kwargs['response']['id']))
+
+        def delete_dns_record(zone_id, record_id):
+            if record_id == 'DNS RECORD ID 2':
+                raise CloudFlareAPIError(81044, 'Record does not exist.')
+            return {'id': record_id}
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=(records, {'total_pages': 1}))
+        self.cf_lib_wrapper.batch_dns_records = MagicMock(
+            side_effect=CloudFlareAPIError(81044, 'Record does not exist.'))
+        self.cf_lib_wrapper.delete_dns_record = MagicMock(side_effect=delete_dns_record)
+
+        bulk_dns.delete_all_records(
+            domain_name, record_deleted_cb=record_deleted_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual(
+            [(True, 'DNS RECORD ID 1'), (False, 'DNS RECORD ID 2'), (True, 'DNS RECORD ID 3')], responses)
 
     def test_delete_all_records_failed_zone_info_none(self):
         responses = []
@@ -387,6 +429,7 @@ class TestBulkDns(unittest.TestCase):
 
         domain_name = 'add-purer-happen.host'
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[])
         self.cf_lib_wrapper.create_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID 345'})
 
         bulk_dns.add_new_record(
@@ -406,6 +449,7 @@ class TestBulkDns(unittest.TestCase):
 
         domain_name = '{0}.com'.format(str(uuid.uuid4()))
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[])
         self.cf_lib_wrapper.create_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID 345'})
 
         bulk_dns.add_new_record(
@@ -425,6 +469,7 @@ class TestBulkDns(unittest.TestCase):
 
         domain_name = '{0}.com'.format(str(uuid.uuid4()))
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[])
         self.cf_lib_wrapper.create_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID 345'})
 
         bulk_dns.add_new_record(
@@ -434,6 +479,115 @@ class TestBulkDns(unittest.TestCase):
         self.assertEqual(1, len(responses))
 
 
+    def test_add_new_record_unchanged(self):
+        responses = []
+
+        def record_added_cb(**kwargs):
+            responses.append(kwargs)
+
+        domain_name = 'add-purer-happen.host'
+        existing = {'id': 'DNS RECORD ID 345', 'type': 'TXT', 'name': 'foo.{0}'.format(domain_name), 'content': 'bar',
+                    'proxied': False}
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[existing])
+        self.cf_lib_wrapper.create_dns_record = MagicMock()
+
+        bulk_dns.add_new_record(
+            domain_name, "TXT", "foo", "bar", record_added_cb=record_added_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual([{'succeed': True, 'response': existing, 'unchanged': True, 'retries': 0}], responses)
+        self.cf_lib_wrapper.find_dns_records.assert_called_once_with(
+            'ZONE ID', 'TXT', 'foo.{0}'.format(domain_name), content='bar')
+        self.assertFalse(self.cf_lib_wrapper.create_dns_record.called)
+
+        # a record to proxy is written even with the same content
+        self.cf_lib_wrapper.proxied = True
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[
+            {'id': 'DNS RECORD ID 345', 'type': 'A', 'name': domain_name, 'content': '93.184.216.34', 'proxied': False}])
+        self.cf_lib_wrapper.create_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID 346'})
+        bulk_dns.add_new_record(
+            domain_name, "A", None, "93.184.216.34", record_added_cb=record_added_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+        self.assertEqual({'id': 'DNS RECORD ID 346'}, responses[-1]['response'])
+        self.assertNotIn('unchanged', responses[-1])
+
+    def test_add_new_record_unchanged_not_proxiable(self):
+        responses = []
+
+        def record_added_cb(**kwargs):
+            responses.append(kwargs)
+
+        domain_name = 'add-purer-happen.host'
+        existing = {'id': 'DNS RECORD ID 345', 'type': 'TXT', 'name': 'foo.{0}'.format(domain_name), 'content': 'bar',
+                    'proxied': False}
+        self.cf_lib_wrapper.proxied = True
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[existing])
+        self.cf_lib_wrapper.create_dns_record = MagicMock()
+
+        # a TXT record is never proxied, whatever --proxied asks
+        bulk_dns.add_new_record(
+            domain_name, "TXT", "foo", "bar", record_added_cb=record_added_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual([{'succeed': True, 'response': existing, 'unchanged': True, 'retries': 0}], responses)
+        self.assertFalse(self.cf_lib_wrapper.create_dns_record.called)
+
+    def test_add_new_record_failed_lookup(self):
+        responses = []
+
+        def record_added_cb(**kwargs):
+            responses.append(kwargs)
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(
+            side_effect=CloudFlareAPIError(10000, 'Authentication error'))
+        self.cf_lib_wrapper.create_dns_record = MagicMock()
+
+        bulk_dns.add_new_record(
+            'add-purer-happen.host', "TXT", "foo", "bar", record_added_cb=record_added_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual(1, len(responses))
+        self.assertFalse(responses[0]['succeed'])
+        self.assertEqual('Authentication error', responses[0]['exception'].message)
+        self.assertFalse(self.cf_lib_wrapper.create_dns_record.called)
+
+    def test_add_new_record_callback_without_new_arguments(self):
+        responses = []
+
+        def record_added_cb(succeed, response=None, exception=None):
+            responses.append((succeed, response, exception))
+
+        domain_name = 'add-purer-happen.host'
+        existing = {'id': 'DNS RECORD ID 345', 'type': 'TXT', 'name': 'foo.{0}'.format(domain_name), 'content': 'bar'}
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(side_effect=[[existing], []])
+        self.cf_lib_wrapper.create_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID 346'})
+
+        bulk_dns.add_new_record(
+            domain_name, "TXT", "foo", "bar", record_added_cb=record_added_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+        bulk_dns.add_new_record(
+            domain_name, "TXT", "foo", "baz", record_added_cb=record_added_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual([(True, existing, None), (True, {'id': 'DNS RECORD ID 346'}, None)], responses)
+
+    def test_tolerant_callback(self):
+        def cb(**kwargs):
+            pass
+
+        class Callback(object):
+            def __init__(self):
+                self.calls = []
+
+            def report(self, succeed, response=None):
+                self.calls.append((succeed, response))
+
+        callback = Callback()
+        self.assertIsNone(bulk_dns.tolerant_callback(None))
+        self.assertIs(cb, bulk_dns.tolerant_callback(cb))
+        bulk_dns.tolerant_callback(callback.report)(succeed=True, response='RESPONSE', retries=2, unchanged=True)
+        self.assertEqual([(True, 'RESPONSE')], callback.calls)
+
     def test_add_new_record_failed_cf_api(self):
         responses = []
 
@@ -446,6 +600,7 @@ class TestBulkDns(unittest.TestCase):
 
         domain_name = 'add-purer-happen.host'
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[])
         self.cf_lib_wrapper.create_dns_record = MagicMock(
             side_effect=CloudFlareAPIError(code=-1, message="FAILED WHEN ADDING DNS RECORD BLAH"))
 
@@ -506,6 +661,53 @@ class TestBulkDns(unittest.TestCase):
             self.assertEqual(31, row_number)
         os.remove(csv_file_name)
 
+    def test_cli_add_new_records_unchanged(self):
+        def add_new_record_mock(domain_name, record_type, record_name, record_content, record_added_cb=None,
+                                cf_lib_wrapper=None):
+            record_added_cb(succeed=True, response={'id': 'DNS RECORD ID'}, unchanged=domain_name.endswith('1.example'))
+
+        add_new_record_original = bulk_dns.add_new_record
+        bulk_dns.add_new_record = MagicMock(side_effect=add_new_record_mock)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(
+            ['--add-new-records', '--type', 'TXT', '--name', 'foo', '--content', 'bar', '../example-domains.txt'],
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        bulk_dns.add_new_record = add_new_record_original
+
+        csv_file_name = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1)
+        with open(csv_file_name, 'rb') as f:
+            rows = list(csv.reader(f))[1:]
+        os.remove(csv_file_name)
+        unchanged = [row[0] for row in rows if row[1] == 'unchanged']
+        self.assertEqual([row[0] for row in rows if row[0].endswith('1.example')], unchanged)
+        self.assertIn('{0} records already existed and were left unchanged.'.format(len(unchanged)),
+                      my_stdout.getvalue())
+
+    def test_cli_edit_records_all_matches(self):
+        edit_record_original = bulk_dns.edit_record
+        bulk_dns.edit_record = MagicMock()
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(
+            ['--edit-records', '--all-matches', '--type', 'A', '--old-content', '111.111.111.111', '--new-content',
+             '222.222.222.222', '../example-domains.txt'],
+            cf_lib_wrapper=self.cf_lib_wrapper)
+        bulk_dns.cli(['--list-records', '--all-matches', '../example-domains.txt'], cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        calls = bulk_dns.edit_record.call_args_list
+        bulk_dns.edit_record = edit_record_original
+
+        os.remove(re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1))
+        self.assertEqual(30, len(calls))
+        self.assertTrue(all(kwargs['all_matches'] for _, kwargs in calls))
+        self.assertTrue(my_stdout.getvalue().strip().endswith(bulk_dns.usage_str))
+
     def test_cli_add_new_records_failed(self):
         def add_new_record_mock(domain_name, record_type, record_name, record_content, record_added_cb=None, cf_lib_wrapper=None):
             record_added_cb(succeed=False, exception=CloudFlareAPIError(code=-1, message="CLI ADD NEW RECORD FAILED"))
@@ -563,7 +765,8 @@ class TestBulkDns(unittest.TestCase):
 
         domain_name = 'add-purer-happen.host'
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
-        self.cf_lib_wrapper.list_dns_records = MagicMock(side_effect=[dns_records_page_1, dns_records_page_2])
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(
+            side_effect=[(dns_records_page_1, {'total_pages': 2}), (dns_records_page_2, {'total_pages': 2})])
 
         bulk_dns.list_records(
             domain_name, record_listed_cb=record_listed_cb,
@@ -571,6 +774,68 @@ class TestBulkDns(unittest.TestCase):
 
         self.assertEqual(21, len(responses))
 
+    def test_list_records_full_records(self):
+        dns_record = {
+            'id': 'DNS RECORD ID', 'type': 'A', 'name': 'add-purer-happen.host', 'content': '93.184.216.34',
+            'meta': {'auto_added': False}, 'modified_on': '2024-01-01T00:00:00Z'}
+        responses = []
+
+        def record_listed_cb(**kwargs):
+            responses.append(kwargs['response'])
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=([dns_record], {'total_pages': 1}))
+
+        bulk_dns.list_records(
+            'add-purer-happen.host', record_listed_cb=record_listed_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+        bulk_dns.list_records(
+            'add-purer-happen.host', record_listed_cb=record_listed_cb, cf_lib_wrapper=self.cf_lib_wrapper,
+            full_records=True)
+
+        self.assertEqual(
+            DnsRecord('DNS RECORD ID', 'add-purer-happen.host', 'A', 'add-purer-happen.host', '93.184.216.34'),
+            responses[0])
+        self.assertIs(dns_record, responses[1])
+
+    def test_list_records_refresh_changed_zone(self):
+        dns_records = [
+            {'id': 'DNS RECORD ID {0}'.format(i), 'type': 'A', 'name': 'add-purer-happen.host',
+             'content': '10.0.0.{0}'.format(i), 'modified_on': '2024-01-01T00:00:00Z'}
+            for i in range(1, 8)]
+        responses = []
+
+        def record_listed_cb(**kwargs):
+            responses.append(kwargs['response']['id'])
+
+        snapshot = MagicMock()
+        snapshot.is_current = MagicMock(return_value=False)
+        self.cf_lib_wrapper.page_size = 100
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=[
+            (dns_records[:5], {'total_count': 7, 'total_pages': 2}),
+            (dns_records, {'total_count': 7, 'total_pages': 1})])
+
+        bulk_dns.list_records(
+            'add-purer-happen.host', record_listed_cb=record_listed_cb, cf_lib_wrapper=self.cf_lib_wrapper,
+            snapshot=snapshot, refresh=True)
+
+        self.assertEqual([record['id'] for record in dns_records], responses)
+        self.assertEqual([(1, 5), (1, 100)], [
+            (kwargs['page'], kwargs['per_page'])
+            for _, kwargs in self.cf_lib_wrapper.list_dns_records_with_info.call_args_list])
+        snapshot.is_current.assert_called_once_with({'id': 'ZONE ID'}, dns_records[:5], 7)
+        snapshot.save.assert_called_once_with({'id': 'ZONE ID'}, dns_records)
+
+        # the probe of a small zone holds all its records
+        snapshot.save.reset_mock()
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(
+            return_value=(dns_records[:3], {'total_count': 3, 'total_pages': 1}))
+        bulk_dns.list_records(
+            'add-purer-happen.host', record_listed_cb=record_listed_cb, cf_lib_wrapper=self.cf_lib_wrapper,
+            snapshot=snapshot, refresh=True)
+        self.assertEqual(1, self.cf_lib_wrapper.list_dns_records_with_info.call_count)
+        snapshot.save.assert_called_once_with({'id': 'ZONE ID'}, dns_records[:3])
+
     def test_list_records_failed_zone_info_is_none(self):
         responses = []
 
@@ -663,7 +928,8 @@ class TestBulkDns(unittest.TestCase):
                 'type': 'TXT', 'name': 'foo.{0}'.format(domain_name),
                 'content': 'new bar',
             })
-        self.cf_lib_wrapper.list_dns_records = MagicMock(side_effect=[dns_records_page_1, dns_records_page_2])
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(
+            side_effect=[(dns_records_page_1, {'total_pages': 2}), (dns_records_page_2, {'total_pages': 2})])
 
         bulk_dns.edit_record(
             domain_name, "TXT", "foo", "bar", "new bar", record_edited_cb=record_edited_cb,
@@ -703,7 +969,8 @@ class TestBulkDns(unittest.TestCase):
                 'type': 'A', 'name': domain_name,
                 'content': '222.222.222.222',
             })
-        self.cf_lib_wrapper.list_dns_records = MagicMock(side_effect=[dns_records_page_1, dns_records_page_2])
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(
+            side_effect=[(dns_records_page_1, {'total_pages': 2}), (dns_records_page_2, {'total_pages': 2})])
 
         bulk_dns.edit_record(
             domain_name, "A", None, "111.111.111.111", "222.222.222.222", record_edited_cb=record_edited_cb,
@@ -743,7 +1010,8 @@ class TestBulkDns(unittest.TestCase):
                 'type': 'A', 'name': domain_name,
                 'content': '222.222.222.222',
             })
-        self.cf_lib_wrapper.list_dns_records = MagicMock(side_effect=[dns_records_page_1, dns_records_page_2])
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(
+            side_effect=[(dns_records_page_1, {'total_pages': 2}), (dns_records_page_2, {'total_pages': 2})])
 
         bulk_dns.edit_record(
             domain_name, "A", None, None, "222.222.222.222", record_edited_cb=record_edited_cb,
@@ -783,7 +1051,8 @@ class TestBulkDns(unittest.TestCase):
                 'type': 'CNAME', 'name': 'www.{0}'.format(domain_name),
                 'content': 'hello.{0}'.format(domain_name),
             })
-        self.cf_lib_wrapper.list_dns_records = MagicMock(side_effect=[dns_records_page_1, dns_records_page_2])
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(
+            side_effect=[(dns_records_page_1, {'total_pages': 2}), (dns_records_page_2, {'total_pages': 2})])
 
         bulk_dns.edit_record(
             domain_name, "CNAME", "www", "{{zone}}", "hello.{{zone}}", record_edited_cb=record_edited_cb,
@@ -818,7 +1087,7 @@ class TestBulkDns(unittest.TestCase):
             self.assertEqual('Existing DNS record not found', exception.message)
 
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
-        self.cf_lib_wrapper.list_dns_records = MagicMock(return_value=[])
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=([], {'total_pages': 0}))
 
         bulk_dns.edit_record(
             "{0}.com".format(str(uuid.uuid4())), "TXT", "foo", "bar", "new bar", record_edited_cb=record_edited_cb,
@@ -826,6 +1095,71 @@ class TestBulkDns(unittest.TestCase):
 
         self.assertEqual(1, len(responses))
 
+    def test_edit_record_unchanged(self):
+        domain_name = 'add-purer-happen.host'
+        responses = []
+
+        def record_edited_cb(**kwargs):
+            responses.append(kwargs)
+
+        edited = {'id': 'DNS RECORD ID 345', 'type': 'TXT', 'name': 'foo.{0}'.format(domain_name), 'content': 'new bar'}
+
+        def list_dns_records_with_info(zone_id, page=1, per_page=20, record_type=None, record_name=None,
+                                       content=None):
+            if content in (None, 'new bar'):
+                return [edited], {'total_pages': 1}
+            return [], {'total_pages': 0}
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=list_dns_records_with_info)
+        self.cf_lib_wrapper.update_dns_record = MagicMock()
+
+        # a re-run, the record having been edited already
+        bulk_dns.edit_record(
+            domain_name, "TXT", "foo", "bar", "new bar", record_edited_cb=record_edited_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+        # without the old content, the record found already has the new content
+        bulk_dns.edit_record(
+            domain_name, "TXT", "foo", None, "new bar", record_edited_cb=record_edited_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual([{'succeed': True, 'response': edited, 'unchanged': True, 'retries': 0}] * 2, responses)
+        self.assertFalse(self.cf_lib_wrapper.update_dns_record.called)
+        # both contents are matched against a single filtered listing
+        self.assertEqual(2, self.cf_lib_wrapper.list_dns_records_with_info.call_count)
+
+    def test_edit_record_all_matches(self):
+        domain_name = 'add-purer-happen.host'
+        responses = []
+
+        def record_edited_cb(**kwargs):
+            responses.append(kwargs)
+
+        dns_records = [
+            {'id': 'DNS RECORD ID {0}'.format(i), 'type': 'A', 'name': domain_name, 'content': content}
+            for i, content in enumerate(['111.111.111.111', '222.222.222.222', '111.111.111.111', '111.111.111.111'])]
+
+        def update_dns_records(zone_id, records):
+            for record in records:
+                yield record, {'id': record[0], 'content': record[3]}, None
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=(
+            [dns_record for dns_record in dns_records if dns_record['content'] == '111.111.111.111'],
+            {'total_pages': 1}))
+        self.cf_lib_wrapper.update_dns_records = MagicMock(side_effect=update_dns_records)
+
+        bulk_dns.edit_record(
+            domain_name, "A", None, "111.111.111.111", "333.333.333.333", record_edited_cb=record_edited_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper, all_matches=True)
+
+        self.assertEqual(1, self.cf_lib_wrapper.list_dns_records_with_info.call_count)
+        self.cf_lib_wrapper.update_dns_records.assert_called_once_with('ZONE ID', [
+            ('DNS RECORD ID {0}'.format(i), 'A', domain_name, '333.333.333.333') for i in (0, 2, 3)])
+        self.assertEqual(['DNS RECORD ID 0', 'DNS RECORD ID 2', 'DNS RECORD ID 3'],
+                         [response['response']['id'] for response in responses])
+        self.assertTrue(all(response['succeed'] for response in responses))
+
     def test_edit_record_failed_update_dns_record(self):
         responses = []
 
@@ -838,8 +1172,9 @@ class TestBulkDns(unittest.TestCase):
         zone_name = "{0}.com".format(str(uuid.uuid4()))
 
         self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
-        self.cf_lib_wrapper.list_dns_records = MagicMock(
-            return_value=[{'id': 'DNS RECORD ID', 'type': 'TXT', 'name': 'foo.{0}'.format(zone_name), 'content': 'bar'}])
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=(
+            [{'id': 'DNS RECORD ID', 'type': 'TXT', 'name': 'foo.{0}'.format(zone_name), 'content': 'bar'}],
+            {'total_pages': 1}))
         self.cf_lib_wrapper.update_dns_record = MagicMock(
             side_effect=CloudFlareAPIError(code=-1, message='Any Error Blah'))
 
@@ -888,5 +1223,760 @@ class TestBulkDns(unittest.TestCase):
             self.assertEqual(31, row_number)
         os.remove(csv_file_name)
 
+    def test_cli_list_records_with_workers_keeps_domain_order(self):
+        def list_records_mock(domain_name, record_listed_cb=None, cf_lib_wrapper=None):
+            for i in range(3):
+                record_listed_cb(
+                    succeed=True,
+                    response={
+                        'id': 'DNS RECORD ID {0}'.format(i), 'type': 'A', 'name': domain_name,
+                        'content': '111.111.111.111', 'proxiable': True, 'proxied': False})
+
+        list_records_original = bulk_dns.list_records
+        bulk_dns.list_records = MagicMock(side_effect=list_records_mock)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(
+            ['--list-records', '--workers', '8', '../example-domains.txt'],
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        bulk_dns.list_records = list_records_original
+
+        with open('../example-domains.txt') as f:
+            domain_names = [line.strip() for line in f]
+        match = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue().strip())
+        csv_file_name = match.group(1)
+        with open(csv_file_name, "rb") as csv_file:
+            rows = list(csv.reader(csv_file))[1:]
+        self.assertEqual(
+            [[domain_name, 'DNS RECORD ID {0}'.format(i)] for domain_name in domain_names for i in range(3)],
+            [row[:2] for row in rows])
+        os.remove(csv_file_name)
+
+    def test_cli_invalid_workers(self):
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--list-records', '--workers', 'many', '../example-domains.txt'],
+                     cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+
+        self.assertEqual(bulk_dns.usage_str, my_stdout.getvalue().strip())
+
+    def test_cli_metrics(self):
+        def list_records_mock(domain_name, record_listed_cb=None, cf_lib_wrapper=None):
+            cf_lib_wrapper.metrics.observe_request('GET', 'zones/:id/dns_records', 0.01)
+
+        list_records_original = bulk_dns.list_records
+        bulk_dns.list_records = MagicMock(side_effect=list_records_mock)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+        metrics_file_name = os.path.join(self.journal_dir, 'metrics.json')
+        prometheus_file_name = os.path.join(self.journal_dir, 'cloudflare_dns.prom')
+
+        bulk_dns.cli(
+            ['--list-records', '--zone-lookup', 'per-domain', '--metrics-file', metrics_file_name,
+             '--prometheus-file', prometheus_file_name, '../example-domains.txt'],
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        bulk_dns.list_records = list_records_original
+
+        with open('../example-domains.txt') as f:
+            domain_count = len(f.readlines())
+        summary = json.loads(re.search(r"Metrics: (.*)", my_stdout.getvalue()).group(1))
+        self.assertEqual(domain_count, summary['calls'])
+        with open(metrics_file_name) as f:
+            self.assertEqual(domain_count, json.load(f)['calls'])
+        with open(prometheus_file_name) as f:
+            self.assertIn(
+                'cloudflare_dns_requests_total{{method="GET",endpoint="zones/:id/dns_records",outcome="ok"}} '
+                '{0}'.format(domain_count), f.read())
+        os.remove(re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1))
+
+    def test_cli_invalid_prometheus_interval(self):
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--list-records', '--prometheus-interval', '0', '../example-domains.txt'],
+                     cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+
+        self.assertEqual(bulk_dns.usage_str, my_stdout.getvalue().strip())
+
+    def test_cli_list_records_jsonl_quiet(self):
+        def list_records_mock(domain_name, record_listed_cb=None, cf_lib_wrapper=None):
+            record_listed_cb(
+                succeed=True,
+                response={
+                    'id': 'DNS RECORD ID', 'type': 'A', 'name': domain_name, 'content': '111.111.111.111',
+                    'proxiable': True, 'proxied': False},
+                retries=0)
+
+        list_records_original = bulk_dns.list_records
+        bulk_dns.list_records = MagicMock(side_effect=list_records_mock)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--list-records', '--output-format', 'jsonl', '--quiet', '../example-domains.txt'],
+                     cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        bulk_dns.list_records = list_records_original
+
+        self.assertNotIn('DNS RECORD ID', my_stdout.getvalue())
+        jsonl_file_name = re.search(r"JSONL\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1)
+        with open(jsonl_file_name) as f:
+            results = [json.loads(line) for line in f]
+        os.remove(jsonl_file_name)
+        with open('../example-domains.txt') as f:
+            domain_names = [line.strip() for line in f]
+        self.assertEqual(domain_names, [result['zone name'] for result in results])
+        self.assertEqual(
+            {'zone name': domain_names[0], 'record id': 'DNS RECORD ID', 'type': 'A', 'name': domain_names[0],
+             'content': '111.111.111.111', 'proxiable': True, 'proxied': False, 'retries': 0},
+            results[0])
+        self.assertIn('Listed records from {0} zones.'.format(len(domain_names)), my_stdout.getvalue())
+
+    def test_cli_shards_merged(self):
+        def list_records_mock(domain_name, record_listed_cb=None, cf_lib_wrapper=None):
+            for content in ('111.111.111.111', '222.222.222.222'):
+                record_listed_cb(
+                    succeed=True,
+                    response={
+                        'id': 'DNS RECORD ID', 'type': 'A', 'name': domain_name, 'content': content,
+                        'proxiable': True, 'proxied': False},
+                    retries=0)
+
+        list_records_original = bulk_dns.list_records
+        bulk_dns.list_records = MagicMock(side_effect=list_records_mock)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        for shard in ('1/2', '2/2'):
+            bulk_dns.cli(['--list-records', '--shard', shard, '--quiet', '../example-domains.txt'],
+                         cf_lib_wrapper=self.cf_lib_wrapper)
+        shard_file_names = re.findall(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue())
+        # the merge only reads the reports, on a host without any credentials
+        for name in ('CLOUDFLARE_API_KEY', 'CLOUDFLARE_API_EMAIL', 'CLOUDFLARE_CREDENTIALS_FILE'):
+            self.env.unset(name)
+        bulk_dns.cli(['--merge', '../example-domains.txt'] + shard_file_names)
+
+        sys.stdout = old_stdout
+        bulk_dns.list_records = list_records_original
+
+        merged_file_name = re.findall(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue())[-1]
+        with open(merged_file_name, 'rb') as f:
+            rows = list(csv.reader(f))
+        shard_rows = []
+        for file_name in shard_file_names:
+            with open(file_name, 'rb') as f:
+                shard_rows.append(list(csv.reader(f))[1:])
+        for file_name in shard_file_names + [merged_file_name]:
+            os.remove(file_name)
+
+        self.assertRegexpMatches(shard_file_names[0], r'^cf_list_records_\d{8}_\d{6}_shard-1-of-2\.csv$')
+        self.assertRegexpMatches(merged_file_name, r'^cf_list_records_\d{8}_\d{6}\.csv$')
+        with open('../example-domains.txt') as f:
+            domain_names = [line.strip() for line in f]
+        self.assertEqual(len(domain_names) * 2, len(shard_rows[0]) + len(shard_rows[1]))
+        self.assertTrue(shard_rows[0] and shard_rows[1])
+        self.assertEqual('zone name', rows[0][0])
+        self.assertEqual([name for name in domain_names for _ in range(2)], [row[0] for row in rows[1:]])
+        self.assertEqual(['111.111.111.111', '222.222.222.222'], [row[4] for row in rows[1:3]])
+        self.assertIn('{0} results of 2 files merged.'.format(len(domain_names) * 2), my_stdout.getvalue())
+
+    def test_cli_invalid_shard(self):
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--list-records', '--shard', '3/2', '../example-domains.txt'],
+                     cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        self.assertEqual(bulk_dns.usage_str, my_stdout.getvalue().strip())
+
+    def test_environment_credentials_file(self):
+        def real_func(cf_lib_wrapper=None):
+            self.assertEqual(['first', 'second'], list(cf_lib_wrapper.accounts))
+            self.assertEqual('SECOND KEY', cf_lib_wrapper.accounts['second'].api_key)
+
+        credentials_file_name = os.path.join(self.journal_dir, 'credentials.cfg')
+        with open(credentials_file_name, 'w') as f:
+            f.write('[first]\nemail = first@example.com\ntoken = FIRST KEY\n'
+                    '[second]\nemail = second@example.com\ntoken = SECOND KEY\n')
+        env = EnvironmentVarGuard()
+        env.unset('CLOUDFLARE_API_KEY')
+        env.set('CLOUDFLARE_CREDENTIALS_FILE', credentials_file_name)
+        with env:
+            bulk_dns.configured(real_func)()
+
+    def test_cli_accounts(self):
+        first = CloudFlareLibWrapper('FIRST KEY', 'first@example.com')
+        second = CloudFlareLibWrapper('SECOND KEY', 'second@example.com', session=first.session)
+        pool = AccountPool([('first', first), ('second', second)])
+        with open('../example-domains.txt') as f:
+            domain_names = [line.strip() for line in f]
+        second_domain_names = set(domain_names[::3])
+        second.zone_index = ZoneIndex({'id': 'ZONE ID', 'name': name} for name in second_domain_names)
+        first.zone_index = ZoneIndex(
+            {'id': 'ZONE ID', 'name': name} for name in domain_names if name not in second_domain_names)
+        listed = {}
+
+        def list_records_mock(domain_name, record_listed_cb=None, cf_lib_wrapper=None):
+            listed[domain_name] = cf_lib_wrapper
+
+        list_records_original = bulk_dns.list_records
+        bulk_dns.list_records = MagicMock(side_effect=list_records_mock)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--list-records', '--no-zone-cache', '--zone-lookup', 'per-domain', '--workers', '3',
+                      '../example-domains.txt'], cf_lib_wrapper=pool)
+
+        sys.stdout = old_stdout
+        bulk_dns.list_records = list_records_original
+        os.remove(re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1))
+
+        self.assertEqual(dict((name, second if name in second_domain_names else first) for name in domain_names),
+                         listed)
+        self.assertIsNot(first.rate_limiter, second.rate_limiter)
+        self.assertIs(first.metrics, second.metrics)
+        self.assertIn('first: Zone lookup of', my_stdout.getvalue())
+        self.assertIn('Zones by account: first {0}, second {1}.'.format(
+            len(domain_names) - len(second_domain_names), len(second_domain_names)), my_stdout.getvalue())
+        self.assertEqual(1, my_stdout.getvalue().count('HTTP connections:'))
+
+    def test_cli_domain_list_from_stdin(self):
+        list_records_original = bulk_dns.list_records
+        bulk_dns.list_records = MagicMock()
+        old_stdin = sys.stdin
+        sys.stdin = StringIO('# the zones\ndomain-1.com\nDOMAIN-2.com.\n\ndomain-1.com\nnot a domain\n')
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--list-records', '-'], cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        sys.stdin = old_stdin
+        listed = [call_args[0][0] for call_args in bulk_dns.list_records.call_args_list]
+        bulk_dns.list_records = list_records_original
+        os.remove(re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1))
+
+        self.assertEqual(['domain-1.com', 'domain-2.com'], listed)
+        self.assertIn('Zone lookup of 2 domains', my_stdout.getvalue())
+        self.assertRegexpMatches(
+            my_stdout.getvalue(), r'Skipped 4 lines of \S+: 2 blank or comments, 1 invalid names, 1 duplicates\.')
+        self.assertEqual([], [name for name in os.listdir(tempfile.gettempdir()) if 'cloudflare-dns-stdin' in name])
+
+    def test_cli_list_records_snapshot(self):
+        with open('../example-domains.txt') as f:
+            domain_names = [line.strip() for line in f]
+        zone_infos = dict(
+            (name, {'id': 'ZONE ID {0}'.format(name), 'name': name, 'modified_on': '2017-01-31T12:00:00Z'})
+            for name in domain_names)
+        modified_on = dict((name, '2017-01-30T12:00:00Z') for name in domain_names)
+
+        def dns_records(zone_id):
+            return [{'id': 'DNS RECORD ID', 'type': 'A', 'name': zone_id[8:], 'content': '111.111.111.111',
+                     'proxiable': True, 'proxied': False, 'modified_on': modified_on[zone_id[8:]]}]
+        self.cf_lib_wrapper.get_zone_info = MagicMock(side_effect=lambda name: zone_infos[name])
+        self.cf_lib_wrapper.iter_dns_records = MagicMock(side_effect=lambda zone_id: iter(dns_records(zone_id)))
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=lambda zone_id, page, per_page: (
+            dns_records(zone_id), {'total_count': 1, 'total_pages': 1}))
+        self.cf_lib_wrapper.list_zones_with_info = MagicMock(side_effect=lambda page, per_page: (
+            list(zone_infos.values()), {'total_count': len(zone_infos), 'total_pages': 1}))
+        old_stdout = sys.stdout
+
+        def list_records(*options, **kwargs):
+            sys.stdout = my_stdout = StringIO()
+            bulk_dns.cli(['--list-records', '--no-zone-cache'] + list(options) + ['../example-domains.txt'],
+                         cf_lib_wrapper=kwargs.get('cf_lib_wrapper', self.cf_lib_wrapper))
+            sys.stdout = old_stdout
+            csv_file_name = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1)
+            with open(csv_file_name, 'rb') as f:
+                rows = list(csv.reader(f))[1:]
+            os.remove(csv_file_name)
+            return rows, my_stdout.getvalue()
+
+        listed, printed = list_records('--save-snapshot')
+        self.assertIn('0 zones current, {0} zones listed and saved.'.format(len(domain_names)), printed)
+
+        self.cf_lib_wrapper.get_zone_info.reset_mock()
+        self.cf_lib_wrapper.iter_dns_records.reset_mock()
+        # the snapshot is read without any request, nor any credentials
+        for name in ('CLOUDFLARE_API_KEY', 'CLOUDFLARE_API_EMAIL', 'CLOUDFLARE_CREDENTIALS_FILE'):
+            self.env.unset(name)
+        from_snapshot, printed = list_records('--from-snapshot', cf_lib_wrapper=None)
+        self.assertEqual(listed, from_snapshot)
+        self.assertFalse(self.cf_lib_wrapper.get_zone_info.called or self.cf_lib_wrapper.iter_dns_records.called)
+        self.assertNotIn('Zone lookup', printed)
+
+        modified_on[domain_names[1]] = '2017-02-01T12:00:00Z'
+        refreshed, printed = list_records('--refresh-snapshot')
+        self.assertEqual(listed, refreshed)
+        self.assertEqual(len(domain_names), self.cf_lib_wrapper.list_dns_records_with_info.call_count)
+        self.assertFalse(self.cf_lib_wrapper.iter_dns_records.called)
+        self.assertIn('{0} zones current, 1 zones listed and saved.'.format(len(domain_names) - 1), printed)
+
+    def test_cli_snapshot_without_list_records(self):
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--delete-all-records', '--from-snapshot', '../example-domains.txt'],
+                     cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        self.assertEqual(bulk_dns.usage_str, my_stdout.getvalue().strip())
+
+    def test_cli_invalid_output_format(self):
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--list-records', '--output-format', 'xml', '../example-domains.txt'],
+                     cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+
+        self.assertEqual(bulk_dns.usage_str, my_stdout.getvalue().strip())
+
+    def test_add_new_domains_async(self):
+        domain_names = ['domain-{0}.com'.format(i) for i in range(10)]
+        responses = []
+
+        def create_zone(domain_name):
+            if domain_name == 'domain-3.com':
+                raise CloudFlareAPIError(code=-1, message='already exists')
+            if domain_name == 'domain-5.com':
+                raise CloudFlareAPIError(code=971, message='Please wait and consider throttling your request speed')
+            return {'id': 'ZONE ID', 'name': domain_name}
+
+        def domain_added_cb(**kwargs):
+            responses.append((kwargs['succeed'], kwargs['response']['name']))
+
+        self.cf_lib_wrapper.create_zone = MagicMock(side_effect=create_zone)
+        async_cf_lib_wrapper = ThreadPoolCloudFlareLibWrapper(
+            'THE API KEY', 'THE API EMAIL', max_in_flight=4, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        bulk_dns.add_new_domains_async(
+            domain_names, domain_added_cb=domain_added_cb, async_cf_lib_wrapper=async_cf_lib_wrapper, chunk_size=3)
+        async_cf_lib_wrapper.close()
+
+        self.assertEqual(
+            [(domain_name not in ('domain-3.com', 'domain-5.com'), domain_name) for domain_name in domain_names],
+            responses)
+
+    def test_delete_all_records_async(self):
+        domain_names = ['domain-{0}.com'.format(i) for i in range(5)]
+        responses = []
+
+        def get_zone_info(domain_name):
+            if domain_name == 'domain-2.com':
+                return None
+            return {'id': domain_name}
+
+        def list_dns_records_with_info(zone_id, page=1, per_page=20, **filters):
+            records = [{'id': '{0} {1}'.format(zone_id, i)} for i in range(25)]
+            return records[(page - 1) * per_page:page * per_page], {'total_pages': 3}
+
+        def record_deleted_cb_factory(domain_name):
+            def record_deleted_cb(**kwargs):
+                if kwargs['succeed']:
+                    responses.append(kwargs['response']['id'])
+                else:
+                    responses.append(kwargs['exception'].message)
+            return record_deleted_cb
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(side_effect=get_zone_info)
+        self.cf_lib_wrapper.page_size = 10
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=list_dns_records_with_info)
+        def delete_dns_record(zone_id, record_id):
+            if record_id == 'domain-3.com 7':
+                raise CloudFlareAPIError(code=81044, message='Record does not exist.')
+            return {'id': record_id}
+
+        def batch_dns_records(zone_id, deletes=None):
+            # the batch of domain-3.com fails as a whole, its records being deleted one by one
+            if zone_id == 'domain-3.com':
+                raise CloudFlareAPIError(code=81044, message='Record does not exist.')
+            return {'deletes': deletes}
+
+        self.cf_lib_wrapper.delete_dns_record = MagicMock(side_effect=delete_dns_record)
+        self.cf_lib_wrapper.batch_dns_records = MagicMock(side_effect=batch_dns_records)
+        async_cf_lib_wrapper = ThreadPoolCloudFlareLibWrapper(
+            'THE API KEY', 'THE API EMAIL', max_in_flight=8, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        bulk_dns.delete_all_records_async(
+            domain_names, record_deleted_cb_factory=record_deleted_cb_factory,
+            async_cf_lib_wrapper=async_cf_lib_wrapper, chunk_size=2)
+        async_cf_lib_wrapper.close()
+
+        expected = []
+        for domain_name in domain_names:
+            if domain_name == 'domain-2.com':
+                expected.append('zone_info is None')
+            else:
+                expected.extend('{0} {1}'.format(domain_name, i) for i in range(25))
+        expected[expected.index('domain-3.com 7')] = 'Record does not exist.'
+        self.assertEqual(expected, responses)
+        self.assertEqual(4, self.cf_lib_wrapper.batch_dns_records.call_count)
+        self.assertEqual(25, self.cf_lib_wrapper.delete_dns_record.call_count)
+
+    def test_edit_records_async(self):
+        domain_names = ['domain-{0}.com'.format(i) for i in range(5)]
+        responses = []
+
+        def dns_records(zone_id):
+            if zone_id == 'domain-1.com':
+                return []
+            # domain-4.com already has the new content
+            content = 'hello.domain-4.com' if zone_id == 'domain-4.com' else zone_id
+            return [{'id': 'DNS RECORD ID', 'type': 'CNAME', 'name': 'www.{0}'.format(zone_id), 'content': content}]
+
+        def list_dns_records_with_info(zone_id, page=1, per_page=20, record_type=None, record_name=None,
+                                       content=None):
+            if record_type is None:
+                return dns_records(zone_id), {'total_pages': 1}
+            self.assertEqual(('CNAME', 'www.{0}'.format(zone_id)), (record_type, record_name))
+            # the API filter of domain-2.com misses the record, found by the full listing
+            return [] if zone_id == 'domain-2.com' else dns_records(zone_id), {'total_pages': 1}
+
+        def record_edited_cb_factory(domain_name):
+            def record_edited_cb(succeed, response=None, exception=None, unchanged=False):
+                if succeed:
+                    responses.append((domain_name, response['content'], unchanged))
+                else:
+                    responses.append((domain_name, exception.message, unchanged))
+            return record_edited_cb
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(side_effect=lambda domain_name: {'id': domain_name})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=list_dns_records_with_info)
+        self.cf_lib_wrapper.update_dns_record = MagicMock(
+            side_effect=lambda zone_id, record_id, record_type, record_name, content, proxied=None: {'content': content})
+        async_cf_lib_wrapper = ThreadPoolCloudFlareLibWrapper(
+            'THE API KEY', 'THE API EMAIL', max_in_flight=8, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        bulk_dns.edit_records_async(
+            domain_names, 'CNAME', 'www', '{{zone}}', 'hello.{{zone}}',
+            record_edited_cb_factory=record_edited_cb_factory, async_cf_lib_wrapper=async_cf_lib_wrapper)
+        async_cf_lib_wrapper.close()
+
+        self.assertEqual([
+            ('domain-0.com', 'hello.domain-0.com', False),
+            ('domain-1.com', 'Existing DNS record not found', False),
+            ('domain-2.com', 'hello.domain-2.com', False),
+            ('domain-3.com', 'hello.domain-3.com', False),
+            ('domain-4.com', 'hello.domain-4.com', True),
+        ], responses)
+        self.assertEqual(['domain-1.com', 'domain-2.com'], sorted(
+            args[0] for args, kwargs in self.cf_lib_wrapper.list_dns_records_with_info.call_args_list
+            if kwargs.get('record_type') is None))
+        self.assertEqual(3, self.cf_lib_wrapper.update_dns_record.call_count)
+
+    def test_edit_record_found_with_filtered_request(self):
+        domain_name = 'add-purer-happen.host'
+        responses = []
+
+        def record_edited_cb(**kwargs):
+            self.assertTrue(kwargs['succeed'])
+            responses.append(kwargs['response'])
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=(
+            [{'id': 'DNS RECORD ID 345', 'type': 'TXT', 'name': 'foo.{0}'.format(domain_name), 'content': 'bar'}],
+            {'total_pages': 1}))
+        self.cf_lib_wrapper.update_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID 345'})
+
+        bulk_dns.edit_record(
+            domain_name, "TXT", "foo", "bar", "new bar", record_edited_cb=record_edited_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual(1, len(responses))
+        self.cf_lib_wrapper.list_dns_records_with_info.assert_called_once_with(
+            'ZONE ID', page=1, per_page=100, record_type='TXT', record_name='foo.{0}'.format(domain_name),
+            content=None)
+        self.cf_lib_wrapper.update_dns_record.assert_called_once_with(
+            'ZONE ID', 'DNS RECORD ID 345', 'TXT', 'foo.{0}'.format(domain_name), 'new bar')
+
+    def test_edit_record_falls_back_to_full_listing(self):
+        domain_name = 'add-purer-happen.host'
+        responses = []
+
+        def list_dns_records_with_info(zone_id, page=1, per_page=20, record_type=None, record_name=None,
+                                       content=None):
+            if record_type is not None:
+                return [], {'total_pages': 0}
+            return [{'id': 'DNS RECORD ID 345', 'type': 'TXT', 'name': 'foo.{0}'.format(domain_name),
+                     'content': 'bar'}], {'total_pages': 1}
+
+        def record_edited_cb(**kwargs):
+            self.assertTrue(kwargs['succeed'])
+            responses.append(kwargs['response'])
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=list_dns_records_with_info)
+        self.cf_lib_wrapper.update_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID 345'})
+
+        bulk_dns.edit_record(
+            domain_name, "TXT", "foo", "bar", "new bar", record_edited_cb=record_edited_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual(1, len(responses))
+        self.assertEqual(2, self.cf_lib_wrapper.list_dns_records_with_info.call_count)
+    def test_cli_export_zone_files(self):
+        directory = os.path.join(tempfile.mkdtemp(), 'zones')
+        with open('../example-domains.txt') as f:
+            domain_names = [line.strip() for line in f]
+
+        def export_zone_file(zone_id, file_name):
+            if zone_id == domain_names[2]:
+                raise CloudFlareAPIError(1003, 'Invalid or missing zone id.')
+            return 100
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(side_effect=lambda domain_name: {'id': domain_name})
+        self.cf_lib_wrapper.export_zone_file = MagicMock(side_effect=export_zone_file)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+
+        bulk_dns.cli(['--export-zone-files', directory, '../example-domains.txt'], cf_lib_wrapper=self.cf_lib_wrapper)
+
+        sys.stdout = old_stdout
+        self.assertTrue(os.path.isdir(directory))
+        shutil.rmtree(os.path.dirname(directory))
+
+        match = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue().strip())
+        csv_file_name = match.group(1)
+        with open(csv_file_name, "rb") as csv_file:
+            rows = list(csv.reader(csv_file))
+        os.remove(csv_file_name)
+        self.assertEqual(['zone name', 'status', 'file', 'size', 'retries'], rows[0])
+        self.assertEqual(domain_names, [row[0] for row in rows[1:]])
+        for row in rows[1:]:
+            if row[0] == domain_names[2]:
+                self.assertEqual('failed: Invalid or missing zone id.', row[1])
+            else:
+                self.assertEqual(['exported', os.path.join(directory, row[0] + '.zone'), '100'], row[1:4])
+
+    def test_import_zone_file_missing(self):
+        responses = []
+
+        def zone_file_imported_cb(**kwargs):
+            self.assertFalse(kwargs['succeed'])
+            responses.append(kwargs['exception'].message)
+
+        self.cf_lib_wrapper.import_zone_file = MagicMock()
+
+        bulk_dns.import_zone_file(
+            'add-purer-happen.host', tempfile.gettempdir(), zone_file_imported_cb=zone_file_imported_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual(['Zone file not found'], responses)
+        self.assertEqual(0, self.cf_lib_wrapper.import_zone_file.call_count)
+
+    def test_cli_resume(self):
+        with open('../example-domains.txt') as f:
+            domain_names = [line.strip() for line in f]
+        edited = []
+        interrupted = []
+
+        def edit_record_mock(domain_name, record_type, record_name, old_record_content, new_record_content,
+                             record_edited_cb=None, cf_lib_wrapper=None):
+            if domain_name == domain_names[10] and not interrupted:
+                interrupted.append(domain_name)
+                raise KeyboardInterrupt()
+            edited.append(domain_name)
+            record_edited_cb(succeed=True, response={'id': 'DNS RECORD ID'})
+
+        edit_record_original = bulk_dns.edit_record
+        bulk_dns.edit_record = MagicMock(side_effect=edit_record_mock)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                bulk_dns.cli(
+                    ['--edit-records', '--type', 'TXT', '--new-content', 'bar', '../example-domains.txt'],
+                    cf_lib_wrapper=self.cf_lib_wrapper)
+            self.assertEqual(domain_names[:10], edited)
+            del edited[:]
+            run_id = re.search(r"--resume\s+(\S+)", my_stdout.getvalue()).group(1)
+            self.assertTrue(os.path.isfile(journal_path(run_id)))
+            for csv_file_name in re.findall(r"cf_dns_edit_records_\S+\.csv", my_stdout.getvalue()):
+                os.remove(csv_file_name)
+
+            bulk_dns.cli(
+                ['--edit-records', '--type', 'TXT', '--new-content', 'bar', '--resume', run_id,
+                 '../example-domains.txt'],
+                cf_lib_wrapper=self.cf_lib_wrapper)
+        finally:
+            sys.stdout = old_stdout
+            bulk_dns.edit_record = edit_record_original
+
+        match = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue().strip())
+        os.remove(match.group(1))
+        self.assertIn('10 zones done are skipped, 0 failed and 1 in flight', my_stdout.getvalue())
+        self.assertEqual(domain_names[10:], edited)
+        self.assertFalse(os.path.exists(journal_path(run_id)))
+
+    def test_sync_zone(self):
+        domain_name = 'add-purer-happen.host'
+        dns_records = [
+            {'id': 'ID 1', 'type': 'A', 'name': domain_name, 'content': '93.184.216.34'},
+            {'id': 'ID 2', 'type': 'TXT', 'name': 'foo.' + domain_name, 'content': 'old bar'},
+            {'id': 'ID 3', 'type': 'MX', 'name': domain_name, 'content': 'mail.' + domain_name},
+        ]
+        responses = []
+
+        def record_synced_cb(**kwargs):
+            self.assertTrue(kwargs['succeed'])
+            responses.append((kwargs['response']['action'], kwargs['response'].get('id')))
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=(dns_records, {'total_pages': 1}))
+        self.cf_lib_wrapper.delete_dns_record = MagicMock(return_value={'id': 'ID 3'})
+        self.cf_lib_wrapper.update_dns_record = MagicMock(return_value={'id': 'ID 2'})
+        self.cf_lib_wrapper.create_dns_record = MagicMock(return_value={'id': 'ID 4'})
+
+        bulk_dns.sync_zone(
+            domain_name, [('A', '@', '93.184.216.34'), ('TXT', 'foo', 'bar'), ('CNAME', 'www', '{{zone}}')],
+            record_synced_cb=record_synced_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual(
+            [('delete', 'ID 3'), ('update', 'ID 2'), ('create', 'ID 4'), ('summary', None)],
+            responses)
+        self.cf_lib_wrapper.delete_dns_record.assert_called_once_with('ZONE ID', 'ID 3')
+        self.cf_lib_wrapper.update_dns_record.assert_called_once_with(
+            'ZONE ID', 'ID 2', 'TXT', 'foo.' + domain_name, 'bar')
+        self.cf_lib_wrapper.create_dns_record.assert_called_once_with(
+            'ZONE ID', 'CNAME', 'www.' + domain_name, domain_name)
+
+    def test_cli_sync_plan(self):
+        temp_dir = tempfile.mkdtemp()
+        desired_state_file_name = os.path.join(temp_dir, 'desired.csv')
+        with open(desired_state_file_name, 'w') as f:
+            f.write('type,name,content\nA,@,93.184.216.34\nTXT,foo,bar\n')
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(side_effect=lambda domain_name: {'id': domain_name})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=lambda zone_id, **kwargs: (
+            [{'id': 'ID 1', 'type': 'A', 'name': zone_id, 'content': '93.184.216.34'},
+             {'id': 'ID 2', 'type': 'MX', 'name': zone_id, 'content': 'mail.' + zone_id}], {'total_pages': 1}))
+        self.cf_lib_wrapper.batch_dns_records = MagicMock()
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+        try:
+            bulk_dns.cli(
+                ['--sync', desired_state_file_name, '--plan', '../example-domains.txt'],
+                cf_lib_wrapper=self.cf_lib_wrapper)
+        finally:
+            sys.stdout = old_stdout
+            shutil.rmtree(temp_dir)
+
+        with open('../example-domains.txt') as f:
+            domain_count = len([line for line in f])
+        self.assertIn(
+            'Planned {0} zones: {0} to create, 0 to update, {0} to delete, {0} unchanged, {1} API calls.'.format(
+                domain_count, 3 * domain_count), my_stdout.getvalue())
+        self.assertEqual(0, self.cf_lib_wrapper.batch_dns_records.call_count)
+        csv_file_name = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1)
+        with open(csv_file_name, "rb") as csv_file:
+            rows = list(csv.reader(csv_file))
+        os.remove(csv_file_name)
+        self.assertEqual(2 * domain_count + 1, len(rows))
+        self.assertEqual(['delete', 'planned', 'ID 2'], rows[1][1:4])
+        self.assertEqual(['create', 'planned', ''], rows[2][1:4])
+
+    def test_apply_job(self):
+        domain_name = 'add-purer-happen.host'
+        dns_records = [
+            {'id': 'ID 1', 'type': 'A', 'name': domain_name, 'content': '93.184.216.34'},
+            {'id': 'ID 2', 'type': 'TXT', 'name': 'foo.' + domain_name, 'content': 'old bar'},
+            {'id': 'ID 3', 'type': 'MX', 'name': domain_name, 'content': 'mail.' + domain_name},
+        ]
+        responses = []
+
+        def job_applied_cb(**kwargs):
+            self.assertTrue(kwargs['succeed'])
+            responses.append((kwargs['response']['action'], kwargs['response']['id'], kwargs.get('unchanged', False)))
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value={'id': 'ZONE ID'})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(return_value=(dns_records, {'total_pages': 1}))
+        self.cf_lib_wrapper.delete_dns_record = MagicMock(return_value={'id': 'ID 3'})
+        self.cf_lib_wrapper.update_dns_record = MagicMock(return_value={'id': 'ID 2'})
+        self.cf_lib_wrapper.create_dns_record = MagicMock(return_value={'id': 'ID 4'})
+
+        bulk_dns.apply_job(
+            domain_name, [
+                JobOperation('add', 'A', '', '93.184.216.34'),
+                JobOperation('add', 'CNAME', 'www', '{{zone}}'),
+                JobOperation('edit', 'TXT', 'foo', 'old bar', 'bar'),
+                JobOperation('delete', 'MX', content='mail.{{zone}}'),
+            ], job_applied_cb=job_applied_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual(
+            [('add', 'ID 1', True), ('delete', 'ID 3', False), ('edit', 'ID 2', False), ('add', 'ID 4', False)],
+            responses)
+        self.cf_lib_wrapper.get_zone_info.assert_called_once_with(domain_name)
+        self.assertEqual(1, self.cf_lib_wrapper.list_dns_records_with_info.call_count)
+        self.cf_lib_wrapper.delete_dns_record.assert_called_once_with('ZONE ID', 'ID 3')
+        self.cf_lib_wrapper.update_dns_record.assert_called_once_with(
+            'ZONE ID', 'ID 2', 'TXT', 'foo.' + domain_name, 'bar')
+        self.cf_lib_wrapper.create_dns_record.assert_called_once_with(
+            'ZONE ID', 'CNAME', 'www.' + domain_name, domain_name)
+
+    def test_cli_job(self):
+        temp_dir = tempfile.mkdtemp()
+        job_file_name = os.path.join(temp_dir, 'job.csv')
+        with open(job_file_name, 'w') as f:
+            f.write('action,type,name,content,new_content\nadd,A,@,93.184.216.34,\nedit,TXT,missing,old,new\n'
+                    'delete,MX,,,\n')
+
+        self.cf_lib_wrapper.get_zone_info = MagicMock(side_effect=lambda domain_name: {'id': domain_name})
+        self.cf_lib_wrapper.list_dns_records_with_info = MagicMock(side_effect=lambda zone_id, **kwargs: (
+            [{'id': 'ID 1', 'type': 'A', 'name': zone_id, 'content': '93.184.216.34'},
+             {'id': 'ID 2', 'type': 'MX', 'name': zone_id, 'content': 'mail.' + zone_id}], {'total_pages': 1}))
+        self.cf_lib_wrapper.delete_dns_record = MagicMock(return_value={'id': 'ID 2'})
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+        try:
+            bulk_dns.cli(['--job', job_file_name, '../example-domains.txt'], cf_lib_wrapper=self.cf_lib_wrapper)
+        finally:
+            sys.stdout = old_stdout
+            shutil.rmtree(temp_dir)
+
+        with open('../example-domains.txt') as f:
+            domain_count = len([line for line in f])
+        self.assertIn(
+            'Applied the job to {0} zones: 0 added, 0 edited, {0} deleted, {0} unchanged, {0} failed.'.format(
+                domain_count), my_stdout.getvalue())
+        self.assertEqual(domain_count, self.cf_lib_wrapper.list_dns_records_with_info.call_count)
+        csv_file_name = re.search(r"CSV\s+file\s+(\S+)\s+generated", my_stdout.getvalue()).group(1)
+        with open(csv_file_name, "rb") as csv_file:
+            rows = list(csv.reader(csv_file))
+        os.remove(csv_file_name)
+        self.assertEqual(3 * domain_count + 1, len(rows))
+        self.assertEqual(['add', 'unchanged', 'ID 1'], rows[1][1:4])
+        self.assertEqual(['edit', 'failed: Existing DNS record not found', ''], rows[2][1:4])
+        self.assertEqual(['delete', 'deleted', 'ID 2'], rows[3][1:4])
+
+    def test_cli_job_invalid(self):
+        temp_dir = tempfile.mkdtemp()
+        job_file_name = os.path.join(temp_dir, 'job.csv')
+        with open(job_file_name, 'w') as f:
+            f.write('action,type\nrename,A\n')
+        self.cf_lib_wrapper.get_zone_info = MagicMock(return_value=None)
+        old_stdout = sys.stdout
+        sys.stdout = my_stdout = StringIO()
+        try:
+            bulk_dns.cli_job('../example-domains.txt', self.cf_lib_wrapper, job_file_name)
+        finally:
+            sys.stdout = old_stdout
+            shutil.rmtree(temp_dir)
+        self.assertIn('Invalid job action "rename"', my_stdout.getvalue())
+        self.assertFalse(self.cf_lib_wrapper.get_zone_info.called)
+
+
 if __name__ == '__main__':
     unittest.main()
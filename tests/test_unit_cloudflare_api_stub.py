@@ -0,0 +1,189 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from CloudFlare.exceptions import CloudFlareAPIError
+
+from benchmarks.cloudflare_api_stub import CloudFlareAPIStub, seed_zones
+from cloudflare_dns import CloudFlareLibWrapper, bulk_dns
+from cloudflare_dns.retry import RetryPolicy
+from cloudflare_dns.snapshot import RecordSnapshot
+
+
+class TestCloudFlareAPIStub(unittest.TestCase):
+    """Running CloudFlareLibWrapper against the local stand-in of the API"""
+    def setUp(self):
+        self.stub = CloudFlareAPIStub()
+        self.cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL', base_url=self.stub.start())
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_zones(self):
+        zone_info = self.cf_lib_wrapper.create_zone('add-purer-happen.host')
+
+        self.assertEqual(zone_info['id'], self.cf_lib_wrapper.get_zone_info('add-purer-happen.host')['id'])
+        self.assertIsNone(self.cf_lib_wrapper.get_zone_info('analyze-dry.win'))
+        with self.assertRaises(CloudFlareAPIError) as cm:
+            self.cf_lib_wrapper.create_zone('add-purer-happen.host')
+        self.assertIn('already exists', cm.exception.message)
+
+    def test_dns_records_paginated(self):
+        seed_zones(self.stub, 1, records_per_zone=45)
+        zone_id = self.cf_lib_wrapper.get_zone_info('zone-0.example')['id']
+        self.cf_lib_wrapper.page_size = 20
+
+        self.assertEqual(45, len(list(self.cf_lib_wrapper.iter_dns_records(zone_id))))
+        self.assertEqual(3, self.stub.requests['GET zones/:id/dns_records'])
+        self.assertEqual(1, len(self.cf_lib_wrapper.find_dns_records(
+            zone_id, 'TXT', 'record-3.zone-0.example', content='content 3')))
+
+    def test_dns_records_written(self):
+        zone_id = self.cf_lib_wrapper.create_zone('example.com')['id']
+
+        dns_record = self.cf_lib_wrapper.create_dns_record(zone_id, 'A', 'example.com', '93.184.216.34')
+        self.assertTrue(dns_record['proxied'])
+        dns_record = self.cf_lib_wrapper.update_dns_record(zone_id, dns_record['id'], 'A', 'example.com', '10.0.0.1')
+        self.assertFalse(dns_record['proxiable'])
+        results = list(self.cf_lib_wrapper.create_dns_records(
+            zone_id, [('TXT', 'foo.example.com', 'bar {0}'.format(i)) for i in range(3)]))
+        self.assertEqual(1, self.stub.requests['POST zones/:id/dns_records/batch'])
+        self.assertEqual([None] * 3, [exception for _, _, exception in results])
+
+        record_ids = [dns_record['id'] for dns_record in self.cf_lib_wrapper.iter_dns_records(zone_id)]
+        self.assertEqual(4, len(list(self.cf_lib_wrapper.delete_dns_records(zone_id, record_ids))))
+        self.assertEqual([], list(self.cf_lib_wrapper.iter_dns_records(zone_id)))
+
+    def test_proxied_records_of_mixed_types(self):
+        zone_id = self.cf_lib_wrapper.create_zone('example.com')['id']
+        self.cf_lib_wrapper.proxied = True
+
+        results = list(self.cf_lib_wrapper.create_dns_records(zone_id, [
+            ('A', 'example.com', '93.184.216.34'), ('TXT', 'foo.example.com', 'bar'),
+            ('MX', 'example.com', 'mail.example.com')]))
+
+        self.assertEqual([None] * 3, [exception for _, _, exception in results])
+        self.assertEqual([True, False, False], [dns_record['proxied'] for _, dns_record, _ in results])
+        self.assertEqual(1, self.stub.requests['POST zones/:id/dns_records/batch'])
+        txt_record = results[1][1]
+        dns_record = self.cf_lib_wrapper.update_dns_record(
+            zone_id, txt_record['id'], 'TXT', 'foo.example.com', 'baz')
+        self.assertEqual('baz', dns_record['content'])
+
+    def test_snapshot_refresh_requests(self):
+        zone_names = seed_zones(self.stub, 20, records_per_zone=30)
+        self.cf_lib_wrapper.page_size = 10
+        temp_dir = tempfile.mkdtemp()
+        snapshot = RecordSnapshot(path=os.path.join(temp_dir, 'snapshot.sqlite'))
+        listed = []
+
+        def list_zones(refresh):
+            del listed[:]
+            self.stub.requests.clear()
+            for zone_name in zone_names:
+                bulk_dns.list_records(
+                    zone_name, record_listed_cb=lambda **kwargs: listed.append(kwargs['response']),
+                    cf_lib_wrapper=self.cf_lib_wrapper, snapshot=snapshot, refresh=refresh)
+            return self.stub.requests.get('GET zones/:id/dns_records', 0)
+
+        try:
+            self.assertEqual(60, list_zones(False))
+            saved = list(listed)
+            # one probe of 5 records per unchanged zone, instead of the 3 pages of its listing
+            self.assertEqual(20, list_zones(True))
+            self.assertEqual(saved, listed)
+            self.assertEqual(20, snapshot.current_count)
+
+            # a record added and a probed record edited: the two zones are listed again
+            self.cf_lib_wrapper.create_dns_record(
+                self.stub.zone_ids_by_name[zone_names[1]], 'TXT', 'new.' + zone_names[1], 'new')
+            zone_id = self.stub.zone_ids_by_name[zone_names[2]]
+            dns_record = self.cf_lib_wrapper.list_dns_records(zone_id, per_page=5)[0]
+            self.cf_lib_wrapper.update_dns_record(zone_id, dns_record['id'], 'TXT', dns_record['name'], 'edited')
+            self.assertEqual(20 + 2 * 3 + 1, list_zones(True))
+            self.assertEqual(20 * 30 + 1, len(listed))
+            self.assertIn('edited', [dns_record['content'] for dns_record in listed])
+        finally:
+            snapshot.close()
+            shutil.rmtree(temp_dir)
+
+    def test_zone_files(self):
+        seed_zones(self.stub, 1, records_per_zone=3)
+        temp_dir = tempfile.mkdtemp()
+        file_name = os.path.join(temp_dir, 'zone-0.example.zone')
+        zone_id = self.cf_lib_wrapper.get_zone_info('zone-0.example')['id']
+        try:
+            self.cf_lib_wrapper.export_zone_file(zone_id, file_name)
+            for dns_record in list(self.cf_lib_wrapper.iter_dns_records(zone_id)):
+                self.cf_lib_wrapper.delete_dns_record(zone_id, dns_record['id'])
+
+            result = self.cf_lib_wrapper.import_zone_file(zone_id, file_name)
+        finally:
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual({'recs_added': 3, 'total_records_parsed': 3}, result)
+        self.assertEqual(
+            [('record-{0}.zone-0.example'.format(i), 'content {0}'.format(i)) for i in range(3)],
+            [(dns_record['name'], dns_record['content'])
+             for dns_record in self.cf_lib_wrapper.iter_dns_records(zone_id)])
+
+    def test_rate_limited_request_retried_after_delay(self):
+        delays = []
+        self.stub.rate_limit = 1
+        self.stub.rate_limit_window = 1.0
+        self.cf_lib_wrapper.retry_policy = RetryPolicy(sleep=delays.append)
+        self.cf_lib_wrapper.create_zone('example.com')
+
+        with self.assertRaises(CloudFlareAPIError) as cm:
+            self.cf_lib_wrapper.export_zone_file('ZONE ID', os.path.join(tempfile.gettempdir(), 'stub.zone'))
+
+        self.assertEqual(971, int(cm.exception))
+        self.assertEqual(5, len(delays))
+        self.assertTrue(all(delay >= 1.0 for delay in delays))
+        self.assertEqual(6, self.stub.rate_limited)
+
+    def test_rate_limited_library_request(self):
+        self.stub.rate_limit = 1
+        self.stub.rate_limit_window = 5.0
+        self.cf_lib_wrapper.list_zones()
+
+        with self.assertRaises(CloudFlareAPIError) as cm:
+            self.cf_lib_wrapper.list_zones()
+
+        self.assertEqual(971, int(cm.exception))
+        self.assertEqual(429, cm.exception.status_code)
+        self.assertTrue(cm.exception.retry_after >= 1.0)
+
+    def test_connections_reused(self):
+        seed_zones(self.stub, 3)
+        for zone_name in ('zone-0.example', 'zone-1.example', 'zone-2.example'):
+            list(self.cf_lib_wrapper.iter_dns_records(self.cf_lib_wrapper.get_zone_info(zone_name)['id']))
+
+        self.assertEqual({'requests': 6, 'connections': 1, 'reused': 5}, self.cf_lib_wrapper.session.stats())
+
+    def test_injected_errors(self):
+        self.stub.error_rate = 1.0
+
+        with self.assertRaises(CloudFlareAPIError) as cm:
+            self.cf_lib_wrapper.list_zones()
+
+        self.assertEqual(500, int(cm.exception))
+
+    def test_server_error_retried_whatever_its_code(self):
+        delays = []
+        self.stub.error_rate = 1.0
+        self.stub.injected_error = (502, 10013, 'Bad gateway')
+        self.cf_lib_wrapper.retry_policy = RetryPolicy(sleep=delays.append)
+
+        with self.assertRaises(CloudFlareAPIError) as cm:
+            self.cf_lib_wrapper.list_zones()
+
+        self.assertEqual((10013, 502), (int(cm.exception), cm.exception.status_code))
+        self.assertEqual(5, len(delays))
+        self.assertEqual(6, self.stub.errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
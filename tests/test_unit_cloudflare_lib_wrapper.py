@@ -0,0 +1,277 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+from CloudFlare.exceptions import CloudFlareAPIError
+
+from cloudflare_dns import CloudFlareLibWrapper, DNS_RECORDS_MAX_PER_PAGE
+from cloudflare_dns.proxiable import is_proxiable
+
+
+class TestCloudFlareLibWrapperUnit(unittest.TestCase):
+    def setUp(self):
+        self.cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL')
+        self.cf_lib_wrapper.cf = MagicMock()
+        self.cf_lib_wrapper.cf_raw = MagicMock()
+
+    def mock_dns_records(self, record_count):
+        dns_records = [{'id': 'DNS RECORD ID {0}'.format(i)} for i in range(record_count)]
+
+        def dns_records_get(zone_id, params=None):
+            page, per_page = params['page'], params['per_page']
+            return {
+                'result': dns_records[(page - 1) * per_page:page * per_page],
+                'result_info': {
+                    'page': page, 'per_page': per_page, 'total_count': record_count,
+                    'total_pages': (record_count + per_page - 1) // per_page}}
+
+        self.cf_lib_wrapper.cf_raw.zones.dns_records.get = MagicMock(side_effect=dns_records_get)
+        return dns_records
+
+    def test_iter_dns_records_uses_largest_page_by_default(self):
+        dns_records = self.mock_dns_records(1000)
+
+        self.assertEqual(dns_records, list(self.cf_lib_wrapper.iter_dns_records('ZONE ID')))
+        self.cf_lib_wrapper.cf_raw.zones.dns_records.get.assert_called_once_with(
+            'ZONE ID', params={'page': 1, 'per_page': DNS_RECORDS_MAX_PER_PAGE})
+
+    def test_iter_dns_records_stops_at_total_pages(self):
+        dns_records = self.mock_dns_records(40)
+        self.cf_lib_wrapper.page_size = 20
+
+        self.assertEqual(dns_records, list(self.cf_lib_wrapper.iter_dns_records('ZONE ID')))
+        self.assertEqual(2, self.cf_lib_wrapper.cf_raw.zones.dns_records.get.call_count)
+
+    def test_iter_dns_records_empty_zone(self):
+        self.mock_dns_records(0)
+
+        self.assertEqual([], list(self.cf_lib_wrapper.iter_dns_records('ZONE ID')))
+        self.assertEqual(1, self.cf_lib_wrapper.cf_raw.zones.dns_records.get.call_count)
+
+    def test_iter_dns_records_is_lazy(self):
+        self.mock_dns_records(100)
+
+        dns_records = self.cf_lib_wrapper.iter_dns_records('ZONE ID', per_page=10)
+        self.assertEqual('DNS RECORD ID 0', next(dns_records)['id'])
+        self.assertEqual(1, self.cf_lib_wrapper.cf_raw.zones.dns_records.get.call_count)
+
+    def test_is_proxiable(self):
+        self.assertTrue(is_proxiable('A', 'example.com', '93.184.216.34'))
+        self.assertFalse(is_proxiable('A', 'example.com', '192.168.1.10'))
+        self.assertFalse(is_proxiable('A', 'example.com', '127.0.0.1'))
+        self.assertFalse(is_proxiable('A', 'example.com', 'not an address'))
+        self.assertTrue(is_proxiable('AAAA', 'example.com', '2606:2800:220:1:248:1893:25c8:1946'))
+        self.assertFalse(is_proxiable('AAAA', 'example.com', 'fd00::1'))
+        self.assertFalse(is_proxiable('AAAA', 'example.com', '::1'))
+        self.assertTrue(is_proxiable('CNAME', 'www.example.com', 'example.com'))
+        self.assertFalse(is_proxiable('CNAME', 'www.example.com', 'localhost'))
+        self.assertFalse(is_proxiable('A', '*.example.com', '93.184.216.34'))
+        self.assertFalse(is_proxiable('TXT', 'example.com', 'v=spf1 -all'))
+        self.assertFalse(is_proxiable('MX', 'example.com', 'mail.example.com'))
+
+    def test_create_dns_record_proxiable_in_single_request(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.post = MagicMock(
+            return_value={'id': 'DNS RECORD ID', 'proxiable': True, 'proxied': True})
+
+        self.cf_lib_wrapper.create_dns_record('ZONE ID', 'A', 'example.com', '93.184.216.34')
+
+        self.cf_lib_wrapper.cf.zones.dns_records.post.assert_called_once_with('ZONE ID', data={
+            'name': 'example.com', 'type': 'A', 'content': '93.184.216.34', 'zone_id': 'ZONE ID', 'proxied': True})
+        self.assertEqual(0, self.cf_lib_wrapper.cf.zones.dns_records.put.call_count)
+
+    def test_create_dns_record_not_proxiable_in_single_request(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.post = MagicMock(
+            return_value={'id': 'DNS RECORD ID', 'proxiable': False, 'proxied': False})
+
+        self.cf_lib_wrapper.create_dns_record('ZONE ID', 'TXT', 'foo.example.com', 'bar')
+
+        self.cf_lib_wrapper.cf.zones.dns_records.post.assert_called_once_with('ZONE ID', data={
+            'name': 'foo.example.com', 'type': 'TXT', 'content': 'bar', 'zone_id': 'ZONE ID'})
+        self.assertEqual(0, self.cf_lib_wrapper.cf.zones.dns_records.put.call_count)
+
+    def test_create_dns_record_falls_back_when_proxied_rejected(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.post = MagicMock(side_effect=[
+            CloudFlareAPIError(9004, 'This record type cannot be proxied.'),
+            {'id': 'DNS RECORD ID', 'proxiable': False, 'proxied': False}])
+
+        dns_record = self.cf_lib_wrapper.create_dns_record('ZONE ID', 'CNAME', 'www.example.com', 'example.com')
+
+        self.assertEqual('DNS RECORD ID', dns_record['id'])
+        self.assertEqual(2, self.cf_lib_wrapper.cf.zones.dns_records.post.call_count)
+
+    def test_update_dns_record_second_write_when_api_reports_proxiable(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.put = MagicMock(side_effect=[
+            {'id': 'DNS RECORD ID', 'proxiable': True, 'proxied': False},
+            {'id': 'DNS RECORD ID', 'proxiable': True, 'proxied': True}])
+
+        dns_record = self.cf_lib_wrapper.update_dns_record('ZONE ID', 'DNS RECORD ID', 'A', '*.example.com', '93.184.216.34')
+
+        self.assertTrue(dns_record['proxied'])
+        self.assertEqual(2, self.cf_lib_wrapper.cf.zones.dns_records.put.call_count)
+
+    def test_update_dns_record_not_proxied(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.put = MagicMock(
+            return_value={'id': 'DNS RECORD ID', 'proxiable': True, 'proxied': False})
+        self.cf_lib_wrapper.proxied = False
+
+        self.cf_lib_wrapper.update_dns_record('ZONE ID', 'DNS RECORD ID', 'A', 'example.com', '93.184.216.34')
+
+        self.cf_lib_wrapper.cf.zones.dns_records.put.assert_called_once_with('ZONE ID', 'DNS RECORD ID', data={
+            'name': 'example.com', 'type': 'A', 'content': '93.184.216.34', 'proxied': False})
+
+    def test_delete_dns_records_in_batches(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.post = MagicMock(
+            side_effect=lambda zone_id, batch, data=None: {'deletes': data['deletes']})
+        record_ids = ['DNS RECORD ID {0}'.format(i) for i in range(450)]
+
+        results = list(self.cf_lib_wrapper.delete_dns_records('ZONE ID', record_ids))
+
+        self.assertEqual(record_ids, [dns_record['id'] for _, dns_record, _ in results])
+        self.assertEqual(3, self.cf_lib_wrapper.cf.zones.dns_records.post.call_count)
+        self.cf_lib_wrapper.cf.zones.dns_records.post.assert_called_with(
+            'ZONE ID', 'batch', data={'deletes': [{'id': record_id} for record_id in record_ids[400:]]})
+        self.assertEqual(0, self.cf_lib_wrapper.cf.zones.dns_records.delete.call_count)
+
+    def test_delete_dns_records_without_batch_endpoint(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.post = MagicMock(
+            side_effect=CloudFlareAPIError(7000, 'No route for that URI'))
+        self.cf_lib_wrapper.cf.zones.dns_records.delete = MagicMock(
+            side_effect=lambda zone_id, record_id: {'id': record_id})
+
+        results = list(self.cf_lib_wrapper.delete_dns_records('ZONE ID', ['DNS RECORD ID 1', 'DNS RECORD ID 2']))
+        results.extend(self.cf_lib_wrapper.delete_dns_records('ZONE ID', ['DNS RECORD ID 3', 'DNS RECORD ID 4']))
+
+        self.assertEqual(4, len(results))
+        self.assertIsNone(self.cf_lib_wrapper.batch_size)
+        self.assertEqual(1, self.cf_lib_wrapper.cf.zones.dns_records.post.call_count)
+        self.assertEqual(4, self.cf_lib_wrapper.cf.zones.dns_records.delete.call_count)
+
+    def test_create_dns_records_in_batch_with_proxied(self):
+        self.cf_lib_wrapper.batch_dns_records = MagicMock(side_effect=[
+            {'posts': [
+                {'id': 'DNS RECORD ID 1', 'proxiable': True, 'proxied': True},
+                {'id': 'DNS RECORD ID 2', 'proxiable': True, 'proxied': False}]},
+            {'patches': [{'id': 'DNS RECORD ID 2', 'proxiable': True, 'proxied': True}]}])
+
+        results = list(self.cf_lib_wrapper.create_dns_records('ZONE ID', [
+            ('A', 'example.com', '93.184.216.34'), ('A', '*.example.com', '93.184.216.34')]))
+
+        self.assertEqual([True, True], [dns_record['proxied'] for _, dns_record, _ in results])
+        self.cf_lib_wrapper.batch_dns_records.assert_any_call('ZONE ID', posts=[
+            {'name': 'example.com', 'type': 'A', 'content': '93.184.216.34', 'proxied': True},
+            {'name': '*.example.com', 'type': 'A', 'content': '93.184.216.34'}])
+        self.cf_lib_wrapper.batch_dns_records.assert_called_with(
+            'ZONE ID', patches=[{'id': 'DNS RECORD ID 2', 'proxied': True}])
+
+    def test_create_dns_records_proxy_patch_failed(self):
+        self.cf_lib_wrapper.batch_dns_records = MagicMock(side_effect=[
+            {'posts': [
+                {'id': 'DNS RECORD ID 1', 'proxiable': True, 'proxied': False},
+                {'id': 'DNS RECORD ID 2', 'proxiable': True, 'proxied': False}]},
+            CloudFlareAPIError(10000, 'Batch failed')])
+        self.cf_lib_wrapper.cf.zones.dns_records.patch = MagicMock(side_effect=[
+            {'id': 'DNS RECORD ID 1', 'proxiable': True, 'proxied': True},
+            CloudFlareAPIError(1004, 'DNS Validation Error')])
+        self.cf_lib_wrapper.create_dns_record = MagicMock()
+        self.cf_lib_wrapper.retry_policy = None
+
+        results = list(self.cf_lib_wrapper.create_dns_records('ZONE ID', [
+            ('A', '*.example.com', '93.184.216.34'), ('A', '*.example.org', '93.184.216.34')]))
+
+        # the records created by the first batch are kept, never created again
+        self.assertEqual(
+            [('DNS RECORD ID 1', True, None), ('DNS RECORD ID 2', False, None)],
+            [(dns_record['id'], dns_record['proxied'], exception) for _, dns_record, exception in results])
+        self.assertEqual(0, self.cf_lib_wrapper.create_dns_record.call_count)
+        self.cf_lib_wrapper.cf.zones.dns_records.patch.assert_any_call(
+            'ZONE ID', 'DNS RECORD ID 1', data={'proxied': True})
+        self.assertEqual(200, self.cf_lib_wrapper.batch_size)
+
+    def test_batch_kept_after_invalid_zone(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.post = MagicMock(
+            side_effect=CloudFlareAPIError(7003, 'Could not route to /zones/BAD ZONE/dns_records/batch'))
+        self.cf_lib_wrapper.cf.zones.dns_records.delete = MagicMock(
+            side_effect=CloudFlareAPIError(7003, 'Could not route to /zones/BAD ZONE/dns_records'))
+        self.cf_lib_wrapper.retry_policy = None
+
+        results = list(self.cf_lib_wrapper.delete_dns_records('BAD ZONE', ['DNS RECORD ID 1', 'DNS RECORD ID 2']))
+
+        self.assertEqual([7003, 7003], [int(exception) for _, _, exception in results])
+        self.assertEqual(200, self.cf_lib_wrapper.batch_size)
+
+    def test_update_dns_records_single_record_not_batched(self):
+        self.cf_lib_wrapper.batch_dns_records = MagicMock()
+        self.cf_lib_wrapper.update_dns_record = MagicMock(return_value={'id': 'DNS RECORD ID'})
+
+        results = list(self.cf_lib_wrapper.update_dns_records(
+            'ZONE ID', [('DNS RECORD ID', 'TXT', 'foo.example.com', 'bar')]))
+
+        self.assertEqual([(('DNS RECORD ID', 'TXT', 'foo.example.com', 'bar'), {'id': 'DNS RECORD ID'}, None)], results)
+        self.assertEqual(0, self.cf_lib_wrapper.batch_dns_records.call_count)
+
+    def mock_response(self, status_code=200, content='', json=None, headers=None):
+        response = MagicMock(status_code=status_code, reason='', headers=headers or {})
+        response.iter_content = MagicMock(return_value=iter([content[:10], content[10:]]))
+        response.json = MagicMock(return_value=json)
+        return response
+
+    def test_export_zone_file(self):
+        directory = tempfile.mkdtemp()
+        file_name = os.path.join(directory, 'example.com.zone')
+        content = 'example.com.\t1\tIN\tA\t93.184.216.34\n'
+        try:
+            with patch.object(self.cf_lib_wrapper.session, 'request',
+                              return_value=self.mock_response(content=content)) as get:
+                self.assertEqual(len(content), self.cf_lib_wrapper.export_zone_file('ZONE ID', file_name))
+            with open(file_name) as f:
+                self.assertEqual(content, f.read())
+            self.assertEqual(['example.com.zone'], os.listdir(directory))
+            self.assertEqual(
+                ('GET', 'https://api.cloudflare.com/client/v4/zones/ZONE ID/dns_records/export'), get.call_args[0])
+            self.assertTrue(get.call_args[1]['stream'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_export_zone_file_failed(self):
+        directory = tempfile.mkdtemp()
+        file_name = os.path.join(directory, 'example.com.zone')
+        response = self.mock_response(
+            status_code=429, json={'errors': [{'code': 10000, 'message': 'Rate limited'}]},
+            headers={'Retry-After': '7'})
+        try:
+            with patch.object(self.cf_lib_wrapper.session, 'request', return_value=response):
+                with self.assertRaises(CloudFlareAPIError) as cm:
+                    self.cf_lib_wrapper.export_zone_file('ZONE ID', file_name)
+            self.assertEqual(10000, int(cm.exception))
+            self.assertEqual(7.0, cm.exception.retry_after)
+            self.assertEqual([], os.listdir(directory))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_import_zone_file(self):
+        directory = tempfile.mkdtemp()
+        file_name = os.path.join(directory, 'example.com.zone')
+        with open(file_name, 'w') as f:
+            f.write('example.com.\t1\tIN\tA\t93.184.216.34\n')
+        response = self.mock_response(json={'result': {'recs_added': 1, 'total_records_parsed': 1}})
+        self.cf_lib_wrapper.proxied = True
+        try:
+            with patch.object(self.cf_lib_wrapper.session, 'request', return_value=response) as post:
+                result = self.cf_lib_wrapper.import_zone_file('ZONE ID', file_name)
+            self.assertEqual(1, result['recs_added'])
+            self.assertEqual(
+                ('POST', 'https://api.cloudflare.com/client/v4/zones/ZONE ID/dns_records/import'), post.call_args[0])
+            self.assertEqual({'proxied': 'true'}, post.call_args[1]['data'])
+            self.assertEqual('example.com.zone', post.call_args[1]['files']['file'][0])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
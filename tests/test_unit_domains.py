@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from cStringIO import StringIO
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from cloudflare_dns.domains import DomainList, normalize_domain_name, read_domain_names, spool_stdin
+
+DOMAIN_LIST = """# the domains of the shop
+shop.com
+Shop.COM.
+
+b\xc3\xbccher.de  # an internationalized domain name
+-invalid.com
+not a domain
+localhost
+www.shop.com
+"""
+
+
+class TestDomains(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_normalize_domain_name(self):
+        self.assertEqual('shop.com', normalize_domain_name('  Shop.COM.\n'))
+        self.assertEqual('xn--bcher-kva.de', normalize_domain_name('b\xc3\xbccher.de'))
+        self.assertEqual('', normalize_domain_name('\n'))
+        self.assertEqual('', normalize_domain_name('# shop.com\n'))
+        for line in ('-shop.com', 'shop-.com', 'shop..com', 'shop', 'shop_1.com', '{0}.com'.format('a' * 64),
+                     '\xff.com'):
+            self.assertIsNone(normalize_domain_name(line), line)
+
+    def test_domain_list(self):
+        file_name = os.path.join(self.temp_dir, 'domains.txt')
+        with open(file_name, 'w') as f:
+            f.write(DOMAIN_LIST)
+        with DomainList(file_name) as domain_names:
+            self.assertEqual(['shop.com', 'xn--bcher-kva.de', 'www.shop.com'], list(domain_names))
+        self.assertEqual((2, 3, 1, 6), (
+            domain_names.blank, domain_names.invalid, domain_names.duplicates, domain_names.skipped))
+        self.assertEqual(
+            "Skipped 6 lines of {0}: 2 blank or comments, 3 invalid names, 1 duplicates.".format(file_name),
+            domain_names.summary())
+
+    def test_gzip(self):
+        file_name = os.path.join(self.temp_dir, 'domains.txt.gz')
+        f = gzip.open(file_name, 'wb')
+        try:
+            f.write(''.join('domain-{0}.com\n'.format(i % 1000) for i in range(5000)))
+        finally:
+            f.close()
+        domain_names = read_domain_names(file_name)
+        self.assertEqual(['domain-{0}.com'.format(i) for i in range(1000)], domain_names)
+
+    def test_stdin(self):
+        old_stdin = sys.stdin
+        sys.stdin = StringIO(DOMAIN_LIST)
+        try:
+            self.assertEqual(['shop.com', 'xn--bcher-kva.de', 'www.shop.com'], read_domain_names('-'))
+        finally:
+            sys.stdin = old_stdin
+
+    def test_spool_stdin(self):
+        file_name = spool_stdin(StringIO(DOMAIN_LIST))
+        try:
+            self.assertEqual(['shop.com', 'xn--bcher-kva.de', 'www.shop.com'], read_domain_names(file_name))
+        finally:
+            os.remove(file_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
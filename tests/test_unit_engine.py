@@ -0,0 +1,134 @@
+from __future__ import print_function
+import random
+import threading
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+
+from cloudflare_dns.engine import run_zone_tasks, run_zone_tasks_on_pool
+
+
+class TestEngine(unittest.TestCase):
+    def test_run_zone_tasks_single_worker_reports_inline(self):
+        zone_names = ['zone-{0}.com'.format(i) for i in range(10)]
+        reported = []
+
+        def zone_task(zone_name, cb):
+            cb(succeed=True, response={'name': zone_name})
+
+        def cb_factory(zone_name):
+            def cb(**kwargs):
+                self.assertEqual(zone_name, kwargs['response']['name'])
+                reported.append(zone_name)
+            return cb
+
+        processed = list(run_zone_tasks(zone_names, zone_task, cb_factory))
+
+        self.assertEqual(zone_names, processed)
+        self.assertEqual(zone_names, reported)
+
+    def test_run_zone_tasks_many_workers_report_in_input_order(self):
+        zone_names = ['zone-{0}.com'.format(i) for i in range(50)]
+        reported = []
+        reporting_threads = set()
+
+        def zone_task(zone_name, cb):
+            time.sleep(random.random() / 100)
+            cb(succeed=True, response={'id': 1, 'name': zone_name})
+            cb(succeed=True, response={'id': 2, 'name': zone_name})
+
+        def cb_factory(zone_name):
+            def cb(**kwargs):
+                reporting_threads.add(threading.current_thread())
+                reported.append((zone_name, kwargs['response']['id']))
+            return cb
+
+        processed = list(run_zone_tasks(zone_names, zone_task, cb_factory, workers=8))
+
+        self.assertEqual(zone_names, processed)
+        self.assertEqual([(zone_name, i) for zone_name in zone_names for i in (1, 2)], reported)
+        self.assertEqual({threading.current_thread()}, reporting_threads)
+
+    def test_run_zone_tasks_many_workers_run_concurrently(self):
+        zone_names = ['zone-{0}.com'.format(i) for i in range(20)]
+
+        def zone_task(zone_name, cb):
+            time.sleep(0.05)
+            cb(succeed=True)
+
+        started = time.time()
+        list(run_zone_tasks(zone_names, zone_task, lambda zone_name: lambda **kwargs: None, workers=20))
+
+        self.assertTrue(time.time() - started < 0.5)
+
+    def test_run_zone_tasks_zones_in_flight_bounded(self):
+        read = []
+        lock = threading.Lock()
+        ahead = []
+
+        def zone_names():
+            for i in range(100):
+                read.append(i)
+                yield 'zone-{0}.com'.format(i)
+
+        def zone_task(zone_name, cb):
+            cb(succeed=True)
+
+        def cb_factory(zone_name):
+            def cb(**kwargs):
+                with lock:
+                    ahead.append(len(read) - 1 - int(zone_name[5:-4]))
+            return cb
+
+        processed = list(run_zone_tasks(zone_names(), zone_task, cb_factory, workers=4))
+
+        self.assertEqual(100, len(processed))
+        # at most 8 zones (2 per worker) are read past the zone reported
+        self.assertTrue(max(ahead) <= 8)
+
+    def test_run_zone_tasks_exception_raised_after_reported_results(self):
+        zone_names = ['zone-{0}.com'.format(i) for i in range(5)]
+        reported = []
+
+        def zone_task(zone_name, cb):
+            cb(succeed=True)
+            if zone_name == 'zone-2.com':
+                raise ValueError('BLAH')
+
+        def cb_factory(zone_name):
+            return lambda **kwargs: reported.append(zone_name)
+
+        processed = []
+        try:
+            for zone_name in run_zone_tasks(zone_names, zone_task, cb_factory, workers=3):
+                processed.append(zone_name)
+            self.fail()
+        except ValueError as e:
+            self.assertEqual('BLAH', e.message)
+        self.assertEqual(['zone-0.com', 'zone-1.com'], processed)
+        self.assertEqual(['zone-0.com', 'zone-1.com', 'zone-2.com'], reported)
+
+
+    def test_run_zone_tasks_on_pool_leaves_the_pool_open(self):
+        zone_names = ['zone-{0}.com'.format(i) for i in range(20)]
+        reported = []
+
+        def zone_task(zone_name, cb):
+            time.sleep(random.random() / 100)
+            cb(succeed=True, response={'name': zone_name})
+
+        def cb_factory(zone_name):
+            return lambda **kwargs: reported.append(kwargs['response']['name'])
+
+        pool = ThreadPool(4)
+        processed = list(run_zone_tasks_on_pool(zone_names, zone_task, cb_factory, pool, 3))
+
+        self.assertEqual(zone_names, processed)
+        self.assertEqual(zone_names, reported)
+        self.assertEqual('zone-0.com', pool.apply_async(lambda: 'zone-0.com').get())
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
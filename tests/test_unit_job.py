@@ -0,0 +1,144 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudflare_dns import job
+from cloudflare_dns.job import JobOperation, plan_zone_job, read_job
+
+
+class TestJob(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def dns_record(self, record_id, record_type, record_name, content):
+        return {'id': record_id, 'type': record_type, 'name': record_name, 'content': content}
+
+    def job_file(self, name, text):
+        file_name = os.path.join(self.temp_dir, name)
+        with open(file_name, 'w') as f:
+            f.write(text)
+        return file_name
+
+    def test_read_csv_job(self):
+        file_name = self.job_file('job.csv', (
+            'action,type,name,content,new_content,zone,all_matches\n'
+            '# the web server\n'
+            'add,a,@,93.184.216.34,,,\n'
+            '\n'
+            'edit,TXT,foo,"bar, baz",qux,Example.com.,yes\n'
+            'delete,MX,,,,,\n'))
+
+        operations = read_job(file_name)
+
+        self.assertEqual(['add', 'edit', 'delete'], [operation.action for operation in operations])
+        self.assertEqual(('A', '@', '93.184.216.34', None), (
+            operations[0].record_type, operations[0].record_name, operations[0].content, operations[0].zone))
+        self.assertEqual(('bar, baz', 'qux', 'example.com', True), (
+            operations[1].content, operations[1].new_content, operations[1].zone, operations[1].all_matches))
+        self.assertEqual((None, False), (operations[2].content, operations[2].all_matches))
+
+    def test_read_yaml_job(self):
+        if job.yaml is None:
+            self.skipTest('PyYAML is not installed')
+        file_name = self.job_file('job.yaml', (
+            'operations:\n'
+            '- {action: add, type: CNAME, name: www, content: "{{zone}}"}\n'
+            '- {action: edit, type: A, name: "@", content: 10.0.0.1, new_content: 10.0.0.2, all_matches: true}\n'))
+
+        operations = read_job(file_name)
+
+        self.assertEqual(2, len(operations))
+        self.assertEqual(('CNAME', 'www', '{{zone}}'), (
+            operations[0].record_type, operations[0].record_name, operations[0].content))
+        self.assertTrue(operations[1].all_matches)
+
+    def test_read_job_invalid(self):
+        for text in ('action,type\nrename,A\n', 'action,type,content\nadd,A,\n', 'action,type\nedit,A\n',
+                     'action,content\ndelete,bar\n', 'action,type,ttl\ndelete,A,300\n', 'action,type\nadd,A,1,2\n'):
+            with self.assertRaises(ValueError):
+                read_job(self.job_file('job.csv', text))
+
+    def test_plan_zone_job(self):
+        dns_records = [
+            self.dns_record('ID 1', 'A', 'example.com', '93.184.216.34'),
+            self.dns_record('ID 2', 'A', 'www.example.com', '10.0.0.1'),
+            self.dns_record('ID 3', 'A', 'www.example.com', '10.0.0.1'),
+            self.dns_record('ID 4', 'MX', 'example.com', 'mail.example.com'),
+            self.dns_record('ID 5', 'TXT', 'foo.example.com', 'bar'),
+        ]
+        operations = [
+            JobOperation('add', 'A', '@', '93.184.216.34'),
+            JobOperation('add', 'CNAME', 'blog', '{{zone}}'),
+            JobOperation('edit', 'A', 'www', '10.0.0.1', '10.0.0.2', all_matches=True),
+            JobOperation('edit', 'TXT', 'foo', 'old', 'bar'),
+            JobOperation('edit', 'TXT', 'missing', 'old', 'new'),
+            JobOperation('delete', 'MX'),
+            JobOperation('delete', 'CNAME', 'gone'),
+            JobOperation('delete', 'TXT', 'foo', zone='other.com'),
+        ]
+
+        plan = plan_zone_job(dns_records, operations, 'example.com')
+
+        self.assertEqual([('CNAME', 'blog.example.com', 'example.com')], [record for _, record in plan.creates])
+        self.assertEqual(
+            [('ID 2', 'A', 'www.example.com', '10.0.0.2'), ('ID 3', 'A', 'www.example.com', '10.0.0.2')],
+            [record for _, record in plan.updates])
+        self.assertEqual([dns_records[3]], [dns_record for _, dns_record in plan.deletes])
+        self.assertEqual(
+            [(operations[0], dns_records[0]), (operations[3], dns_records[4]), (operations[6], None)],
+            plan.unchanged)
+        self.assertEqual([(operations[4], 'Existing DNS record not found')], plan.failures)
+
+    def test_plan_zone_job_delete_then_add(self):
+        dns_records = [self.dns_record('ID 1', 'A', 'example.com', '1.1.1.1')]
+        operations = [JobOperation('delete', 'A', '@', '1.1.1.1'), JobOperation('add', 'A', '@', '1.1.1.1')]
+
+        plan = plan_zone_job(dns_records, operations, 'example.com')
+
+        self.assertEqual([dns_records[0]], [dns_record for _, dns_record in plan.deletes])
+        self.assertEqual([('A', 'example.com', '1.1.1.1')], [record for _, record in plan.creates])
+        self.assertEqual([], plan.unchanged)
+
+    def test_plan_zone_job_edit_then_add(self):
+        dns_records = [self.dns_record('ID 1', 'A', 'example.com', '1.1.1.1')]
+        operations = [
+            JobOperation('edit', 'A', '@', '1.1.1.1', '2.2.2.2'),
+            JobOperation('add', 'A', '@', '1.1.1.1'),
+            JobOperation('add', 'A', '@', '2.2.2.2'),
+            JobOperation('add', 'A', '@', '1.1.1.1'),
+        ]
+
+        plan = plan_zone_job(dns_records, operations, 'example.com')
+
+        self.assertEqual([('ID 1', 'A', 'example.com', '2.2.2.2')], [record for _, record in plan.updates])
+        self.assertEqual([('A', 'example.com', '1.1.1.1')], [record for _, record in plan.creates])
+        self.assertEqual([(operations[2], dns_records[0]), (operations[3], None)], plan.unchanged)
+
+    def test_plan_zone_job_record_changed_once(self):
+        dns_records = [
+            self.dns_record('ID 1', 'A', 'www.example.com', '10.0.0.1'),
+            self.dns_record('ID 2', 'A', 'www.example.com', '10.0.0.1'),
+        ]
+        operations = [
+            JobOperation('edit', 'A', 'www', '10.0.0.1', '10.0.0.2'),
+            JobOperation('delete', 'A', 'www'),
+        ]
+
+        plan = plan_zone_job(dns_records, operations, 'example.com')
+
+        self.assertEqual([('ID 1', 'A', 'www.example.com', '10.0.0.2')], [record for _, record in plan.updates])
+        self.assertEqual([dns_records[1]], [dns_record for _, dns_record in plan.deletes])
+
+        plan = plan_zone_job(
+            [dict(dns_records[0], proxied=False)], [JobOperation('add', 'A', 'www', '10.0.0.1')], 'example.com',
+            proxied=True)
+        self.assertEqual(1, len(plan.creates))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudflare_dns.engine import run_zone_tasks
+from cloudflare_dns.journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def journal(self, operation='edit-records', **kwargs):
+        return Journal('RUN ID', operation, directory=self.temp_dir, **kwargs)
+
+    def test_resumed_states(self):
+        journal = self.journal()
+        journal.started('zone-1.com')
+        journal.done('zone-1.com')
+        journal.started('zone-2.com')
+        journal.failed('zone-2.com')
+        journal.started('zone-3.com')
+        journal.close()
+
+        journal = self.journal()
+        self.assertTrue(journal.is_done('zone-1.com'))
+        self.assertFalse(journal.is_done('zone-2.com'))
+        self.assertFalse(journal.is_done('zone-3.com'))
+        self.assertEqual((1, 1, 1), journal.summary())
+        journal.close()
+
+        journal = self.journal(operation='delete-all-records')
+        self.assertFalse(journal.is_done('zone-1.com'))
+        journal.close()
+
+    def test_removed_when_complete(self):
+        journal = self.journal()
+        journal.started('zone-1.com')
+        journal.failed('zone-1.com')
+        self.assertFalse(journal.is_complete())
+        journal.close()
+
+        journal = self.journal()
+        journal.started('zone-1.com')
+        self.assertFalse(journal.is_complete())
+        journal.done('zone-1.com')
+        self.assertTrue(journal.is_complete())
+        journal.remove()
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_line_cut_by_crash_ignored(self):
+        with open(os.path.join(self.temp_dir, 'RUN ID.journal'), 'w') as f:
+            f.write('D\tedit-records\tzone-1.com\nD\tedit-records\tzone-2')
+
+        journal = self.journal()
+
+        self.assertTrue(journal.is_done('zone-1.com'))
+        self.assertFalse(journal.is_done('zone-2'))
+        self.assertFalse(journal.is_done('zone-2.com'))
+        journal.close()
+
+    def test_synced_in_batches(self):
+        journal = self.journal(sync_every=10, sync_interval=60)
+        path = os.path.join(self.temp_dir, 'RUN ID.journal')
+
+        for i in range(9):
+            journal.done('zone-{0}.com'.format(i))
+        self.assertEqual(0, os.path.getsize(path))
+        journal.done('zone-9.com')
+        with open(path) as f:
+            self.assertEqual(10, len(f.readlines()))
+        journal.close()
+
+    def test_run_zone_tasks_resumes_from_journal(self):
+        zone_names = ['zone-{0}.com'.format(i) for i in range(10)]
+        processed = []
+        interrupted = []
+
+        def zone_task(zone_name, cb):
+            processed.append(zone_name)
+            cb(succeed=zone_name != 'zone-3.com')
+            if zone_name == 'zone-6.com' and not interrupted:
+                interrupted.append(zone_name)
+                raise KeyboardInterrupt()
+
+        journal = self.journal()
+        try:
+            list(run_zone_tasks(zone_names, zone_task, lambda zone_name: lambda **kwargs: None, journal=journal))
+            self.fail()
+        except KeyboardInterrupt:
+            pass
+        journal.close()
+
+        del processed[:]
+        journal = self.journal()
+        self.assertEqual((5, 1, 1), journal.summary())
+        reported = list(run_zone_tasks(
+            zone_names, zone_task, lambda zone_name: lambda **kwargs: None, workers=4, journal=journal))
+        journal.close()
+
+        self.assertEqual(['zone-3.com'] + zone_names[6:], reported)
+        self.assertEqual(reported, sorted(processed))
+
+
+if __name__ == '__main__':
+    unittest.main()
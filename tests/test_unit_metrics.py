@@ -0,0 +1,149 @@
+from __future__ import print_function
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns.metrics import Metrics, PrometheusTextfileWriter, request_phase
+from cloudflare_dns.retry import RetryPolicy
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = Metrics(clock=self.clock)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_summary(self):
+        self.metrics.observe_request('GET', 'zones', 0.02, bytes_received=100)
+        self.metrics.observe_request('GET', 'zones', 0.2, outcome='971', bytes_sent=0, rate_limited=True)
+        self.metrics.observe_retry()
+        self.metrics.observe_request('POST', 'zones/:id/dns_records/batch', 0.3, bytes_sent=50, bytes_received=70)
+        self.metrics.observe_phase('zone lookup', 0.5)
+        self.metrics.observe_phase('zone lookup', 0.25)
+        self.clock.now += 2
+
+        summary = self.metrics.summary()
+        self.assertEqual(2, summary['elapsed'])
+        self.assertEqual(3, summary['calls'])
+        self.assertEqual(1, summary['errors'])
+        self.assertEqual(1, summary['retries'])
+        self.assertEqual(1, summary['rate_limited'])
+        self.assertEqual(50, summary['bytes_sent'])
+        self.assertEqual(170, summary['bytes_received'])
+        self.assertEqual({'zone lookup': 0.75}, summary['phases'])
+        zones = summary['endpoints'][0]
+        self.assertEqual(('GET', 'zones', 2, 1), (zones['method'], zones['endpoint'], zones['calls'], zones['errors']))
+        self.assertEqual({'ok': 1, '971': 1}, zones['outcomes'])
+        self.assertEqual((0.025, 0.25), (zones['latency']['p50'], zones['latency']['p99']))
+        self.assertEqual('POST', summary['endpoints'][1]['method'])
+
+        file_name = os.path.join(self.temp_dir, 'metrics.json')
+        self.metrics.write_json(file_name)
+        with open(file_name) as f:
+            self.assertEqual(3, json.load(f)['calls'])
+
+    def test_prometheus_text(self):
+        self.metrics.observe_request('GET', 'zones/:id/dns_records', 0.02)
+        self.metrics.observe_request('GET', 'zones/:id/dns_records', 50)
+        self.metrics.observe_phase('listing', 50.02)
+        lines = self.metrics.prometheus_text().splitlines()
+        self.assertIn(
+            'cloudflare_dns_requests_total{method="GET",endpoint="zones/:id/dns_records",outcome="ok"} 2', lines)
+        self.assertIn(
+            'cloudflare_dns_request_duration_seconds_bucket{method="GET",endpoint="zones/:id/dns_records",'
+            'le="0.025"} 1', lines)
+        self.assertIn(
+            'cloudflare_dns_request_duration_seconds_bucket{method="GET",endpoint="zones/:id/dns_records",'
+            'le="30.0"} 1', lines)
+        self.assertIn(
+            'cloudflare_dns_request_duration_seconds_bucket{method="GET",endpoint="zones/:id/dns_records",'
+            'le="+Inf"} 2', lines)
+        self.assertIn('cloudflare_dns_retries_total 0', lines)
+        self.assertIn('cloudflare_dns_phase_seconds_total{phase="listing"} 50.02', lines)
+        self.assertIsNone(self.metrics.summary()['endpoints'][0]['latency']['p99'])
+
+    def test_prometheus_textfile_writer(self):
+        file_name = os.path.join(self.temp_dir, 'cloudflare_dns.prom')
+        writer = PrometheusTextfileWriter(self.metrics, file_name, interval=60).start()
+        with open(file_name) as f:
+            self.assertNotIn('cloudflare_dns_requests_total{', f.read())
+        self.metrics.observe_request('GET', 'zones', 0.02)
+        writer.stop()
+        with open(file_name) as f:
+            self.assertIn('cloudflare_dns_requests_total{method="GET",endpoint="zones",outcome="ok"} 1', f.read())
+        self.assertEqual(['cloudflare_dns.prom'], os.listdir(self.temp_dir))
+
+    def test_request_phase(self):
+        self.assertEqual('zone lookup', request_phase('GET', 'zones'))
+        self.assertEqual('listing', request_phase('GET', 'zones/:id/dns_records'))
+        self.assertEqual('listing', request_phase('GET', 'zones/:id/dns_records/export'))
+        self.assertEqual('mutation', request_phase('POST', 'zones'))
+        self.assertEqual('mutation', request_phase('POST', 'zones/:id/dns_records/batch'))
+
+
+class TestCloudFlareLibWrapperMetrics(unittest.TestCase):
+    def setUp(self):
+        self.cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL')
+        self.cf_lib_wrapper.metrics = Metrics()
+
+    def test_endpoint(self):
+        cf = self.cf_lib_wrapper.cf
+        self.assertEqual('zones', CloudFlareLibWrapper._endpoint(cf.zones.get, ()))
+        self.assertEqual('zones/:id', CloudFlareLibWrapper._endpoint(cf.zones.delete, ('ZONE ID',)))
+        self.assertEqual(
+            'zones/:id/dns_records', CloudFlareLibWrapper._endpoint(cf.zones.dns_records.get, ('ZONE ID',)))
+        self.assertEqual(
+            'zones/:id/dns_records/:id',
+            CloudFlareLibWrapper._endpoint(cf.zones.dns_records.put, ('ZONE ID', 'RECORD ID')))
+        self.assertEqual(
+            'zones/:id/dns_records/batch',
+            CloudFlareLibWrapper._endpoint(cf.zones.dns_records.post, ('ZONE ID', 'batch')))
+
+    def test_requests_recorded(self):
+        batch = {'deletes': [{'id': 'RECORD ID'}]}
+        rate_limited = MagicMock(
+            status_code=429, reason='Too Many Requests', headers={'Retry-After': '0'},
+            content='{"success": false, "errors": [{"code": 971, "message": "Please wait"}]}')
+        rate_limited.json = MagicMock(
+            return_value={'success': False, 'errors': [{'code': 971, 'message': 'Please wait'}]})
+        succeeded = MagicMock(status_code=200, headers={}, content=json.dumps({'success': True, 'result': batch}))
+        succeeded.json = MagicMock(return_value={'success': True, 'result': batch})
+        self.cf_lib_wrapper.session.request = MagicMock(side_effect=[rate_limited, succeeded])
+        self.cf_lib_wrapper.retry_policy = RetryPolicy(sleep=lambda delay: None)
+
+        self.assertEqual(batch, self.cf_lib_wrapper.batch_dns_records('ZONE ID', deletes=[{'id': 'RECORD ID'}]))
+
+        summary = self.cf_lib_wrapper.metrics.summary()
+        self.assertEqual(2, summary['calls'])
+        self.assertEqual(1, summary['errors'])
+        self.assertEqual(1, summary['retries'])
+        self.assertEqual(1, summary['rate_limited'])
+        self.assertEqual(2 * len(json.dumps(batch)), summary['bytes_sent'])
+        self.assertEqual(len(rate_limited.content) + len(succeeded.content), summary['bytes_received'])
+        self.assertEqual(['mutation'], list(summary['phases']))
+        self.assertEqual('zones/:id/dns_records/batch', summary['endpoints'][0]['endpoint'])
+        self.assertEqual({'ok': 1, '971': 1}, summary['endpoints'][0]['outcomes'])
+        self.assertEqual(1, self.cf_lib_wrapper.take_retry_count())
+
+
+if __name__ == '__main__':
+    unittest.main()
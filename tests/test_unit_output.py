@@ -0,0 +1,103 @@
+from __future__ import print_function
+from cStringIO import StringIO
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from cloudflare_dns.output import (
+    OutputWriter, ResultCounter, open_sink, CONSOLE_QUIET, CONSOLE_PROGRESS, OUTPUT_CSV, OUTPUT_JSONL, OUTPUT_SQLITE)
+
+HEADER = ['zone name', 'record id', 'retries']
+
+
+class FailingSink(object):
+    label = 'failing'
+    file_name = 'nowhere'
+
+    def write_rows(self, rows):
+        raise IOError('No space left on device')
+
+    def close(self):
+        pass
+
+
+class TestOutput(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_name = os.path.join(self.temp_dir, 'results')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, output_format, console=None, row_count=2500):
+        stream = StringIO()
+        output = OutputWriter(open_sink(output_format, self.base_name, HEADER), stream=stream, batch_size=1000,
+                              **({'console': console} if console else {}))
+        for i in range(row_count):
+            output.write(['zone.com', 'RECORD ID {0}'.format(i), 0], 'record {0}'.format(i), failed=(i % 2 == 1))
+        output.echo('done')
+        output.close()
+        return output, stream.getvalue()
+
+    def test_csv(self):
+        output, printed = self.write(OUTPUT_CSV)
+        self.assertEqual("CSV file {0}.csv generated.".format(self.base_name), output.generated())
+        with open(self.base_name + '.csv', 'rb') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(HEADER, rows[0])
+        self.assertEqual(['zone.com', 'RECORD ID 2499', '0'], rows[-1])
+        self.assertEqual(2501, len(rows))
+        self.assertEqual(['record {0}'.format(i) for i in range(2500)] + ['done'], printed.splitlines())
+        self.assertEqual((2500, 1250), (output.counter.get('results'), output.counter.get('failed')))
+
+    def test_jsonl(self):
+        self.write(OUTPUT_JSONL, console=CONSOLE_QUIET, row_count=3)
+        with open(self.base_name + '.jsonl') as f:
+            lines = f.read().splitlines()
+        self.assertEqual('{"zone name": "zone.com", "record id": "RECORD ID 0", "retries": 0}', lines[0])
+        self.assertEqual(3, len(lines))
+
+    def test_sqlite(self):
+        output, printed = self.write(OUTPUT_SQLITE, console=CONSOLE_QUIET)
+        self.assertEqual('', printed)
+        connection = sqlite3.connect(self.base_name + '.sqlite')
+        try:
+            self.assertEqual([(2500,)], connection.execute('SELECT COUNT(*) FROM results').fetchall())
+            self.assertEqual([('RECORD ID 7',)], connection.execute(
+                "SELECT record_id FROM results WHERE record_id = 'RECORD ID 7'").fetchall())
+        finally:
+            connection.close()
+
+    def test_progress(self):
+        _, printed = self.write(OUTPUT_CSV, console=CONSOLE_PROGRESS)
+        self.assertTrue(printed.endswith('\r2500 results, 1250 failed, 0 zones\n'))
+        self.assertNotIn('record 1\n', printed)
+
+    def test_sink_error_raised(self):
+        output = OutputWriter(FailingSink(), stream=StringIO())
+        output.write(['zone.com'])
+        with self.assertRaises(IOError):
+            output.close()
+
+    def test_result_counter(self):
+        counter = ResultCounter()
+
+        def count():
+            for _ in range(10000):
+                counter.increment('results')
+
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(40000, counter.get('results'))
+        self.assertEqual(0, counter.get('zones'))
+
+
+if __name__ == '__main__':
+    unittest.main()
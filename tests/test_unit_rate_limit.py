@@ -0,0 +1,101 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns.rate_limit import TokenBucket
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.lock = threading.Lock()
+
+    def time(self):
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2, burst=5, clock=self.clock.time, sleep=self.clock.sleep)
+
+        for _ in range(5):
+            self.assertEqual(0, bucket.try_acquire())
+        self.assertAlmostEqual(0.5, bucket.try_acquire())
+
+        for _ in range(10):
+            bucket.acquire()
+        self.assertAlmostEqual(1005.0, self.clock.now)
+
+    def test_refill_capped_at_burst(self):
+        bucket = TokenBucket(rate=2, burst=5, clock=self.clock.time, sleep=self.clock.sleep)
+        for _ in range(5):
+            bucket.acquire()
+
+        self.clock.sleep(3600)
+        for _ in range(5):
+            self.assertEqual(0, bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire() > 0)
+
+    def test_shared_between_threads(self):
+        bucket = TokenBucket(rate=10, burst=10, clock=self.clock.time, sleep=self.clock.sleep)
+
+        def acquire_many():
+            for _ in range(25):
+                bucket.acquire()
+
+        threads = [threading.Thread(target=acquire_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 100 requests: 10 at once, then 90 at 10 per second
+        self.assertTrue(self.clock.now - 1000.0 >= 9.0 - 1e-6)
+
+    def test_state_file_shared_between_buckets(self):
+        state_file = os.path.join(self.temp_dir, 'rate_limit.json')
+        bucket_1 = TokenBucket(rate=1, burst=4, state_file=state_file, clock=self.clock.time, sleep=self.clock.sleep)
+        bucket_2 = TokenBucket(rate=1, burst=4, state_file=state_file, clock=self.clock.time, sleep=self.clock.sleep)
+
+        self.assertEqual(0, bucket_1.try_acquire())
+        self.assertEqual(0, bucket_2.try_acquire())
+        self.assertEqual(0, bucket_1.try_acquire())
+        self.assertEqual(0, bucket_2.try_acquire())
+        self.assertAlmostEqual(1.0, bucket_1.try_acquire())
+        self.assertAlmostEqual(1.0, bucket_2.try_acquire())
+
+    def test_lib_wrapper_requests_go_through_rate_limiter(self):
+        rate_limiter = TokenBucket(rate=1, burst=100)
+        cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL', rate_limiter=rate_limiter)
+        cf_lib_wrapper.cf = MagicMock()
+        rate_limiter.acquire = MagicMock()
+
+        cf_lib_wrapper.list_zones()
+        cf_lib_wrapper.get_zone_info('add-purer-happen.host')
+        cf_lib_wrapper.delete_dns_record('ZONE ID', 'DNS RECORD ID')
+
+        self.assertEqual(3, rate_limiter.acquire.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+from __future__ import print_function
+import unittest
+
+from benchmarks.record_memory import measure
+from cloudflare_dns.records import DnsRecord, compact_records
+
+
+class TestRecords(unittest.TestCase):
+    def api_record(self, record_id, record_type, zone_name):
+        return {
+            'id': record_id, 'type': record_type, 'name': 'www.' + zone_name, 'content': '93.184.216.34',
+            'proxiable': True, 'proxied': False, 'ttl': 1, 'locked': False, 'zone_id': 'ZONE ID',
+            'zone_name': zone_name, 'created_on': '2024-01-01T00:00:00Z', 'modified_on': '2024-01-01T00:00:00Z',
+            'meta': {'auto_added': False}, 'data': {}}
+
+    def test_from_dict(self):
+        dns_record = DnsRecord.from_dict(self.api_record('ID 1', u'A', u'example.com'))
+
+        self.assertEqual(('ID 1', 'A', 'www.example.com', '93.184.216.34'), (
+            dns_record['id'], dns_record['type'], dns_record['name'], dns_record['content']))
+        self.assertEqual((True, False, 1, None), (
+            dns_record.proxiable, dns_record.get('proxied'), dns_record.ttl, dns_record.priority))
+        self.assertIsNone(dns_record.get('meta'))
+        with self.assertRaises(KeyError):
+            dns_record['meta']
+        self.assertEqual('example.com', dns_record.to_dict()['zone_name'])
+        self.assertEqual(dns_record, DnsRecord.from_dict(self.api_record('ID 1', 'A', 'example.com')))
+        self.assertNotEqual(dns_record, DnsRecord.from_dict(self.api_record('ID 2', 'A', 'example.com')))
+
+    def test_strings_shared(self):
+        first, second = compact_records(
+            [self.api_record('ID 1', u'A', u'example.com'), self.api_record('ID 2', u'A', u'example.com')])
+        self.assertIs(first.type, second.type)
+        self.assertIs(first.zone_name, second.zone_name)
+
+        dns_record = DnsRecord.from_dict(
+            {'id': 'ID 3', 'type': 'MX', 'name': 'example.com', 'content': 'mail.example.com', 'priority': 10},
+            zone_name='example.com')
+        self.assertEqual(('example.com', 10), (dns_record.zone_name, dns_record.priority))
+
+    def test_memory_per_record(self):
+        result = measure(10, 10)
+        self.assertEqual(100, result['records'])
+        self.assertLess(result['compact_bytes_per_record'] * 3, result['full_bytes_per_record'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+from __future__ import print_function
+import unittest
+
+from CloudFlare.exceptions import CloudFlareAPIError
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns import bulk_dns
+from cloudflare_dns.retry import RetryPolicy, is_retryable
+
+
+def api_call(name, **kwargs):
+    mock = MagicMock(**kwargs)
+    mock.__name__ = name
+    return mock
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        self.delays = []
+        self.retry_policy = RetryPolicy(sleep=self.delays.append, random=lambda: 0.5)
+        self.cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL', retry_policy=self.retry_policy)
+        self.cf_lib_wrapper.cf = MagicMock()
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(CloudFlareAPIError(0, 'connection failed.')))
+        self.assertTrue(is_retryable(CloudFlareAPIError(971, 'Please wait and consider throttling your request speed')))
+        self.assertTrue(is_retryable(CloudFlareAPIError(10000, 'Rate limited. Please wait and try again later')))
+        self.assertFalse(is_retryable(CloudFlareAPIError(81057, 'The record already exists.')))
+        self.assertFalse(is_retryable(CloudFlareAPIError(-1, 'other')))
+        self.assertFalse(is_retryable(ValueError('zone_info is None')))
+
+    def test_is_retryable_by_http_status(self):
+        for status_code, retryable in ((429, True), (500, True), (503, True), (400, False), (None, False)):
+            exception = CloudFlareAPIError(10013, 'Origin error')
+            exception.status_code = status_code
+            self.assertEqual(retryable, is_retryable(exception))
+
+    def test_delay_exponential_with_jitter(self):
+        self.assertEqual([0.25, 0.5, 1.0, 2.0], [self.retry_policy.delay(retries) for retries in range(4)])
+        self.assertEqual(30.0, self.retry_policy.delay(20))
+
+    def test_delay_honors_retry_after(self):
+        exception = CloudFlareAPIError(429, 'Too many requests')
+        exception.retry_after = 12
+        self.assertEqual(12.0, self.retry_policy.delay(0, exception))
+
+    def test_budget_per_method(self):
+        exception = CloudFlareAPIError(0, 'connection failed.')
+        self.assertTrue(self.retry_policy.should_retry('GET', 4, exception))
+        self.assertFalse(self.retry_policy.should_retry('GET', 5, exception))
+        self.assertTrue(self.retry_policy.should_retry('post', 1, exception))
+        self.assertFalse(self.retry_policy.should_retry('post', 2, exception))
+        self.assertFalse(RetryPolicy(max_retries=0).should_retry('GET', 0, exception))
+
+    def test_lib_wrapper_retries_transient_errors(self):
+        self.cf_lib_wrapper.cf.zones.dns_records.delete = api_call('delete', side_effect=[
+            CloudFlareAPIError(0, 'connection failed.'), CloudFlareAPIError(971, 'throttled'),
+            {'id': 'DNS RECORD ID'}])
+
+        self.assertEqual({'id': 'DNS RECORD ID'}, self.cf_lib_wrapper.delete_dns_record('ZONE ID', 'DNS RECORD ID'))
+        self.assertEqual([0.25, 0.5], self.delays)
+        self.assertEqual(2, self.cf_lib_wrapper.take_retry_count())
+        self.assertEqual(0, self.cf_lib_wrapper.take_retry_count())
+
+    def test_lib_wrapper_gives_up_after_budget(self):
+        self.cf_lib_wrapper.cf.zones.post = api_call('post', side_effect=CloudFlareAPIError(0, 'connection failed.'))
+
+        self.assertRaises(CloudFlareAPIError, self.cf_lib_wrapper.create_zone, 'add-purer-happen.host')
+        self.assertEqual(3, self.cf_lib_wrapper.cf.zones.post.call_count)
+
+    def test_lib_wrapper_does_not_retry_fatal_errors(self):
+        self.cf_lib_wrapper.cf.zones.post = api_call('post', side_effect=CloudFlareAPIError(1061, 'already exists'))
+
+        self.assertRaises(CloudFlareAPIError, self.cf_lib_wrapper.create_zone, 'add-purer-happen.host')
+        self.assertEqual(1, self.cf_lib_wrapper.cf.zones.post.call_count)
+        self.assertEqual([], self.delays)
+
+    def test_add_new_domain_reports_exhausted_transient_error(self):
+        responses = []
+
+        def domain_added_cb(**kwargs):
+            self.assertFalse(kwargs['succeed'])
+            responses.append((kwargs['response']['name'], kwargs['retries']))
+
+        self.cf_lib_wrapper.cf.zones.post = api_call('post', side_effect=CloudFlareAPIError(0, 'connection failed.'))
+
+        bulk_dns.add_new_domain(
+            'add-purer-happen.host', domain_added_cb=domain_added_cb, cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual([('add-purer-happen.host', 2)], responses)
+
+    def test_add_new_record_reports_retries(self):
+        responses = []
+
+        def record_added_cb(**kwargs):
+            self.assertTrue(kwargs['succeed'])
+            responses.append(kwargs['retries'])
+
+        self.cf_lib_wrapper.cf.zones.get = api_call('get', side_effect=[
+            CloudFlareAPIError(0, 'connection failed.'), [{'id': 'ZONE ID', 'name': 'add-purer-happen.host'}]])
+        self.cf_lib_wrapper.cf.zones.dns_records.post = api_call('post', side_effect=[
+            CloudFlareAPIError(0, 'connection failed.'), {'id': 'DNS RECORD ID', 'proxiable': False}])
+        self.cf_lib_wrapper.find_dns_records = MagicMock(return_value=[])
+
+        bulk_dns.add_new_record(
+            'add-purer-happen.host', 'TXT', 'foo', 'bar', record_added_cb=record_added_cb,
+            cf_lib_wrapper=self.cf_lib_wrapper)
+
+        self.assertEqual([2], responses)
+
+
+if __name__ == '__main__':
+    unittest.main()
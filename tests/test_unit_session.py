@@ -0,0 +1,106 @@
+from __future__ import print_function
+import socket
+import threading
+import unittest
+
+import requests
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from benchmarks.cloudflare_api_stub import CloudFlareAPIStub
+from cloudflare_dns.session import DnsCache, HttpSession
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDnsCache(unittest.TestCase):
+    def test_resolve_cached(self):
+        clock = FakeClock()
+        resolve = MagicMock(return_value=[
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('104.16.132.229', 443)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('104.16.133.229', 443)),
+            (socket.AF_INET, socket.SOCK_STREAM, 17, '', ('104.16.133.229', 443))])
+        dns_cache = DnsCache(ttl=300, clock=clock, resolve=resolve)
+
+        self.assertEqual(['104.16.132.229', '104.16.133.229'], dns_cache.resolve('api.cloudflare.com', 443))
+        clock.now += 299
+        dns_cache.resolve('api.cloudflare.com', 443)
+        self.assertEqual(1, resolve.call_count)
+
+        clock.now += 1
+        dns_cache.resolve('api.cloudflare.com', 443)
+        self.assertEqual(2, resolve.call_count)
+
+        dns_cache.invalidate('api.cloudflare.com', 443)
+        dns_cache.resolve('api.cloudflare.com', 443)
+        self.assertEqual(3, resolve.call_count)
+
+
+class TestHttpSession(unittest.TestCase):
+    def setUp(self):
+        self.stub = CloudFlareAPIStub()
+        self.base_url = self.stub.start()
+        self.resolve = MagicMock(side_effect=socket.getaddrinfo)
+        self.session = HttpSession(pool_size=2, dns_cache=DnsCache(resolve=self.resolve))
+
+    def tearDown(self):
+        self.session.close()
+        self.stub.stop()
+
+    def test_connections_shared_by_threads(self):
+        url = self.base_url.replace('127.0.0.1', 'localhost') + '/zones'
+        errors = []
+
+        def send():
+            for _ in range(10):
+                try:
+                    self.assertEqual(200, self.session.request('GET', url).status_code)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        stats = self.session.stats()
+        self.assertEqual(40, stats['requests'])
+        self.assertTrue(1 <= stats['connections'] <= 2)
+        self.assertEqual(40 - stats['connections'], stats['reused'])
+        self.assertEqual(1, self.resolve.call_count)
+
+    def test_resize(self):
+        self.session.request('GET', self.base_url + '/zones')
+        self.session.resize(8)
+        self.session.request('GET', self.base_url + '/zones')
+
+        self.assertEqual(8, self.session.pool_size)
+        self.assertEqual({'requests': 2, 'connections': 2, 'reused': 0}, self.session.stats())
+
+    def test_read_timeout(self):
+        self.stub.latency = 0.5
+        self.session.read_timeout = 0.05
+
+        with self.assertRaises(requests.Timeout):
+            self.session.request('GET', self.base_url + '/zones')
+
+    def test_connection_failed(self):
+        self.session.dns_cache = DnsCache(resolve=MagicMock(side_effect=socket.gaierror('Name or service not known')))
+        self.session.resize(2)
+
+        with self.assertRaises(requests.ConnectionError):
+            self.session.request('GET', 'http://api.invalid/client/v4/zones')
+
+
+if __name__ == '__main__':
+    unittest.main()
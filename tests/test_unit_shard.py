@@ -0,0 +1,80 @@
+from __future__ import print_function
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudflare_dns.shard import (
+    in_shard, merge_reports, merged_report_prefix, missing_shards, parse_shard, shard_of, shard_suffix)
+
+HEADER = ['zone name', 'record id', 'retries']
+
+
+class TestShard(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_report(self, file_name, rows, header=HEADER):
+        file_name = os.path.join(self.temp_dir, file_name)
+        with open(file_name, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return file_name
+
+    def test_parse_shard(self):
+        self.assertEqual((2, 4), parse_shard('2/4'))
+        self.assertEqual((1, 1), parse_shard('1/1'))
+        for spec in ('0/4', '5/4', '2', '2/4/8', 'a/b', ''):
+            with self.assertRaises(ValueError):
+                parse_shard(spec)
+
+    def test_shards_cover_every_zone_once(self):
+        zone_names = ['domain-{0}.com'.format(i) for i in range(1000)]
+        shards = [list(in_shard(zone_names, (index, 4))) for index in range(1, 5)]
+        self.assertEqual(sorted(zone_names), sorted(sum(shards, [])))
+        for shard in shards:
+            self.assertTrue(200 < len(shard) < 300)
+        self.assertEqual(zone_names, list(in_shard(zone_names, None)))
+
+    def test_shard_of_stable(self):
+        # the shards must never change between versions, hosts nor processes
+        self.assertEqual(shard_of('domain-1.com', 4), shard_of(' Domain-1.COM', 4))
+        self.assertEqual([2, 2, 1, 2], [shard_of('domain-{0}.com'.format(i), 4) for i in range(4)])
+
+    def test_shard_suffix(self):
+        self.assertEqual('_shard-2-of-4', shard_suffix((2, 4)))
+        self.assertEqual('', shard_suffix(None))
+
+    def test_merge_reports(self):
+        zone_names = ['a.com', 'b.com', 'c.com', 'd.com']
+        first = self.write_report('cf_list_records_20170131_120000_shard-1-of-2.csv', [
+            ['b.com', 'B1', '0'], ['b.com', 'B2', '0'], ['d.com', 'D1', '1']])
+        second = self.write_report('cf_list_records_20170131_120001_shard-2-of-2.csv', [
+            ['a.com', 'A1', '0'], ['c.com', 'C1', '0'], ['c.com', 'C2', '0']])
+        merged = os.path.join(self.temp_dir, 'merged.csv')
+
+        self.assertEqual(6, merge_reports(zone_names, [first, second], merged))
+
+        with open(merged, 'rb') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(HEADER, rows[0])
+        self.assertEqual(['A1', 'B1', 'B2', 'C1', 'C2', 'D1'], [row[1] for row in rows[1:]])
+        self.assertEqual([], missing_shards([first, second]))
+        self.assertEqual([(2, 2)], missing_shards([first]))
+        self.assertEqual('cf_list_records', merged_report_prefix([first, second]))
+        self.assertEqual('cf_dns_merged', merged_report_prefix([merged]))
+
+    def test_merge_reports_header_differs(self):
+        first = self.write_report('first.csv', [], header=HEADER)
+        second = self.write_report('second.csv', [], header=['name', 'status'])
+        with self.assertRaises(ValueError):
+            merge_reports(['a.com'], [first, second], os.path.join(self.temp_dir, 'merged.csv'))
+
+
+if __name__ == '__main__':
+    unittest.main()
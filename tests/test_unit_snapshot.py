@@ -0,0 +1,76 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudflare_dns.snapshot import RecordSnapshot
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRecordSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        self.snapshot = RecordSnapshot(
+            path=os.path.join(self.temp_dir, 'snapshots', 'snapshot.sqlite'), max_age=3600, clock=self.clock)
+        self.zone_info = {'id': 'ZONE ID', 'name': 'Domain.com', 'modified_on': '2017-01-31T12:00:00Z'}
+        self.dns_records = [
+            {'id': 'RECORD ID {0}'.format(i), 'type': 'A', 'name': 'domain.com', 'content': '111.111.111.{0}'.format(i),
+             'modified_on': '2017-01-30T12:00:00Z'}
+            for i in (3, 1, 2)]
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_save(self):
+        self.assertIsNone(self.snapshot.get_records('domain.com'))
+        self.assertFalse(self.snapshot.is_current(self.zone_info, self.dns_records, 3))
+
+        self.snapshot.save(self.zone_info, self.dns_records)
+
+        self.assertEqual(self.dns_records, self.snapshot.get_records('DOMAIN.com'))
+        self.snapshot.save(self.zone_info, self.dns_records[1:])
+        self.assertEqual(self.dns_records[1:], self.snapshot.get_records('domain.com'))
+        self.snapshot.save(dict(self.zone_info, name='empty.com'), [])
+        self.assertEqual([], self.snapshot.get_records('empty.com'))
+        self.assertEqual((0, 3), (self.snapshot.current_count, self.snapshot.saved_count))
+
+    def test_is_current(self):
+        self.snapshot.save(self.zone_info, self.dns_records)
+
+        self.assertTrue(self.snapshot.is_current(self.zone_info, self.dns_records, 3))
+        # the first page of a larger zone
+        self.assertTrue(self.snapshot.is_current(self.zone_info, self.dns_records[:2], 3))
+        edited = [dict(self.dns_records[0], content='111.111.111.4', modified_on='2017-02-01T12:00:00Z')]
+        self.assertFalse(self.snapshot.is_current(self.zone_info, edited + self.dns_records[1:], 3))
+        added = [dict(self.dns_records[0], id='RECORD ID 4')]
+        self.assertFalse(self.snapshot.is_current(self.zone_info, added + self.dns_records[1:], 3))
+        self.assertFalse(self.snapshot.is_current(self.zone_info, self.dns_records[1:], 2))
+        self.assertFalse(self.snapshot.is_current(self.zone_info, self.dns_records[:2], 4))
+        self.assertFalse(self.snapshot.is_current(dict(self.zone_info, id='NEW ZONE ID'), self.dns_records, 3))
+        self.clock.now += 3601
+        self.assertFalse(self.snapshot.is_current(self.zone_info, self.dns_records, 3))
+        self.assertEqual(2, self.snapshot.current_count)
+
+    def test_persistent(self):
+        self.snapshot.save(self.zone_info, self.dns_records)
+        self.snapshot.close()
+        snapshot = RecordSnapshot(path=self.snapshot.path, clock=self.clock)
+        try:
+            self.assertEqual(self.dns_records, snapshot.get_records('domain.com'))
+            self.assertTrue(snapshot.is_current(self.zone_info, self.dns_records, 3))
+        finally:
+            snapshot.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
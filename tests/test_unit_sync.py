@@ -0,0 +1,68 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudflare_dns.sync import plan_zone_sync, read_desired_state, zone_record_name
+
+
+class TestSync(unittest.TestCase):
+    def dns_record(self, record_id, record_type, record_name, content):
+        return {'id': record_id, 'type': record_type, 'name': record_name, 'content': content}
+
+    def test_read_desired_state(self):
+        temp_dir = tempfile.mkdtemp()
+        file_name = os.path.join(temp_dir, 'desired.csv')
+        with open(file_name, 'w') as f:
+            f.write('type,name,content\n# the web server\na,@,93.184.216.34\n\nTXT,foo,"bar, baz"\n')
+        try:
+            self.assertEqual(
+                [('A', '@', '93.184.216.34'), ('TXT', 'foo', 'bar, baz')], read_desired_state(file_name))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_zone_record_name(self):
+        self.assertEqual('example.com', zone_record_name('', 'example.com'))
+        self.assertEqual('example.com', zone_record_name('@', 'example.com'))
+        self.assertEqual('www.example.com', zone_record_name('www', 'example.com'))
+        self.assertEqual('www.example.com', zone_record_name('www.{{zone}}', 'example.com'))
+        self.assertEqual('www.Example.com', zone_record_name('www.Example.com', 'example.com'))
+
+    def test_plan_zone_sync(self):
+        dns_records = [
+            self.dns_record('ID 1', 'A', 'example.com', '93.184.216.34'),
+            self.dns_record('ID 2', 'A', 'www.example.com', '93.184.216.35'),
+            self.dns_record('ID 3', 'MX', 'example.com', 'mail.example.com'),
+            self.dns_record('ID 4', 'TXT', 'Foo.example.com', 'bar'),
+            self.dns_record('ID 5', 'TXT', 'foo.example.com', 'bar'),
+        ]
+        desired_records = [
+            ('A', '@', '93.184.216.34'),
+            ('A', 'www', '93.184.216.36'),
+            ('TXT', 'foo', 'bar'),
+            ('CNAME', 'blog', '{{zone}}'),
+        ]
+
+        plan = plan_zone_sync(dns_records, desired_records, 'example.com')
+
+        self.assertEqual(2, plan.unchanged)
+        self.assertEqual([(dns_records[1], ('A', 'www.example.com', '93.184.216.36'))], plan.updates)
+        self.assertEqual([dns_records[2], dns_records[4]], plan.deletes)
+        self.assertEqual([('CNAME', 'blog.example.com', 'example.com')], plan.creates)
+        self.assertEqual('1 to create, 1 to update, 2 to delete, 2 unchanged', str(plan))
+        self.assertEqual(4, plan.api_calls(5000, batch_size=200))
+        self.assertEqual(5, plan.api_calls(5000))
+        self.assertEqual(7, plan.api_calls(2))
+
+    def test_plan_zone_sync_in_desired_state(self):
+        plan = plan_zone_sync(
+            [self.dns_record('ID 1', 'A', 'example.com', '93.184.216.34')], [('A', '', '93.184.216.34')],
+            'example.com')
+
+        self.assertEqual(([], [], [], 1), (plan.creates, plan.updates, plan.deletes, plan.unchanged))
+        self.assertEqual(1, plan.api_calls(5000, batch_size=200))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns.zone_cache import ZoneCache
+
+
+class TestZoneCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.zone_cache = ZoneCache(os.path.join(self.temp_dir, 'cache', 'zones.sqlite'))
+
+    def tearDown(self):
+        self.zone_cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_set_and_get(self):
+        self.zone_cache.set('THE API EMAIL', {'id': 'ZONE ID', 'name': 'Add-Purer-Happen.host'})
+
+        self.assertEqual({'id': 'ZONE ID', 'name': 'Add-Purer-Happen.host'},
+                         self.zone_cache.get('THE API EMAIL', 'add-purer-happen.host'))
+        self.assertIsNone(self.zone_cache.get('OTHER API EMAIL', 'add-purer-happen.host'))
+
+    def test_persisted_between_instances(self):
+        self.zone_cache.set('THE API EMAIL', {'id': 'ZONE ID', 'name': 'add-purer-happen.host'})
+
+        zone_cache = ZoneCache(self.zone_cache.path)
+        self.assertEqual('ZONE ID', zone_cache.get('THE API EMAIL', 'add-purer-happen.host')['id'])
+        zone_cache.close()
+
+    def test_expired(self):
+        self.zone_cache.set('THE API EMAIL', {'id': 'ZONE ID', 'name': 'add-purer-happen.host'})
+        self.zone_cache.ttl = -1
+
+        self.assertIsNone(self.zone_cache.get('THE API EMAIL', 'add-purer-happen.host'))
+
+    def test_invalidate(self):
+        self.zone_cache.set('THE API EMAIL', {'id': 'ZONE ID 1', 'name': 'add-purer-happen.host'})
+        self.zone_cache.set('THE API EMAIL', {'id': 'ZONE ID 2', 'name': 'analyze-dry.win'})
+        self.zone_cache.set('OTHER API EMAIL', {'id': 'ZONE ID 3', 'name': 'analyze-dry.win'})
+
+        self.zone_cache.invalidate('THE API EMAIL', 'add-purer-happen.host')
+        self.assertIsNone(self.zone_cache.get('THE API EMAIL', 'add-purer-happen.host'))
+        self.assertIsNotNone(self.zone_cache.get('THE API EMAIL', 'analyze-dry.win'))
+
+        self.zone_cache.invalidate('THE API EMAIL')
+        self.assertIsNone(self.zone_cache.get('THE API EMAIL', 'analyze-dry.win'))
+        self.assertIsNotNone(self.zone_cache.get('OTHER API EMAIL', 'analyze-dry.win'))
+
+    def test_lib_wrapper_get_zone_info_cached(self):
+        cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL', zone_cache=self.zone_cache)
+        cf_lib_wrapper.cf = MagicMock()
+        cf_lib_wrapper.cf.zones.get = MagicMock(return_value=[{'id': 'ZONE ID', 'name': 'add-purer-happen.host'}])
+
+        self.assertEqual('ZONE ID', cf_lib_wrapper.get_zone_info('add-purer-happen.host')['id'])
+        self.assertEqual('ZONE ID', cf_lib_wrapper.get_zone_info('add-purer-happen.host')['id'])
+        self.assertEqual(1, cf_lib_wrapper.cf.zones.get.call_count)
+
+    def test_lib_wrapper_create_and_delete_zone_update_cache(self):
+        cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL', zone_cache=self.zone_cache)
+        cf_lib_wrapper.cf = MagicMock()
+        cf_lib_wrapper.cf.zones.post = MagicMock(return_value={'id': 'ZONE ID', 'name': 'add-purer-happen.host'})
+        cf_lib_wrapper.cf.zones.get = MagicMock(return_value=[{'id': 'ZONE ID', 'name': 'add-purer-happen.host'}])
+
+        cf_lib_wrapper.create_zone('add-purer-happen.host')
+        self.assertEqual('ZONE ID', self.zone_cache.get('THE API EMAIL', 'add-purer-happen.host')['id'])
+
+        cf_lib_wrapper.delete_zone_by_name('add-purer-happen.host')
+        self.assertIsNone(self.zone_cache.get('THE API EMAIL', 'add-purer-happen.host'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+from __future__ import print_function
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+from cloudflare_dns import CloudFlareLibWrapper
+from cloudflare_dns.zone_index import (
+    prepare_zone_lookup, ZoneIndex, ZONE_LOOKUP_INDEX, ZONE_LOOKUP_PER_DOMAIN)
+
+
+class TestZoneIndex(unittest.TestCase):
+    def setUp(self):
+        self.cf_lib_wrapper = CloudFlareLibWrapper('THE API KEY', 'THE API EMAIL')
+
+    def mock_account_zones(self, zone_count, per_page=50):
+        zones = [{'id': 'ZONE ID {0}'.format(i), 'name': 'zone-{0}.com'.format(i)} for i in range(zone_count)]
+
+        def list_zones_with_info(page=1, per_page=per_page, status=None):
+            return zones[(page - 1) * per_page:page * per_page], {
+                'page': page, 'per_page': per_page, 'total_count': zone_count,
+                'total_pages': (zone_count + per_page - 1) // per_page}
+
+        self.cf_lib_wrapper.list_zones_with_info = MagicMock(side_effect=list_zones_with_info)
+
+    def test_zone_index_get(self):
+        zone_index = ZoneIndex([{'id': 'ZONE ID', 'name': 'Add-Purer-Happen.host'}])
+
+        self.assertEqual('ZONE ID', zone_index.get('add-purer-happen.HOST')['id'])
+        self.assertIsNone(zone_index.get('analyze-dry.win'))
+
+    def test_small_domain_list_not_probed(self):
+        self.mock_account_zones(10)
+
+        plan = prepare_zone_lookup(['zone-{0}.com'.format(i) for i in range(10)], self.cf_lib_wrapper)
+
+        self.assertEqual(ZONE_LOOKUP_PER_DOMAIN, plan.strategy)
+        self.assertEqual(10, plan.per_domain_calls)
+        self.assertIsNone(plan.index_calls)
+        self.assertIsNone(self.cf_lib_wrapper.zone_index)
+        self.assertEqual(0, self.cf_lib_wrapper.list_zones_with_info.call_count)
+
+    def test_large_domain_list_in_small_account_uses_index(self):
+        self.mock_account_zones(1020)
+
+        plan = prepare_zone_lookup(['zone-{0}.com'.format(i) for i in range(500)], self.cf_lib_wrapper)
+
+        self.assertEqual(ZONE_LOOKUP_INDEX, plan.strategy)
+        self.assertEqual(500, plan.per_domain_calls)
+        self.assertEqual(21, plan.index_calls)
+        self.assertEqual(21, self.cf_lib_wrapper.list_zones_with_info.call_count)
+        self.assertEqual(1020, len(self.cf_lib_wrapper.zone_index))
+        self.assertEqual('ZONE ID 1019', self.cf_lib_wrapper.get_zone_info('zone-1019.com')['id'])
+        self.assertIsNone(self.cf_lib_wrapper.get_zone_info('zone-1020.com'))
+
+    def test_domain_list_in_large_account_uses_per_domain_lookups(self):
+        self.mock_account_zones(20000)
+
+        plan = prepare_zone_lookup(['zone-{0}.com'.format(i) for i in range(200)], self.cf_lib_wrapper)
+
+        self.assertEqual(ZONE_LOOKUP_PER_DOMAIN, plan.strategy)
+        self.assertEqual(400, plan.index_calls)
+        self.assertEqual(1, self.cf_lib_wrapper.list_zones_with_info.call_count)
+        self.assertIsNone(self.cf_lib_wrapper.zone_index)
+
+    def test_forced_index(self):
+        self.mock_account_zones(120)
+
+        plan = prepare_zone_lookup(['zone-1.com'], self.cf_lib_wrapper, strategy=ZONE_LOOKUP_INDEX)
+
+        self.assertEqual(ZONE_LOOKUP_INDEX, plan.strategy)
+        self.assertEqual(3, plan.index_calls)
+        self.assertEqual(120, len(self.cf_lib_wrapper.zone_index))
+
+
+if __name__ == '__main__':
+    unittest.main()